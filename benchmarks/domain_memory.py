@@ -0,0 +1,112 @@
+"""Memory used by the domain objects, measured with tracemalloc.
+
+Loads N chapters and N suscriptions the way the database reads build them
+(fresh strings for every row) with the current model and with the plain
+dataclasses it replaced, and prints the bytes taken per object.
+
+    python -m benchmarks.domain_memory [N]
+"""
+import sys
+import tracemalloc
+from typing import Any, Callable, Optional
+from dataclasses import dataclass
+
+from src.domain.model import Manga, MangaChapter
+from src.domain.communications import Chat, Suscription
+
+MANGAS: int = 500
+CHATS: int = 5000
+TIMESTAMP: int = 1729248299
+
+
+@dataclass
+class LegacyChapter():
+    name:       str
+    number:     str
+    url:        str
+    date:       int
+    manga:      str
+    manga_id:   Optional[int] = None
+
+
+@dataclass
+class LegacyManga():
+    name:   str
+    link:   str
+    last_chapter: Optional[LegacyChapter]
+    id:     Optional[int] = None
+
+
+@dataclass
+class LegacyChat():
+    id:     int
+    name:   str
+
+
+@dataclass
+class LegacySuscription():
+    chat:   LegacyChat
+    manga:  LegacyManga
+    last:   str
+
+
+def row_text(prefix: str, value: int) -> str:
+    """A new string object for each call, as decoded from a database row"""
+    return "".join((prefix, str(value)))
+
+
+def build_chapters(chapter: Callable[..., Any], count: int) -> list[Any]:
+    return [
+        chapter(row_text("Chapter ", i), str(i), row_text("https://c/", i),
+                TIMESTAMP, row_text("Manga ", i % MANGAS), i % MANGAS)
+        for i in range(count)
+    ]
+
+
+def build_suscriptions(suscription: Callable[..., Any],
+                       chat: Callable[..., Any],
+                       manga: Callable[..., Any], count: int) -> list[Any]:
+    return [
+        suscription(
+            chat(i % CHATS, row_text("Chat ", i % CHATS)),
+            manga(row_text("Manga ", i % MANGAS), "", None, i % MANGAS),
+            row_text("Chapter ", i)
+        )
+        for i in range(count)
+    ]
+
+
+def measure(build: Callable[[], list[Any]]) -> int:
+    """Bytes still allocated once the objects are built"""
+    tracemalloc.start()
+    objects: list[Any] = build()
+    size: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main(count: int) -> None:
+    cases: list[tuple[str, Callable[[], list[Any]], Callable[[], list[Any]]]]
+    cases = [
+        ("chapters",
+         lambda: build_chapters(LegacyChapter, count),
+         lambda: build_chapters(MangaChapter, count)),
+        ("suscriptions",
+         lambda: build_suscriptions(LegacySuscription, LegacyChat,
+                                    LegacyManga, count),
+         lambda: build_suscriptions(Suscription, Chat, Manga, count)),
+    ]
+
+    print(f"{'objects':<22}{'before':>14}{'after':>14}{'saved':>8}")
+    for name, before, after in cases:
+        size_before: int = measure(before)
+        size_after: int = measure(after)
+        print(f"{f'{count} {name}':<22}"
+              f"{size_before / count:>10.1f} B/o"
+              f"{size_after / count:>10.1f} B/o"
+              f"{1 - size_after / size_before:>8.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,87 @@
+"""Cost of serializing the response envelopes of a notification fan-out.
+
+Serializes the same new chapter notification for N chats with the envelope
+building the publisher used before (dict, UUID, datetime and json.dumps per
+message) and with EnvelopeSerializer, and prints the time per message and
+the peak memory allocated while serializing.
+
+    python -m benchmarks.envelope_serialization [N]
+"""
+import sys
+import json
+import time
+import uuid
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from src.infrastructure.broker.envelope import EnvelopeSerializer, orjson
+
+BOT_ID: str = "chaptnotifier"
+PAYLOAD: dict[str, Any] = {
+    "text": "🔔 **Manga 1**\n\n📖 [Chapter 1000](https://manga/1/chapter-1000)",
+    "disable_web_page_preview": True,
+}
+ROUNDS: int = 5
+
+
+def legacy_envelope(chat_id: int) -> bytes:
+    envelope = {
+        "response_id": str(uuid.uuid4()),
+        "correlation_id": "",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "bot_id": BOT_ID,
+        "chat_id": chat_id,
+        "response_type": "text",
+        "payload": PAYLOAD,
+        "reply_to": "chaptnotifier.delivery.errors",
+    }
+    return json.dumps(envelope).encode()
+
+
+def serializer_envelope() -> Callable[[int], bytes]:
+    serializer: EnvelopeSerializer = EnvelopeSerializer(BOT_ID)
+
+    def envelope(chat_id: int) -> bytes:
+        return serializer.serialize(
+            "text", chat_id, PAYLOAD, serializer.response_id(),
+            reply_to="chaptnotifier.delivery.errors"
+        )
+
+    return envelope
+
+
+def fan_out(envelope: Callable[[int], bytes], count: int) -> None:
+    for chat_id in range(count):
+        envelope(chat_id)
+
+
+def measure(envelope: Callable[[int], bytes], count: int) -> tuple[float, int]:
+    """Best time of a few fan-outs, and peak bytes allocated by one"""
+    best: float = float("inf")
+    for _ in range(ROUNDS):
+        start: float = time.perf_counter()
+        fan_out(envelope, count)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fan_out(envelope, count)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def main(count: int) -> None:
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}")
+    print(f"{'envelopes':<22}{'us/msg':>10}{'peak':>12}")
+    for name, envelope in (("legacy", legacy_envelope),
+                           ("serializer", serializer_envelope())):
+        elapsed, peak = measure(envelope, count)
+        print(f"{f'{count} {name}':<22}"
+              f"{elapsed / count * 1e6:>10.2f}"
+              f"{peak:>10} B")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,51 +1,103 @@
-from typing import Optional
+import os
+import asyncio
+import hashlib
+import tempfile
+from typing import Iterable, Optional
+from datetime import datetime, timedelta
 
 try:
     from src.utils import log
     import src.infrastructure.web as it
+    import src.infrastructure.backup as ib
+    from src.infrastructure.infra_exception import InfrastructureException
     from src.domain.model import (
         Manga,
+        MangaIndex,
         dict_to_model,
-        search_manga_by_name,
         MangaChapter,
-        search_chapter_in_list
+        ChapterIndex
     )
     from src.domain.communications import Chat
-    from src.domain.communications import Suscription
-    from src.app.communications import notify_suscribers
-    from src.app.client import memory
+    from src.domain.communications import Suscription, Notification
+    from src.app.communications import notify_suscribers, notify_digests
+    from src.app.client import (
+        memory,
+        OUTBOX_BATCH_SIZE,
+        OUTBOX_MAX_ATTEMPTS,
+        DIGEST_MODE
+    )
     from src.infrastructure.broker import ResponsePublisher
 except ModuleNotFoundError:
     from utils import log
     import infrastructure.web as it
+    import infrastructure.backup as ib
+    from infrastructure.infra_exception import InfrastructureException
     from domain.model import (
         Manga,
+        MangaIndex,
         dict_to_model,
-        search_manga_by_name,
         MangaChapter,
-        search_chapter_in_list
+        ChapterIndex
     )
     from domain.communications import Chat
-    from domain.communications import Suscription
-    from app.communications import notify_suscribers
-    from app.client import memory
+    from domain.communications import Suscription, Notification
+    from app.communications import notify_suscribers, notify_digests
+    from app.client import (
+        memory,
+        OUTBOX_BATCH_SIZE,
+        OUTBOX_MAX_ATTEMPTS,
+        DIGEST_MODE
+    )
     from infrastructure.broker import ResponsePublisher
 
 
+# A single drain at a time, so a notification is never published twice at once
+_drain_lock: asyncio.Lock = asyncio.Lock()
+
+# Mangas whose suscriptions changed outside the web exploration (e.g. a new
+# suscription) and should be reported on the next run
+_pending_reporting: set[str] = set()
+
+
+def mark_for_reporting(manga_name: str) -> None:
+    """Includes the manga in the next reporting run"""
+    _pending_reporting.add(manga_name)
+
+
 async def process_reporting(
     publisher: Optional[ResponsePublisher] = None,
     bot_id: str = "",
+    updated: Optional[Iterable[str]] = None,
 ) -> list[tuple[Suscription, Exception]]:
-    suscriptions: list[Suscription] = memory.read_suscriptions()
-    mangas: list[Manga] = memory.read_mangas()
+    """Notifies the suscriptions behind their manga last chapter.
 
-    report: list[tuple[Suscription, Exception]] = []
+    Only the suscriptions to the `updated` mangas (plus those marked for
+    reporting) are inspected. Without `updated` every suscription is, as a
+    full reconciliation.
+    """
+    suscriptions: list[Suscription]
+    mangas: MangaIndex
+
+    if updated is None:
+        _pending_reporting.clear()
+        suscriptions = memory.read_suscriptions()
+        mangas = MangaIndex(memory.read_mangas())
+    else:
+        targets: set[str] = _pending_reporting.union(updated)
+        _pending_reporting.clear()
+        suscriptions = []
+        mangas = MangaIndex()
+        for name in targets:
+            for manga in memory.read_manga_by_name(name):
+                mangas.add(manga)
+                suscriptions.extend(memory.read_suscription_by_manga(name))
+
+    # Pending suscriptions grouped by release: (manga, chapter) -> suscriptions
+    releases: dict[tuple[str, str], list[Suscription]] = {}
+    chapters: dict[tuple[str, str], MangaChapter] = {}
 
     for sus in suscriptions:
-        sus_manga: Optional[Manga] = search_manga_by_name(
-            mangas,
-            sus.manga.name
-        )
+        sus_manga: Optional[Manga] = mangas.by_name(sus.manga.name)
 
         if not sus_manga:
             log("bot", "error", [
@@ -61,39 +113,158 @@ async def process_reporting(
             ])
             continue
 
-        if not sus_manga.last_chapter or \
-           sus.last != sus_manga.last_chapter.name:
+        if sus.last != sus_manga.last_chapter.name:
+            release: tuple[str, str] = \
+                (sus_manga.name, sus_manga.last_chapter.name)
+            releases.setdefault(release, []).append(sus)
+            chapters[release] = sus_manga.last_chapter
 
-            notification_statuses: list[tuple[Chat, Exception]] = \
-                await notify_suscribers(
-                    sus_manga.last_chapter,
-                    [sus.chat],
-                    publisher,
-                    bot_id,
-                )
+    for release, pending in releases.items():
+        if not memory.enqueue_notifications(
+            chapters[release], [sus.chat for sus in pending]
+        ):
+            log("bot", "warning", [
+                "process_reporting",
+                f"Couldn't enqueue chapter {release[1]} of {release[0]} for "
+                f"{len(pending)} suscriptions"
+            ])
 
-            if notification_statuses[0][1] is None:
-                if not memory.update_suscription_last(
-                    chat_id=sus.chat.id,
-                    manga_name=sus.manga.name,
-                    last_chapter=sus_manga.last_chapter.name
-                ):
-                    log("bot", "warning", [
-                        "process_reporting",
-                        f"Last chapter updated for chat {sus.chat.id} and "
-                        f"manga {sus.manga.name}"
-                    ])
+    return await drain_outbox(publisher, bot_id)
 
-            report.append(
-                (
-                    sus,
-                    notification_statuses[0][1]
-                )
+
+async def drain_outbox(
+    publisher: Optional[ResponsePublisher] = None,
+    bot_id: str = "",
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    digest: bool = DIGEST_MODE,
+) -> list[tuple[Suscription, Exception]]:
+    """Publishes the pending notifications of the outbox in batches, grouped
+    by chapter. With `digest`, the chapters of a chat in the same batch are
+    sent as a single digest instead. Each notification is marked as delivered
+    once the broker takes it, or left pending for the next drain otherwise.
+    Returns the suscription behind each notification with its publishing
+    error, if any"""
+    report: list[tuple[Suscription, Exception]] = []
+    after: int = 0
+
+    async with _drain_lock:
+        while True:
+            batch: list[Notification] = memory.read_pending_notifications(
+                after, max_attempts, batch_size
             )
+            if not batch:
+                break
+            after = batch[-1].id
+
+            # In digest mode, chats with several chapters get them together
+            digests: dict[int, list[Notification]] = {}
+            singles: list[Notification] = batch
+            if digest:
+                for notification in batch:
+                    digests.setdefault(notification.chat.id, []) \
+                        .append(notification)
+                singles = [pending[0] for pending in digests.values()
+                           if len(pending) == 1]
+                digests = {chat_id: pending
+                           for chat_id, pending in digests.items()
+                           if len(pending) > 1}
+
+            # (manga ID, chapter) -> notifications
+            releases: dict[tuple[Optional[int], str], list[Notification]] = {}
+            for notification in singles:
+                releases.setdefault(
+                    (notification.chapter.manga_id, notification.chapter.name),
+                    []
+                ).append(notification)
+
+            delivered: list[int] = []
+            failed: list[int] = []
+
+            if digests:
+                digest_statuses: list[tuple[Chat, Exception]] = \
+                    await notify_digests(
+                        [
+                            (pending[0].chat,
+                             [notification.chapter for notification in pending])
+                            for pending in digests.values()
+                        ],
+                        publisher,
+                        bot_id,
+                        keys=[_digest_key(bot_id, pending)
+                              for pending in digests.values()],
+                    )
+
+                for pending, (_, error) in \
+                        zip(digests.values(), digest_statuses):
+                    for notification in pending:
+                        if error is None:
+                            delivered.append(notification.id)
+                        else:
+                            failed.append(notification.id)
+                        report.append((
+                            Suscription(
+                                notification.chat,
+                                Manga(notification.chapter.manga, "",
+                                      notification.chapter,
+                                      notification.chapter.manga_id),
+                                notification.chapter.name
+                            ),
+                            error
+                        ))
+
+            for pending in releases.values():
+                chapter: MangaChapter = pending[0].chapter
+                sus_manga: Manga = \
+                    Manga(chapter.manga, "", chapter, chapter.manga_id)
+
+                notification_statuses: list[tuple[Chat, Exception]] = \
+                    await notify_suscribers(
+                        chapter,
+                        [notification.chat for notification in pending],
+                        publisher,
+                        bot_id,
+                        keys=[f"{bot_id}:{notification.key}"
+                              for notification in pending],
+                    )
+
+                for notification, (_, error) in \
+                        zip(pending, notification_statuses):
+                    if error is None:
+                        delivered.append(notification.id)
+                    else:
+                        failed.append(notification.id)
+                    report.append((
+                        Suscription(notification.chat, sus_manga,
+                                    chapter.name),
+                        error
+                    ))
+
+            if not memory.mark_notifications(delivered, failed):
+                log("bot", "warning", [
+                    "drain_outbox",
+                    f"Couldn't mark {len(delivered)} delivered and "
+                    f"{len(failed)} failed notifications"
+                ])
+
+            if len(batch) < batch_size:
+                break
 
     return report
 
 
+def _digest_key(bot_id: str, notifications: list[Notification]) -> str:
+    """Stable response ID for a digest of the given notifications"""
+    keys: str = "|".join(sorted(n.key for n in notifications))
+    return f"{bot_id}:digest:{hashlib.sha1(keys.encode()).hexdigest()[:16]}"
+
+
+def purge_outbox(max_age: timedelta,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS) -> int:
+    """Deletes the notifications finished longer than `max_age` ago"""
+    return memory.delete_finished_notifications(max_age, max_attempts)
+
+
 def delete_suscription(sus: Suscription) -> bool:
     if sus is None:
         log(
@@ -159,7 +330,87 @@ async def handle_delivery_error(error_body: dict) -> None:
         )
 
 
-def explore_web(url: str):
+async def compact_chapter_history(
+    keep_last: int,
+    max_age: Optional[timedelta],
+    batch_size: int,
+) -> tuple[int, int]:
+    """Enforces the chapter retention policy in batches and then compacts
+    the database, all of it in a worker thread: the first compaction of an
+    old database is a full VACUUM.
+
+    Returns the number of deleted chapters and the bytes reclaimed"""
+    deleted: int = 0
+
+    if keep_last > 0 or max_age is not None:
+        while True:
+            batch: int = await asyncio.to_thread(
+                memory.delete_expired_manga_chapters,
+                keep_last, max_age, batch_size
+            )
+            deleted += batch
+            if batch < batch_size:
+                break
+
+    size_before: int = memory.size()
+    await asyncio.to_thread(memory.compact)
+
+    return deleted, size_before - memory.size()
+
+
+async def backup_database(
+    directory: str,
+    prefix: str,
+    keep: int,
+    compress: bool,
+    pages: int = 64,
+    sleep: float = 0.01,
+) -> Optional[str]:
+    """Takes an online snapshot of the database into the directory, without
+    blocking the event loop, and rotates the old ones out.
+
+    Returns the snapshot path, or None if it couldn't be taken"""
+    os.makedirs(directory, exist_ok=True)
+    path: str = ib.snapshot_path(directory, prefix, datetime.now())
+
+    if not await asyncio.to_thread(memory.backup, path, pages, sleep):
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    if compress:
+        path = await asyncio.to_thread(ib.compress, path)
+
+    for removed in ib.rotate(directory, prefix, keep):
+        log("bot", "debug", ["backup_database", f"Rotated out {removed}"])
+
+    return path
+
+
+def restore_database(snapshot: str) -> bool:
+    """Replaces the database content with the given snapshot, compressed
+    or not"""
+    if not snapshot.endswith(ib.COMPRESSED_EXTENSION):
+        return memory.restore(snapshot)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        plain: str = os.path.join(workdir, "snapshot" + ib.SNAPSHOT_EXTENSION)
+        try:
+            ib.decompress(snapshot, plain)
+        except InfrastructureException as err:
+            log("bot", "error", [
+                "restore_database",
+                f"Couldn't decompress snapshot {snapshot}: {err}"
+            ])
+            return False
+
+        return memory.restore(plain)
+
+
+def explore_web(url: str) -> set[str]:
+    """Stores the new mangas and chapters found at the url. Returns the names
+    of the mangas that got new chapters"""
+    updated: set[str] = set()
     html: str = it.download_page(url)
     data: dict[str, list[dict[str, str]]] = it.parse_html(html)
 
@@ -177,15 +428,18 @@ def explore_web(url: str):
             f"{len(new_chapters)} chapters found"
         ])
 
-        mangas_in_memory: list[Manga] = memory.read_mangas()
+        mangas_in_memory: MangaIndex = MangaIndex(memory.read_mangas())
+        # Chapters already stored, read once per manga
+        known_chapters: dict[str, ChapterIndex] = {}
 
         for chapter in new_chapters:
-            if search_manga_by_name(mangas_in_memory, chapter.manga) is None:
+            if chapter.manga not in mangas_in_memory:
                 if memory.insert_manga(
                         name=chapter.manga,
                         url="",
                         last_chapter=None
                 ):
+                    mangas_in_memory.add(Manga(chapter.manga, "", None))
                     log("bot", "info", [
                         "explore_web",
                         f"New manga {chapter.manga}"
@@ -196,10 +450,15 @@ def explore_web(url: str):
                         f"Error saving new manga {chapter.manga}"
                     ])
 
-            chapters: list[MangaChapter] = \
-                memory.read_manga_chapter_by_manga_name(chapter.manga)
+            chapters: Optional[ChapterIndex] = \
+                known_chapters.get(chapter.manga)
+            if chapters is None:
+                chapters = ChapterIndex(
+                    memory.read_manga_chapter_by_manga_name(chapter.manga)
+                )
+                known_chapters[chapter.manga] = chapters
 
-            if not search_chapter_in_list(chapters, chapter):
+            if chapter not in chapters:
                 if memory.insert_manga_chapter(
                     chapter_name=chapter.name,
                     chapter_number=chapter.number,
@@ -207,6 +466,8 @@ def explore_web(url: str):
                     chapter_date=chapter.date,
                     manga_name=chapter.manga,
                 ):
+                    chapters.add(chapter)
+                    updated.add(chapter.manga)
                     log("bot", "info", [
                         "explore_web",
                         f"[{chapter.manga}] New chapter: {chapter.name}"
@@ -217,3 +478,5 @@ def explore_web(url: str):
                         f"[{chapter.manga}] Error saving new chapter "
                         f"{chapter.name}"
                     ])
+
+    return updated
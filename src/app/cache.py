@@ -0,0 +1,364 @@
+from typing import Any, Optional
+from collections import OrderedDict
+from datetime import datetime
+
+try:
+    from src.utils import log
+    from src.domain.model import Manga, MangaChapter
+    from src.domain.communications import Chat, Suscription
+    from src.app.database import Database
+except ModuleNotFoundError:
+    from utils import log
+    from domain.model import Manga, MangaChapter
+    from domain.communications import Chat, Suscription
+    from app.database import Database
+
+
+class CachedDatabase(Database):
+    """Write-through cache over the model database.
+
+    Chats and mangas (with their last chapter) are loaded once and every
+    write that succeeds on the database is applied to the cache too, so reads
+    become dictionary lookups. Chapter history is not cached.
+
+    Suscriptions are cached per chat, up to `max_entries` of them. Past that
+    the chats read least recently are evicted, and loaded back from the
+    database on their next read. Reads that need the suscriptions of every
+    chat are served from memory only while none has been evicted.
+    Cached objects are shared between callers and replaced, never mutated,
+    when they change.
+    """
+
+    max_entries: int
+    hits: int
+    misses: int
+    evictions: int
+
+    _chats: dict[int, Chat]
+    _mangas: dict[int, Manga]
+    _manga_ids: dict[str, int]
+    # Chat ID -> manga ID -> last chapter notified, of the chats loaded, the
+    # least recently read first
+    _sus_by_chat: OrderedDict[int, dict[int, str]]
+    _sus_by_manga: dict[int, dict[int, None]]
+    _sus_count: int
+    # Whether the suscriptions of every chat are loaded
+    _complete: bool
+
+    def __init__(self, max_entries: int = 50000) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clear()
+
+    def init(self, filepath: str) -> None:
+        super().init(filepath)
+        self.reload()
+
+    def close(self) -> None:
+        self._clear()
+        super().close()
+
+    def restore(self, source: str) -> bool:
+        done: bool = super().restore(source)
+        self.reload()
+        return done
+
+    def reload(self) -> None:
+        """Drops the cache and loads it again from the database"""
+        self._clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        for chat in self.raw_db.read_chats():
+            self._chats[chat[0]] = Chat(chat[0], chat[1])
+
+        for row in self.raw_db.read_mangas_with_last_chapter():
+            self._put_manga(self._manga_from_row(row))
+
+        for sus in self.raw_db.read_suscriptions():
+            self._put_suscription(sus[0], sus[3], sus[2])
+
+        self._complete = True
+        self._evict()
+
+        log("bot", "debug", ["app.cache", f"Cache loaded: {self.stats()}"])
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters and current size of the cache"""
+        return {
+            "complete": self._complete,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._entries(),
+        }
+
+    ##########################################################################
+    #                                 READS                                  #
+    ##########################################################################
+
+    def read_chats(self) -> list[Chat]:
+        self.hits += 1
+        return list(self._chats.values())
+
+    def read_chat_by_id(self, chat_id: int) -> Optional[Chat]:
+        self.hits += 1
+        return self._chats.get(chat_id)
+
+    def read_mangas(self) -> list[Manga]:
+        self.hits += 1
+        return list(self._mangas.values())
+
+    def read_manga_by_name(self, name: str) -> list[Manga]:
+        self.hits += 1
+        manga_id: Optional[int] = self._manga_ids.get(name)
+        return [] if manga_id is None else [self._mangas[manga_id]]
+
+    def read_manga_by_id(self, manga_id: int) -> Optional[Manga]:
+        self.hits += 1
+        return self._mangas.get(manga_id)
+
+    def read_suscriptions(self) -> list[Suscription]:
+        if not self._hit(self._complete):
+            return super().read_suscriptions()
+        return self._build_suscriptions(
+            (chat_id, manga_id)
+            for chat_id, suscriptions in self._sus_by_chat.items()
+            for manga_id in suscriptions
+        )
+
+    def read_suscription_by_chat(self, chat_id: int) -> list[Suscription]:
+        loaded: bool = chat_id in self._sus_by_chat
+        if not self._hit(loaded or self._complete):
+            suscriptions: list[Suscription] = \
+                super().read_suscription_by_chat(chat_id)
+            self._load_chat(chat_id, suscriptions)
+            return suscriptions
+
+        if loaded:
+            self._sus_by_chat.move_to_end(chat_id)
+        return self._build_suscriptions(
+            (chat_id, manga_id)
+            for manga_id in self._sus_by_chat.get(chat_id, {})
+        )
+
+    def read_suscription_by_manga(self, manga: str) -> list[Suscription]:
+        if not self._hit(self._complete):
+            return super().read_suscription_by_manga(manga)
+
+        manga_id: Optional[int] = self._manga_ids.get(manga)
+        if manga_id is None:
+            return []
+        return self._build_suscriptions(
+            (chat_id, manga_id)
+            for chat_id in self._sus_by_manga.get(manga_id, {})
+        )
+
+    ##########################################################################
+    #                                 WRITES                                 #
+    ##########################################################################
+
+    def insert_chat(self, chat_id: int, chat_name: str) -> bool:
+        done: bool = super().insert_chat(chat_id, chat_name)
+        if done:
+            self._chats[chat_id] = Chat(chat_id, chat_name)
+        return done
+
+    def update_chat_name(self, chat_id: int, chat_name: str) -> bool:
+        done: bool = super().update_chat_name(chat_id, chat_name)
+        if done and chat_id in self._chats:
+            self._chats[chat_id] = Chat(chat_id, chat_name)
+        return done
+
+    def delete_chat(self, chat_id: int) -> bool:
+        done: bool = super().delete_chat(chat_id)
+        if done:
+            self._chats.pop(chat_id, None)
+        return done
+
+    def insert_manga(self, name: str, url: str,
+                     last_chapter: Optional[str] = None) -> bool:
+        done: bool = super().insert_manga(name, url, last_chapter)
+        if done:
+            self._refresh_manga(name)
+        return done
+
+    def update_manga_last(self, manga_name: str, last_chapter: str) -> bool:
+        done: bool = super().update_manga_last(manga_name, last_chapter)
+        if done:
+            self._refresh_manga(manga_name)
+        return done
+
+    def delete_manga(self, name: str) -> bool:
+        done: bool = super().delete_manga(name)
+        if done:
+            manga_id: Optional[int] = self._manga_ids.pop(name, None)
+            if manga_id is not None:
+                self._mangas.pop(manga_id, None)
+        return done
+
+    def insert_manga_chapter(self, chapter_name: str,
+                             chapter_number: str, chapter_url: str,
+                             chapter_date: datetime,
+                             manga_name: str) -> bool:
+        done: bool = super().insert_manga_chapter(
+            chapter_name, chapter_number, chapter_url, chapter_date,
+            manga_name
+        )
+        # The chapter may have moved the manga last chapter pointer
+        if done:
+            self._refresh_manga(manga_name)
+        return done
+
+    def delete_manga_chapter(self, manga_name: str, chapter_name: str) -> bool:
+        done: bool = super().delete_manga_chapter(manga_name, chapter_name)
+        if done:
+            self._refresh_manga(manga_name)
+        return done
+
+    def insert_suscription(self, chat_id: int, manga_name: str,
+                           last_chapter: str) -> bool:
+        done: bool = super().insert_suscription(chat_id, manga_name,
+                                                last_chapter)
+        if done and (chat_id in self._sus_by_chat or self._complete):
+            # The manga may have been written by someone else
+            if manga_name not in self._manga_ids:
+                self._refresh_manga(manga_name)
+
+            manga_id: Optional[int] = self._manga_ids.get(manga_name)
+            if manga_id is None:
+                self._unload_chat(chat_id)
+            else:
+                self._put_suscription(chat_id, manga_id, last_chapter)
+                self._evict()
+        return done
+
+    def update_suscription_last(self, chat_id: int, manga_name: str,
+                                last_chapter: str) -> bool:
+        done: bool = super().update_suscription_last(chat_id, manga_name,
+                                                     last_chapter)
+        if done:
+            manga_id: Optional[int] = self._manga_ids.get(manga_name)
+            suscriptions: dict[int, str] = self._sus_by_chat.get(chat_id, {})
+            if manga_id in suscriptions:
+                suscriptions[manga_id] = last_chapter
+        return done
+
+    def enqueue_notifications(self, chapter: MangaChapter,
+                              chats: list[Chat]) -> bool:
+        done: bool = super().enqueue_notifications(chapter, chats)
+        # Enqueuing moves the suscriptions last chapter
+        if done:
+            for chat in chats:
+                suscriptions: dict[int, str] = \
+                    self._sus_by_chat.get(chat.id, {})
+                if chapter.manga_id in suscriptions:
+                    suscriptions[chapter.manga_id] = chapter.name
+        return done
+
+    def delete_suscription(self, chat_id: int, manga_name: str) -> bool:
+        done: bool = super().delete_suscription(chat_id, manga_name)
+        if done:
+            manga_id: Optional[int] = self._manga_ids.get(manga_name)
+            if manga_id is not None:
+                self._pop_suscription(chat_id, manga_id)
+        return done
+
+    ##########################################################################
+    #                                INTERNAL                                #
+    ##########################################################################
+
+    def _clear(self) -> None:
+        self._chats = {}
+        self._mangas = {}
+        self._manga_ids = {}
+        self._sus_by_chat = OrderedDict()
+        self._sus_by_manga = {}
+        self._sus_count = 0
+        self._complete = False
+
+    def _entries(self) -> int:
+        return len(self._chats) + len(self._mangas) + self._sus_count
+
+    def _hit(self, cached: bool) -> bool:
+        """Counts the read as a hit if the cache can serve it"""
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return cached
+
+    def _evict(self) -> None:
+        """Unloads the chats read least recently until the suscriptions fit
+        in the bound"""
+        while self._sus_count > self.max_entries and self._sus_by_chat:
+            self._unload_chat(next(iter(self._sus_by_chat)))
+            self.evictions += 1
+
+    def _put_manga(self, manga: Manga) -> None:
+        if manga.id is None:
+            return
+        self._mangas[manga.id] = manga
+        self._manga_ids[manga.name] = manga.id
+
+    def _refresh_manga(self, name: str) -> None:
+        """Reads back a single manga after a write that changed it"""
+        rows: list[tuple[Any, ...]] = \
+            self.raw_db.read_manga_with_last_chapter_by_name(name)
+        if rows:
+            self._put_manga(self._manga_from_row(rows[0]))
+
+    def _load_chat(self, chat_id: int,
+                   suscriptions: list[Suscription]) -> None:
+        """Caches the suscriptions of a chat just read from the database"""
+        self._unload_chat(chat_id)
+        self._sus_by_chat[chat_id] = {}
+        for sus in suscriptions:
+            if sus.manga.id is not None:
+                self._put_suscription(chat_id, sus.manga.id, sus.last)
+        self._evict()
+
+    def _unload_chat(self, chat_id: int) -> None:
+        """Drops the suscriptions of a chat, to be read from the database"""
+        suscriptions: Optional[dict[int, str]] = \
+            self._sus_by_chat.pop(chat_id, None)
+        if suscriptions is None:
+            return
+
+        for manga_id in suscriptions:
+            self._sus_by_manga.get(manga_id, {}).pop(chat_id, None)
+        self._sus_count -= len(suscriptions)
+        self._complete = False
+
+    def _put_suscription(self, chat_id: int, manga_id: int,
+                         last: str) -> None:
+        suscriptions: dict[int, str] = \
+            self._sus_by_chat.setdefault(chat_id, {})
+        if manga_id not in suscriptions:
+            self._sus_count += 1
+        suscriptions[manga_id] = last
+        self._sus_by_manga.setdefault(manga_id, {})[chat_id] = None
+
+    def _pop_suscription(self, chat_id: int, manga_id: int) -> None:
+        suscriptions: dict[int, str] = self._sus_by_chat.get(chat_id, {})
+        if manga_id in suscriptions:
+            del suscriptions[manga_id]
+            self._sus_count -= 1
+        self._sus_by_manga.get(manga_id, {}).pop(chat_id, None)
+
+    def _build_suscriptions(self, keys: Any) -> list[Suscription]:
+        """Suscriptions for the given (chat ID, manga ID) keys. Those whose
+        chat or manga is gone are left out"""
+        suscriptions: list[Suscription] = []
+        for chat_id, manga_id in keys:
+            chat: Optional[Chat] = self._chats.get(chat_id)
+            manga: Optional[Manga] = self._mangas.get(manga_id)
+            if chat is None or manga is None:
+                continue
+            suscriptions.append(
+                Suscription(chat, manga, self._sus_by_chat[chat_id][manga_id])
+            )
+        return suscriptions
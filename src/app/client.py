@@ -5,11 +5,13 @@ try:
     from src.utils import log
     from src.app.messages import load_lang_dict
     from src.app.database import Database
+    from src.app.cache import CachedDatabase
     from src.infrastructure.broker import BrokerConfig
 except ModuleNotFoundError:
     from utils import log
     from app.messages import load_lang_dict
     from app.database import Database
+    from app.cache import CachedDatabase
     from infrastructure.broker import BrokerConfig
 
 from dotenv import load_dotenv
@@ -27,9 +29,70 @@ ERROR_QUEUE: str = "chaptnotifier.delivery.errors"
 
 broker_config: BrokerConfig = BrokerConfig.from_env()
 
+# Outbound pacing for Telegram: SEND_RATE_LIMIT messages per second overall
+# (bursts up to SEND_RATE_BURST) and one every SEND_CHAT_INTERVAL seconds per
+# chat. A rate of 0 disables it.
+SEND_RATE_LIMIT: float = float(os.getenv("SEND_RATE_LIMIT", "30"))
+SEND_RATE_BURST: int = int(os.getenv("SEND_RATE_BURST", "30"))
+SEND_CHAT_INTERVAL: float = float(os.getenv("SEND_CHAT_INTERVAL", "1"))
+
+# Notifications of a release published at the same time
+NOTIFY_CONCURRENCY: int = int(os.getenv("NOTIFY_CONCURRENCY", "100"))
+# Chats with several new chapters in the same run get a single digest message
+DIGEST_MODE: bool = os.getenv("DIGEST_MODE", "False") == "True"
+
+# Notifications outbox, drained every OUTBOX_DRAIN_SECONDS in batches. A
+# notification is retried up to OUTBOX_MAX_ATTEMPTS times, and kept for
+# OUTBOX_RETENTION_DAYS once finished.
+OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_DRAIN_SECONDS: int = int(os.getenv("OUTBOX_DRAIN_SECONDS", "60"))
+OUTBOX_RETENTION_DAYS: int = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# Searches only report the mangas that got new chapters, except one every
+# REPORTING_RECONCILE_EVERY that checks all the suscriptions
+REPORTING_RECONCILE_EVERY: int = int(
+    os.getenv("REPORTING_RECONCILE_EVERY", "12")
+)
+
+# Events remembered to drop redeliveries: up to EVENT_DEDUP_SIZE of them, for
+# EVENT_DEDUP_TTL seconds
+EVENT_DEDUP_SIZE: int = int(os.getenv("EVENT_DEDUP_SIZE", "10000"))
+EVENT_DEDUP_TTL: int = int(os.getenv("EVENT_DEDUP_TTL", "3600"))
+
+# Events of the same chat are handled one at a time, in order, and those of
+# different chats concurrently. False handles them all concurrently
+DISPATCH_PER_CHAT_ORDER: bool = \
+    os.getenv("DISPATCH_PER_CHAT_ORDER", "True") == "True"
+
+# Seconds given on shutdown to the events being handled and the jobs running
+SHUTDOWN_TIMEOUT: int = int(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+
 DATABASE_FILEPATH: str = os.getenv("DATABASE_FILEPATH", "data/roger_db.db")
 
-memory: Database = Database()
+# Chapter history retention. A chapter is kept while it's among the newest
+# CHAPTER_RETENTION_COUNT of its manga or younger than CHAPTER_RETENTION_DAYS.
+# Both are disabled with 0, which keeps the whole history.
+CHAPTER_RETENTION_COUNT: int = int(os.getenv("CHAPTER_RETENTION_COUNT", "0"))
+CHAPTER_RETENTION_DAYS: int = int(os.getenv("CHAPTER_RETENTION_DAYS", "0"))
+COMPACTION_BATCH_SIZE: int = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+COMPACTION_HOUR: str = os.getenv("COMPACTION_HOUR", "4")
+
+# Online database snapshots, taken every BACKUP_HOUR (cron syntax) and rotated
+# to keep the newest BACKUP_KEEP of them. An empty directory disables them.
+BACKUP_DIRPATH: str = os.getenv("BACKUP_DIRPATH", "data/backups")
+BACKUP_PREFIX: str = os.getenv("BACKUP_PREFIX", "roger_db")
+BACKUP_KEEP: int = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_COMPRESS: bool = os.getenv("BACKUP_COMPRESS", "True") == "True"
+BACKUP_HOUR: str = os.getenv("BACKUP_HOUR", "*/6")
+
+# Chats and mangas are served from memory, along with the suscriptions of the
+# chats read most recently, up to CACHE_MAX_ENTRIES of them. 0 disables the
+# cache.
+CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+
+memory: Database = \
+    CachedDatabase(CACHE_MAX_ENTRIES) if CACHE_MAX_ENTRIES > 0 else Database()
 log("bot", "info", ["client", f"Starting bot: {DATABASE_FILEPATH}"])
 memory.init(DATABASE_FILEPATH)
 
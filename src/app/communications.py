@@ -1,14 +1,19 @@
+import asyncio
+from typing import Iterator, Optional
+
 try:
     import src.utils as icons
     from src.domain.model import MangaChapter
     from src.domain.communications import Chat
-    from src.app.client import LANG_DICT, ERROR_QUEUE
+    from src.app.client import LANG_DICT, ERROR_QUEUE, NOTIFY_CONCURRENCY
+    from src.app.messages import split_message
     from src.infrastructure.broker import ResponsePublisher
 except ModuleNotFoundError:
     import utils as icons
     from domain.model import MangaChapter
     from domain.communications import Chat
-    from app.client import LANG_DICT, ERROR_QUEUE
+    from app.client import LANG_DICT, ERROR_QUEUE, NOTIFY_CONCURRENCY
+    from app.messages import split_message
     from infrastructure.broker import ResponsePublisher
 
 
@@ -17,9 +22,14 @@ async def notify_suscribers(
     chats: list[Chat],
     publisher: ResponsePublisher,
     bot_id: str,
+    concurrency: int = NOTIFY_CONCURRENCY,
+    keys: Optional[list[str]] = None,
 ) -> list[tuple[Chat, Exception]]:
-    results: list[tuple[Chat, Exception]] = []
-
+    """Publishes the chapter release to every chat, with up to `concurrency`
+    publications in flight. `keys`, if given, are the response IDs for each
+    chat, so a retried notification keeps its ID. Returns each chat with the
+    error raised while publishing to it (None if it went well), in the same
+    order as `chats`"""
     message: str = LANG_DICT["generic"]["newElement"] % (
         icons.NEW_ICON + icons.OK_ICON,
         chapter.name,
@@ -28,16 +38,87 @@ async def notify_suscribers(
         chapter.url
     )
 
-    for chat in chats:
-        try:
-            await publisher.publish_text(
-                chat_id=chat.id,
-                text=message,
-                disable_web_page_preview=True,
-                reply_to=ERROR_QUEUE,
-            )
-            results.append((chat, None))
-        except Exception as err:
-            results.append((chat, err))
-
-    return results
+    return await _publish_concurrently(
+        [
+            (chat, [(message, keys[position] if keys else None)])
+            for position, chat in enumerate(chats)
+        ],
+        publisher,
+        concurrency,
+    )
+
+
+def render_digest(chapters: list[MangaChapter]) -> list[str]:
+    """Renders several chapters as a single message, or as few as the
+    Telegram length limit allows"""
+    header: str = LANG_DICT["generic"]["digestHeader"] % (
+        icons.NEW_ICON + icons.OK_ICON,
+        len(chapters)
+    )
+
+    return split_message(header, [
+        LANG_DICT["generic"]["digestElement"] % (
+            chapter.manga, chapter.name, chapter.url
+        )
+        for chapter in chapters
+    ])
+
+
+async def notify_digests(
+    digests: list[tuple[Chat, list[MangaChapter]]],
+    publisher: ResponsePublisher,
+    bot_id: str,
+    concurrency: int = NOTIFY_CONCURRENCY,
+    keys: Optional[list[str]] = None,
+) -> list[tuple[Chat, Exception]]:
+    """Publishes to each chat a digest of its chapters, as notify_suscribers
+    does for a single chapter. A digest split in several messages takes the
+    chat key with the part number as response ID for each one"""
+    return await _publish_concurrently(
+        [
+            (chat, [
+                (message, f"{keys[position]}:{part}" if keys else None)
+                for part, message in enumerate(render_digest(chapters))
+            ])
+            for position, (chat, chapters) in enumerate(digests)
+        ],
+        publisher,
+        concurrency,
+    )
+
+
+async def _publish_concurrently(
+    messages: list[tuple[Chat, list[tuple[str, Optional[str]]]]],
+    publisher: ResponsePublisher,
+    concurrency: int,
+) -> list[tuple[Chat, Exception]]:
+    """Publishes the (text, response ID) messages of each chat, in order for
+    the same chat and with up to `concurrency` chats at once. A chat fails
+    with the first error raised publishing to it"""
+    results: list[Optional[tuple[Chat, Exception]]] = [None] * len(messages)
+
+    pending: Iterator[tuple[int, tuple[Chat, list[tuple[str, Optional[str]]]]]]
+    pending = iter(enumerate(messages))
+
+    async def worker() -> None:
+        # Workers share the iterator, each taking the next chat when free
+        for position, (chat, texts) in pending:
+            try:
+                for text, response_id in texts:
+                    await publisher.publish_text(
+                        chat_id=chat.id,
+                        text=text,
+                        disable_web_page_preview=True,
+                        reply_to=ERROR_QUEUE,
+                        response_id=response_id,
+                        bulk=True,
+                    )
+                results[position] = (chat, None)
+            except Exception as err:
+                results[position] = (chat, err)
+
+    await asyncio.gather(
+        *(worker() for _ in range(min(max(concurrency, 1), len(messages))))
+    )
+
+    return [result for result in results if result is not None]
@@ -1,29 +1,169 @@
+import asyncio
+import functools
+from datetime import timedelta
 from typing import Awaitable, Callable, Optional
 
 try:
     from src.utils import log
-    from src.app.actions import explore_web, process_reporting, prune_suscriptions
+    from src.app.actions import (
+        explore_web,
+        process_reporting,
+        prune_suscriptions,
+        compact_chapter_history,
+        backup_database,
+        drain_outbox,
+        purge_outbox,
+    )
     import src.domain.communications as comms
     from src.infrastructure.broker import ResponsePublisher
 except ModuleNotFoundError:
     from utils import log
-    from app.actions import explore_web, process_reporting, prune_suscriptions
+    from app.actions import (
+        explore_web,
+        process_reporting,
+        prune_suscriptions,
+        compact_chapter_history,
+        backup_database,
+        drain_outbox,
+        purge_outbox,
+    )
     import domain.communications as comms
     from infrastructure.broker import ResponsePublisher
 
+# Jobs running right now, waited for on shutdown
+_running: set[asyncio.Task] = set()
+
+
+def _tracked(job: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    """Registers the job runs so that shutdown can wait for them"""
+
+    @functools.wraps(job)
+    async def run() -> None:
+        task: Optional[asyncio.Task] = asyncio.current_task()
+        if task is not None:
+            _running.add(task)
+        try:
+            await job()
+        finally:
+            _running.discard(task)
+
+    return run
+
+
+async def wait_for_jobs(timeout: float) -> bool:
+    """Waits up to `timeout` seconds for the jobs running to finish. Returns
+    whether they did"""
+    tasks: set[asyncio.Task] = _running - {asyncio.current_task()}
+    if not tasks:
+        return True
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    return not pending
+
 
 def perform_search_generator(
     publisher: Optional[ResponsePublisher] = None,
     bot_id: str = "",
+    reconcile_every: int = 12,
 ) -> Callable[[], Awaitable[None]]:
+    """Searches for new chapters and reports the mangas updated. Every
+    `reconcile_every` runs, starting with the first one, all the suscriptions
+    are reported instead (0 only does it on the first run)"""
     url: str = "https://mangapanda.onl"
+    runs: int = 0
 
     async def perform_search() -> None:
+        nonlocal runs
         log("bot", "info", ["perform_search", "Searching for new content"])
-        explore_web(url)
+        updated: set[str] = explore_web(url)
+
+        reconcile: bool = runs == 0 or \
+            (reconcile_every > 0 and runs % reconcile_every == 0)
+        runs += 1
+
+        if reconcile:
+            log("bot", "info",
+                ["perform_search", "Reporting all the suscriptions"])
         report_results: list[tuple[comms.Suscription, Exception]] = \
-            await process_reporting(publisher, bot_id)
+            await process_reporting(
+                publisher, bot_id, None if reconcile else updated
+            )
 
         prune_suscriptions(report_results)
 
-    return perform_search
+    return _tracked(perform_search)
+
+
+def perform_drain_generator(
+    publisher: Optional[ResponsePublisher] = None,
+    bot_id: str = "",
+) -> Callable[[], Awaitable[None]]:
+
+    async def perform_drain() -> None:
+        report_results: list[tuple[comms.Suscription, Exception]] = \
+            await drain_outbox(publisher, bot_id)
+
+        if report_results:
+            log("bot", "info", [
+                "perform_drain",
+                f"{len(report_results)} pending notifications published"
+            ])
+            if publisher is not None:
+                log("bot", "debug", [
+                    "perform_drain", f"Publisher: {publisher.stats()}"
+                ])
+            if publisher is not None and publisher.rate_limiter is not None:
+                log("bot", "debug", [
+                    "perform_drain",
+                    f"Rate limiter: {publisher.rate_limiter.stats()}"
+                ])
+        prune_suscriptions(report_results)
+
+    return _tracked(perform_drain)
+
+
+def perform_compaction_generator(
+    keep_last: int = 0,
+    max_age: Optional[timedelta] = None,
+    batch_size: int = 500,
+    outbox_max_age: timedelta = timedelta(days=7),
+) -> Callable[[], Awaitable[None]]:
+
+    async def perform_compaction() -> None:
+        log("bot", "info", ["perform_compaction", "Compacting chapter history"])
+        purged: int = purge_outbox(outbox_max_age)
+        if purged:
+            log("bot", "info", [
+                "perform_compaction",
+                f"{purged} finished notifications purged from the outbox"
+            ])
+        deleted, reclaimed = await compact_chapter_history(
+            keep_last, max_age, batch_size
+        )
+        log("bot", "info", [
+            "perform_compaction",
+            f"{deleted} chapters deleted, {reclaimed} bytes reclaimed"
+        ])
+
+    return _tracked(perform_compaction)
+
+
+def perform_backup_generator(
+    directory: str,
+    prefix: str,
+    keep: int,
+    compress: bool,
+) -> Callable[[], Awaitable[None]]:
+
+    async def perform_backup() -> None:
+        snapshot: Optional[str] = await backup_database(
+            directory, prefix, keep, compress
+        )
+        if snapshot is None:
+            log("bot", "error", ["perform_backup", "Database backup failed"])
+        else:
+            log("bot", "info", [
+                "perform_backup",
+                f"Database backed up to {snapshot}"
+            ])
+
+    return _tracked(perform_backup)
@@ -1,16 +1,24 @@
-from typing import Optional
-from datetime import datetime
+from typing import Any, Optional
+from datetime import datetime, timedelta
 
 try:
     from src.utils import log
-    from src.domain.model import Manga, MangaChapter
-    from src.domain.communications import Chat, Suscription
+    from src.domain.model import (
+        Manga, MangaChapter, MangaIndex, datetime_to_epoch
+    )
+    from src.domain.communications import (
+        Chat, ChatIndex, Suscription, Notification
+    )
     from src.domain.domain_exception import DomainException
     import src.domain.database as idb
 except ModuleNotFoundError:
     from utils import log
-    from domain.model import Manga, MangaChapter
-    from domain.communications import Chat, Suscription
+    from domain.model import (
+        Manga, MangaChapter, MangaIndex, datetime_to_epoch
+    )
+    from domain.communications import (
+        Chat, ChatIndex, Suscription, Notification
+    )
     from domain.domain_exception import DomainException
     import domain.database as idb
 
@@ -62,61 +70,46 @@ class Database:
 
     def read_suscriptions(self) -> list[Suscription]:
         """Reads the suscriptions table"""
-        db_suscriptions: list[tuple[int, str, str]]
-        model_suscriptions: list[Suscription] = []
+        db_suscriptions: list[tuple[int, str, str, int]]
 
         db_suscriptions = self.raw_db.read_suscriptions()
 
-        model_chats: list[Chat] = self.read_chats()
-        model_mangas: list[Manga] = self.read_mangas()
-
-        for suscription in db_suscriptions:
-            sus_chat: Chat = \
-                next(filter(lambda x: x.id == suscription[0], model_chats))
-            sus_manga: Manga = \
-                next(filter(lambda x: x.name == suscription[1], model_mangas))
-            model_suscriptions.append(
-                Suscription(sus_chat, sus_manga, suscription[2])
-            )
-
-        return model_suscriptions
+        return self._suscriptions_from_rows(db_suscriptions)
 
     def read_suscription_by_chat(self, chat_id: int) -> list[Suscription]:
         """Reads the suscriptions table by chat ID"""
-        db_suscriptions: list[tuple[int, str, str]]
-        model_suscriptions: list[Suscription] = []
+        db_suscriptions: list[tuple[int, str, str, int]]
 
         db_suscriptions = self.raw_db.read_suscription_by_chat(chat_id)
 
-        model_chats: list[Chat] = self.read_chats()
-        model_mangas: list[Manga] = self.read_mangas()
-
-        for suscription in db_suscriptions:
-            sus_chat: Chat = \
-                next(filter(lambda x: x.id == suscription[0], model_chats))
-            sus_manga: Manga = \
-                next(filter(lambda x: x.name == suscription[1], model_mangas))
-            model_suscriptions.append(
-                Suscription(sus_chat, sus_manga, suscription[2])
-            )
-
-        return model_suscriptions
+        return self._suscriptions_from_rows(db_suscriptions)
 
     def read_suscription_by_manga(self, manga: str) -> list[Suscription]:
         """Reads the suscriptions table by manga name"""
-        db_suscriptions: list[tuple[int, str, str]]
-        model_suscriptions: list[Suscription] = []
+        db_suscriptions: list[tuple[int, str, str, int]]
 
         db_suscriptions = self.raw_db.read_suscription_by_manga(manga)
 
-        model_chats: list[Chat] = self.read_chats()
-        model_mangas: list[Manga] = self.read_mangas()
+        return self._suscriptions_from_rows(db_suscriptions)
+
+    def _suscriptions_from_rows(
+        self, rows: list[tuple[int, str, str, int]]
+    ) -> list[Suscription]:
+        """Builds the suscriptions joining their chat and manga by ID"""
+        model_suscriptions: list[Suscription] = []
 
-        for suscription in db_suscriptions:
-            sus_chat: Chat = \
-                next(filter(lambda x: x.id == suscription[0], model_chats))
-            sus_manga: Manga = \
-                next(filter(lambda x: x.name == suscription[1], model_mangas))
+        model_chats: ChatIndex = ChatIndex(self.read_chats())
+        model_mangas: MangaIndex = MangaIndex(self.read_mangas())
+
+        for suscription in rows:
+            sus_chat: Optional[Chat] = model_chats.by_id(suscription[0])
+            sus_manga: Optional[Manga] = model_mangas.by_id(suscription[3])
+            if sus_chat is None or sus_manga is None:
+                log("bot", "warning",
+                    ["app.database",
+                     f"Suscription of chat {suscription[0]} to manga "
+                     f"{suscription[1]} without chat or manga"])
+                continue
             model_suscriptions.append(
                 Suscription(sus_chat, sus_manga, suscription[2])
             )
@@ -124,23 +117,15 @@ class Database:
         return model_suscriptions
 
     def read_manga_chapters(self) -> list[MangaChapter]:
-        """Reads the manga_chapters table
-
-        TODO: validate this datetime conversion"""
-        db_manga_chapters: list[tuple[str, ...]]
+        """Reads the manga_chapters table"""
+        db_manga_chapters: list[tuple[Any, ...]]
         model_manga_chapters: list[MangaChapter] = []
 
         db_manga_chapters = self.raw_db.read_manga_chapters()
 
         for chapter in db_manga_chapters:
             model_manga_chapters.append(
-                MangaChapter(
-                    chapter[0],
-                    chapter[1],
-                    chapter[2],
-                    datetime.strptime(chapter[3], "%Y-%m-%d %H:%M:%S"),
-                    chapter[4]
-                )
+                MangaChapter(*chapter[:5], manga_id=chapter[5])
             )
 
         return model_manga_chapters
@@ -148,65 +133,60 @@ class Database:
     def read_manga_chapter_by_manga_name(self, name: str) -> \
             list[MangaChapter]:
         """Reads the manga_chapters table by manga name"""
-        db_manga_chapters: list[tuple[str, ...]]
+        db_manga_chapters: list[tuple[Any, ...]]
         model_manga_chapters: list[MangaChapter] = []
 
         db_manga_chapters = self.raw_db.read_manga_chapter_by_manga_name(name)
 
         for chapter in db_manga_chapters:
             model_manga_chapters.append(
-                MangaChapter(
-                    chapter[0],
-                    chapter[1],
-                    chapter[2],
-                    datetime.strptime(chapter[3], "%Y-%m-%d %H:%M:%S"),
-                    chapter[4]
-                )
+                MangaChapter(*chapter[:5], manga_id=chapter[5])
             )
 
         return model_manga_chapters
 
     def read_mangas(self) -> list[Manga]:
-        """Reads the mangas table"""
-        db_mangas: list[tuple[str, ...]]
+        """Reads the mangas table, along with each manga last chapter"""
+        db_mangas: list[tuple[Any, ...]]
         model_mangas: list[Manga] = []
 
-        db_mangas = self.raw_db.read_mangas()
+        db_mangas = self.raw_db.read_mangas_with_last_chapter()
 
         for manga in db_mangas:
-
-            model_chapters: list[MangaChapter] = \
-                self.read_manga_chapter_by_manga_name(manga[0])
-
-            latest: Optional[MangaChapter] = None
-            for chapter in model_chapters:
-                if not latest or latest.date < chapter.date:
-                    latest = chapter
-
-            model_mangas.append(Manga(manga[0], manga[1], latest))
+            model_mangas.append(self._manga_from_row(manga))
 
         return model_mangas
 
     def read_manga_by_name(self, name: str) -> list[Manga]:
         """Reads the mangas table by name"""
-        db_mangas: list[tuple[str, ...]]
+        db_mangas: list[tuple[Any, ...]]
         model_mangas: list[Manga] = []
 
-        db_mangas = self.raw_db.read_manga_by_name(name)
+        db_mangas = self.raw_db.read_manga_with_last_chapter_by_name(name)
 
         for manga in db_mangas:
+            model_mangas.append(self._manga_from_row(manga))
 
-            model_chapters: list[MangaChapter] = \
-                self.read_manga_chapter_by_manga_name(manga[0])
+        return model_mangas
 
-            latest: Optional[MangaChapter] = None
-            for chapter in model_chapters:
-                if not latest or latest.date < chapter.date:
-                    latest = chapter
+    @staticmethod
+    def _manga_from_row(row: tuple[Any, ...]) -> Manga:
+        """Builds a manga from a row joined with its last chapter columns"""
+        last_chapter: Optional[MangaChapter] = None
+        if row[2] is not None:
+            last_chapter = MangaChapter(*row[2:7], manga_id=row[7])
 
-            model_mangas.append(Manga(manga[0], manga[1], latest))
+        return Manga(row[0], row[1], last_chapter, row[7])
 
-        return model_mangas
+    def read_manga_by_id(self, manga_id: int) -> Optional[Manga]:
+        """Reads the mangas table by ID"""
+        db_mangas: list[tuple[Any, ...]] = \
+            self.raw_db.read_manga_with_last_chapter_by_id(manga_id)
+
+        if not db_mangas:
+            return None
+
+        return self._manga_from_row(db_mangas[0])
 
     def insert_chat(self, chat_id: int, chat_name: str) -> bool:
         """Inserts a chat into the database"""
@@ -241,7 +221,7 @@ class Database:
         done: bool = True
         if not self.raw_db.insert_manga_chapter(
             chapter_name, chapter_number, chapter_url,
-            datetime.strftime(chapter_date, "%Y-%m-%d %H:%M:%S"),
+            datetime_to_epoch(chapter_date),
             manga_name
         ):
             done = False
@@ -336,6 +316,91 @@ class Database:
 
         return done
 
+    def enqueue_notifications(self, chapter: MangaChapter,
+                              chats: list[Chat]) -> bool:
+        """Writes the chapter notifications for the chats to the outbox, and
+        marks it as their suscriptions last chapter in the same transaction"""
+        if chapter.manga_id is None:
+            log("bot", "error",
+                ["app.database",
+                 f"Chapter {chapter.name} without manga ID can't be enqueued"])
+            return False
+
+        done: bool = self.raw_db.enqueue_notifications(
+            [chat.id for chat in chats], chapter.manga_id, chapter.name,
+            chapter.number, chapter.url, datetime_to_epoch(datetime.now())
+        )
+        if not done:
+            log("bot", "error",
+                ["app.database",
+                 f"Coudn't enqueue notifications for chapter {chapter.name}"])
+
+        return done
+
+    def read_pending_notifications(self, after: int, max_attempts: int,
+                                   limit: int) -> list[Notification]:
+        """Reads up to `limit` undelivered notifications after the given ID
+        that have attempts left, in the order they were enqueued"""
+        return [
+            Notification(
+                row[0], row[1], Chat(row[3], row[4]),
+                MangaChapter(row[7], row[8], row[9], row[10], row[6],
+                             manga_id=row[5]),
+                row[2]
+            )
+            for row in self.raw_db.read_pending_notifications(
+                after, max_attempts, limit
+            )
+        ]
+
+    def mark_notifications(self, delivered: list[int],
+                           failed: list[int]) -> bool:
+        """Marks the notifications as delivered, or counts the failed
+        attempt"""
+        return self.raw_db.mark_notifications(
+            delivered, failed, datetime_to_epoch(datetime.now())
+        )
+
+    def delete_finished_notifications(self, max_age: timedelta,
+                                      max_attempts: int) -> int:
+        """Deletes the notifications delivered longer than `max_age` ago, and
+        the ones enqueued before that which ran out of attempts"""
+        return self.raw_db.delete_finished_notifications(
+            datetime_to_epoch(datetime.now() - max_age), max_attempts
+        )
+
+    def delete_expired_manga_chapters(self, keep_last: int,
+                                      max_age: Optional[timedelta],
+                                      limit: int) -> int:
+        """Deletes up to `limit` chapters outside the retention policy: the
+        newest `keep_last` chapters of each manga (0 disables the rule) and
+        those younger than `max_age` (None disables it) are kept"""
+        cutoff: Optional[int] = None
+        if max_age is not None:
+            cutoff = datetime_to_epoch(datetime.now() - max_age)
+
+        return self.raw_db.delete_expired_manga_chapters(keep_last, cutoff,
+                                                         limit)
+
+    def size(self) -> int:
+        """Size in bytes of the database"""
+        return self.raw_db.size()
+
+    def compact(self) -> None:
+        """Reclaims free space and refreshes the query planner statistics.
+        Blocking: meant to be run in a worker thread"""
+        self.raw_db.compact()
+
+    def backup(self, target: str, pages: int = 64,
+               sleep: float = 0.01) -> bool:
+        """Copies a consistent snapshot of the database into the target file.
+        Blocking: meant to be run in a worker thread"""
+        return self.raw_db.backup(target, pages, sleep)
+
+    def restore(self, source: str) -> bool:
+        """Replaces the database content with the given snapshot"""
+        return self.raw_db.restore(source)
+
     def close(self) -> None:
         """Closes the database connection"""
         self.raw_db.close()
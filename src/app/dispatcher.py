@@ -1,3 +1,5 @@
+import time
+from collections import OrderedDict
 from typing import Any, Optional, Callable, Awaitable
 
 try:
@@ -89,18 +91,96 @@ class Responder:
         )
 
 
+class SeenEvents:
+    """Bounded set of the events recently handled. Events are forgotten
+    after `ttl` seconds, or oldest first past `max_size`"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        # Event key -> time seen, oldest first
+        self._seen: OrderedDict[str, float] = OrderedDict()
+
+        self.duplicates: int = 0
+        self.evicted: int = 0
+
+    def add(self, key: str) -> bool:
+        """Records the event. Returns False if it was already seen"""
+        now: float = self._clock()
+        while self._seen:
+            oldest, seen = next(iter(self._seen.items()))
+            if now - seen < self._ttl:
+                break
+            del self._seen[oldest]
+
+        if key in self._seen:
+            self.duplicates += 1
+            return False
+
+        self._seen[key] = now
+        if len(self._seen) > self._max_size:
+            self._seen.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def discard(self, key: str) -> None:
+        self._seen.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._seen),
+            "duplicates": self.duplicates,
+            "evicted": self.evicted,
+        }
+
+
+def chat_key(envelope: dict[str, Any]) -> Optional[int]:
+    """Ordering key of an event: its chat, whose events are handled one at a
+    time in arrival order"""
+    return envelope.get("chat_id")
+
+
+def event_key(envelope: dict[str, Any]) -> Optional[str]:
+    """Identity of an event: its ID, or else its callback query or message"""
+    if envelope.get("event_id"):
+        return f"event:{envelope['event_id']}"
+    if envelope.get("callback_id"):
+        return f"callback:{envelope['callback_id']}"
+    if envelope.get("message_id") is not None:
+        return f"message:{envelope.get('chat_id', 0)}:{envelope['message_id']}"
+    return None
+
+
 class EventDispatcher:
     def __init__(
         self,
         publisher: ResponsePublisher,
         command_map: dict[str, Handler],
         callback_map: dict[str, Handler],
+        seen: Optional[SeenEvents] = None,
     ) -> None:
         self._publisher = publisher
         self._command_map = command_map
         self._callback_map = callback_map
+        # Redelivered events are dropped before reaching the handlers
+        self.seen: SeenEvents = seen if seen is not None else SeenEvents()
 
     async def handle_event(self, envelope: dict[str, Any]) -> None:
+        key: Optional[str] = event_key(envelope)
+        if key is not None and not self.seen.add(key):
+            return
+
+        try:
+            await self._dispatch(envelope)
+        except Exception:
+            # Let a retry of the event through
+            if key is not None:
+                self.seen.discard(key)
+            raise
+
+    async def _dispatch(self, envelope: dict[str, Any]) -> None:
         event_type = envelope.get("event_type", "")
         chat_id = envelope.get("chat_id", 0)
         user_id = envelope.get("user_id", 0)
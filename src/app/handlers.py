@@ -4,8 +4,8 @@ try:
     from src.utils import log
     import src.utils as icons
     from src.app.client import memory, LANG_DICT
-    from src.app.actions import delete_suscription
-    from src.domain.model import Manga, search_manga_by_name
+    from src.app.actions import delete_suscription, mark_for_reporting
+    from src.domain.model import Manga
     import src.domain.communications as comms
     from src.app.messages import (
         pg_text_inline_keyboard,
@@ -16,8 +16,8 @@ except ModuleNotFoundError:
     from utils import log
     import utils as icons
     from app.client import memory, LANG_DICT
-    from app.actions import delete_suscription
-    from domain.model import Manga, search_manga_by_name
+    from app.actions import delete_suscription, mark_for_reporting
+    from domain.model import Manga
     import domain.communications as comms
     from app.messages import (
         pg_text_inline_keyboard,
@@ -96,18 +96,14 @@ async def cb_add_manga(
             selection_name: str = \
                 pg_get_element_by_position(mangas, page_num, int(selection))
 
-            sel_manga: Optional[Manga] = search_manga_by_name(
-                memory.read_mangas(),
-                selection_name
-            )
-            assert sel_manga is not None, f"Manga not found: {selection_name}"
-
-            already_exists: bool = False
-            my_sus: list[comms.Suscription] = \
-                memory.read_suscription_by_chat(chat_id)
+            found: list[Manga] = memory.read_manga_by_name(selection_name)
+            assert found, f"Manga not found: {selection_name}"
+            sel_manga: Manga = found[0]
 
-            if comms.search_suscriptions_by_manga(my_sus, sel_manga):
-                already_exists = True
+            already_exists: bool = any(
+                sus.manga.name == sel_manga.name
+                for sus in memory.read_suscription_by_chat(chat_id)
+            )
 
             if already_exists:
                 await responder.edit_text(
@@ -120,6 +116,7 @@ async def cb_add_manga(
                 manga_name=sel_manga.name,
                 last_chapter=""
             ):
+                mark_for_reporting(sel_manga.name)
                 await responder.answer_callback(
                     LANG_DICT["cmd"]["add"]["done"]
                 )
@@ -361,10 +358,14 @@ async def cb_list_suscribed_mangas(
             selection_name: str = \
                 pg_get_element_by_position(mangas, page_num, int(selection))
 
-            sel_manga: Optional[Manga] = search_manga_by_name(
-                memory.read_mangas(),
-                selection_name
-            )
+            target_sus: Optional[comms.Suscription] = \
+                next((sc for sc in sus if sc.manga.name == selection_name),
+                     None)
+            assert target_sus is not None and target_sus.manga.id is not None, \
+                f"Suscription not found: {selection_name}"
+
+            sel_manga: Optional[Manga] = \
+                memory.read_manga_by_id(target_sus.manga.id)
             assert sel_manga is not None, f"Manga not found: {selection_name}"
 
             if sel_manga:
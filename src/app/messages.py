@@ -13,6 +13,22 @@ if os.getenv("TB_CHAPTER_NOTIFIER_TEST", "False") == "True" or \
 else:
     MODULE_PATH: str = os.getcwd()
 
+# Longest text Telegram accepts in a single message, in UTF-16 code units
+MESSAGE_MAX_LENGTH: int = 4096
+
+
+def utf16_length(text: str) -> int:
+    """Length of the text as Telegram counts it: characters outside the
+    Basic Multilingual Plane, like most emojis, take two UTF-16 code units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _utf16_cut(text: str, length: int) -> str:
+    """The text cut to at most `length` UTF-16 code units, without splitting
+    a surrogate pair"""
+    return text.encode("utf-16-le")[:length * 2].decode("utf-16-le",
+                                                         errors="ignore")
+
 
 def _page_items(items: list[str], page_items: int, page: int) \
         -> tuple[list[list[str]], int]:
@@ -86,6 +102,34 @@ def prepare_message(content: Any) -> str:
         return " ".join(content)
 
 
+def split_message(header: str, lines: list[str],
+                  limit: int = MESSAGE_MAX_LENGTH) -> list[str]:
+    """Joins the lines after the header into as few messages as fit within
+    the limit, each one starting with the header. Lines are kept whole unless
+    a single one doesn't fit on its own, in which case it's cut. Lengths are
+    measured in UTF-16 code units, as Telegram does"""
+    messages: list[str] = []
+    room: int = max(limit - utf16_length(header), 1)
+    current: list[str] = []
+    length: int = 0
+
+    for line in lines:
+        line_length: int = utf16_length(line)
+        if line_length > room:
+            line = _utf16_cut(line, room)
+            line_length = utf16_length(line)
+        if current and length + line_length > room:
+            messages.append(header + "".join(current))
+            current, length = [], 0
+        current.append(line)
+        length += line_length
+
+    if current or not messages:
+        messages.append(header + "".join(current))
+
+    return messages
+
+
 def pg_get_element_by_position(items: list[str], page: int,
                                position: int,
                                max_line_blocks: int = 3) -> str:
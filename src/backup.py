@@ -0,0 +1,58 @@
+"""
+Chapter Notifier database backup tool
+
+Takes an online snapshot of the database, or restores one, using the same
+configuration as the bot:
+
+    python backup.py create
+    python backup.py restore <snapshot>
+"""
+import sys
+import asyncio
+
+try:
+    from src.app.client import (
+        BACKUP_DIRPATH,
+        BACKUP_PREFIX,
+        BACKUP_KEEP,
+        BACKUP_COMPRESS,
+    )
+    from src.app.actions import backup_database, restore_database
+    from src.utils import log
+except ModuleNotFoundError:
+    from app.client import (
+        BACKUP_DIRPATH,
+        BACKUP_PREFIX,
+        BACKUP_KEEP,
+        BACKUP_COMPRESS,
+    )
+    from app.actions import backup_database, restore_database
+    from utils import log
+
+
+def main(args: list[str]) -> int:
+    if len(args) == 1 and args[0] == "create":
+        snapshot = asyncio.run(backup_database(
+            BACKUP_DIRPATH or "data/backups",
+            BACKUP_PREFIX,
+            BACKUP_KEEP,
+            BACKUP_COMPRESS,
+        ))
+        if snapshot is None:
+            return 1
+        log("bot", "info", ["backup", f"Database backed up to {snapshot}"])
+
+    elif len(args) == 2 and args[0] == "restore":
+        if not restore_database(args[1]):
+            return 1
+        log("bot", "info", ["backup", f"Database restored from {args[1]}"])
+
+    else:
+        print(__doc__)
+        return 2
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,19 +1,19 @@
 """Module in charge to define the model to represent the objects required for
 user communication in the app"""
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 from dataclasses import dataclass
 
 try:
     from src.utils import log
-    from src.domain.model import Manga
+    from src.domain.model import Manga, MangaChapter
     from src.domain.domain_exception import DomainException
 except ModuleNotFoundError:
     from utils import log
-    from domain.model import Manga
+    from domain.model import Manga, MangaChapter
     from domain.domain_exception import DomainException
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Chat():
     """Models a chat that has some suscription for the bot.
 
@@ -24,7 +24,7 @@ class Chat():
     name:   str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Suscription():
     """Models a suscription that someone has performed for some manga at a
     specific chat.
@@ -40,6 +40,51 @@ class Suscription():
     last:   str
 
 
+@dataclass(frozen=True, slots=True)
+class Notification():
+    """Models a chapter notification waiting in the outbox to be published.
+
+    - ID of the outbox entry
+    - Key identifying the notification, stable across retries
+    - Chat to notify
+    - Chapter to notify, along with its manga
+    - Attempts made so far
+    """
+    id:         int
+    key:        str
+    chat:       Chat
+    chapter:    MangaChapter
+    attempts:   int
+
+
+class ChatIndex():
+    """Collection of chats indexed by ID, iterated in insertion order"""
+
+    def __init__(self, chats: Iterable[Chat] = ()) -> None:
+        self._by_id: dict[int, Chat] = {}
+
+        for chat in chats:
+            self.add(chat)
+
+    def add(self, chat: Chat) -> None:
+        self._by_id[chat.id] = chat
+
+    def remove(self, chat_id: int) -> Optional[Chat]:
+        return self._by_id.pop(chat_id, None)
+
+    def by_id(self, chat_id: int) -> Optional[Chat]:
+        return self._by_id.get(chat_id)
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._by_id
+
+    def __iter__(self) -> Iterator[Chat]:
+        return iter(self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+
 def search_chat_by_id(chats: list[Chat], target_chat: Chat) -> Optional[Chat]:
     """Searchs the manga list by provided ID"""
     item: Optional[Chat] = None
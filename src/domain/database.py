@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Any, Optional
 from sqlite3 import OperationalError
 
 try:
@@ -23,11 +23,11 @@ SQL_CREATE_CHATS_TABLE = '''
 SQL_CREATE_SUSCRIPTIONS_TABLE = '''
     CREATE TABLE IF NOT EXISTS suscriptions (
         chat INTEGER NOT NULL,
-        manga TEXT NOT NULL,
+        manga INTEGER NOT NULL,
         last TEXT,
         PRIMARY KEY (chat, manga),
         FOREIGN KEY (chat) REFERENCES chats (id),
-        FOREIGN KEY (manga) REFERENCES mangas (name)
+        FOREIGN KEY (manga) REFERENCES mangas (id)
     )
 '''
 
@@ -36,22 +36,175 @@ SQL_CREATE_MANGA_CHAPTERS_TABLE = '''
         name TEXT NOT NULL,
         number TEXT,
         url TEXT,
-        date TEXT,
-        manga TEXT NOT NULL,
+        date INTEGER,
+        manga INTEGER NOT NULL,
         PRIMARY KEY (manga, name),
-        FOREIGN KEY (manga) REFERENCES mangas (name)
+        FOREIGN KEY (manga) REFERENCES mangas (id)
     )
 '''
 
 SQL_CREATE_MANGAS_TABLE = '''
     CREATE TABLE IF NOT EXISTS mangas (
-        name TEXT PRIMARY KEY,
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
         url TEXT NOT NULL,
-        last_chapter TEXT,
-        FOREIGN KEY (last_chapter) REFERENCES manga_chapters (name)
+        last_chapter TEXT
+    )
+'''
+
+SQL_CREATE_MANGA_CHAPTERS_DATE_INDEX = '''
+    CREATE INDEX IF NOT EXISTS manga_chapters_manga_date
+    ON manga_chapters (manga, date)
+'''
+
+# Notifications pending to be published, written along with the suscription
+# update that they report. The key identifies the notification to the
+# consumers, so a republished one can be told apart.
+SQL_CREATE_OUTBOX_TABLE = '''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        chat INTEGER NOT NULL,
+        manga INTEGER NOT NULL,
+        chapter TEXT NOT NULL,
+        number TEXT,
+        url TEXT,
+        created INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        delivered INTEGER,
+        FOREIGN KEY (chat) REFERENCES chats (id),
+        FOREIGN KEY (manga) REFERENCES mangas (id)
     )
 '''
 
+SQL_CREATE_OUTBOX_PENDING_INDEX = '''
+    CREATE INDEX IF NOT EXISTS outbox_pending
+    ON outbox (id) WHERE delivered IS NULL
+'''
+
+SQL_READ_SCHEMA_VERSION = '''
+    PRAGMA user_version
+'''
+
+SQL_READ_TABLE_EXISTS = '''
+    SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?
+'''
+
+# Newest first order of the chapters of a manga. Dates are whole seconds, so
+# chapters dated the same are ranked by insertion, latest first. Every query
+# that picks or keeps the newest chapters must share it.
+CHAPTER_RECENCY: str = "date DESC, rowid DESC"
+
+# Migrations are indexed by the schema version they lead to. Each one is run as
+# a single transaction and is in charge of stamping its own version.
+SQL_MIGRATIONS: dict[int, str] = {
+    # Chapter dates from "%Y-%m-%d %H:%M:%S" text to integer epoch seconds
+    1: '''
+        CREATE TABLE manga_chapters_v1 (
+            name TEXT NOT NULL,
+            number TEXT,
+            url TEXT,
+            date INTEGER,
+            manga TEXT NOT NULL,
+            PRIMARY KEY (manga, name),
+            FOREIGN KEY (manga) REFERENCES mangas (name)
+        );
+        INSERT INTO manga_chapters_v1 (name, number, url, date, manga)
+            SELECT name, number, url,
+                   CASE WHEN typeof(date) = 'text'
+                        THEN CAST(strftime('%s', date) AS INTEGER)
+                        ELSE date END,
+                   manga
+            FROM manga_chapters;
+        DROP TABLE manga_chapters;
+        ALTER TABLE manga_chapters_v1 RENAME TO manga_chapters;
+        PRAGMA user_version = 1;
+    ''',
+    # Backfill the mangas.last_chapter pointer from the chapter history
+    2: f'''
+        UPDATE mangas SET last_chapter = (
+            SELECT name FROM manga_chapters
+            WHERE manga_chapters.manga = mangas.name
+            ORDER BY {CHAPTER_RECENCY} LIMIT 1
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM manga_chapters
+            WHERE manga_chapters.manga = mangas.name
+        );
+        PRAGMA user_version = 2;
+    ''',
+    # Integer surrogate keys for mangas, referenced by chapters and
+    # suscriptions instead of the manga name. Mangas missing for orphan
+    # chapters or suscriptions are created, pointing to their newest chapter
+    3: f'''
+        CREATE TABLE mangas_v3 (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            url TEXT NOT NULL,
+            last_chapter TEXT
+        );
+        INSERT INTO mangas_v3 (name, url, last_chapter)
+            SELECT name, url, last_chapter FROM mangas ORDER BY rowid;
+        INSERT OR IGNORE INTO mangas_v3 (name, url)
+            SELECT DISTINCT manga, '' FROM manga_chapters;
+        INSERT OR IGNORE INTO mangas_v3 (name, url)
+            SELECT DISTINCT manga, '' FROM suscriptions;
+
+        CREATE TABLE manga_chapters_v3 (
+            name TEXT NOT NULL,
+            number TEXT,
+            url TEXT,
+            date INTEGER,
+            manga INTEGER NOT NULL,
+            PRIMARY KEY (manga, name),
+            FOREIGN KEY (manga) REFERENCES mangas (id)
+        );
+        INSERT INTO manga_chapters_v3 (name, number, url, date, manga)
+            SELECT c.name, c.number, c.url, c.date, m.id
+            FROM manga_chapters c JOIN mangas_v3 m ON m.name = c.manga
+            ORDER BY c.rowid;
+        UPDATE mangas_v3 SET last_chapter = (
+            SELECT name FROM manga_chapters_v3
+            WHERE manga_chapters_v3.manga = mangas_v3.id
+            ORDER BY {CHAPTER_RECENCY} LIMIT 1
+        )
+        WHERE last_chapter IS NULL AND EXISTS (
+            SELECT 1 FROM manga_chapters_v3
+            WHERE manga_chapters_v3.manga = mangas_v3.id
+        );
+
+        CREATE TABLE suscriptions_v3 (
+            chat INTEGER NOT NULL,
+            manga INTEGER NOT NULL,
+            last TEXT,
+            PRIMARY KEY (chat, manga),
+            FOREIGN KEY (chat) REFERENCES chats (id),
+            FOREIGN KEY (manga) REFERENCES mangas (id)
+        );
+        INSERT INTO suscriptions_v3 (chat, manga, last)
+            SELECT s.chat, m.id, s.last
+            FROM suscriptions s JOIN mangas_v3 m ON m.name = s.manga;
+
+        DROP TABLE suscriptions;
+        DROP TABLE manga_chapters;
+        DROP TABLE mangas;
+        ALTER TABLE mangas_v3 RENAME TO mangas;
+        ALTER TABLE manga_chapters_v3 RENAME TO manga_chapters;
+        ALTER TABLE suscriptions_v3 RENAME TO suscriptions;
+        CREATE INDEX manga_chapters_manga_date
+            ON manga_chapters (manga, date);
+        PRAGMA user_version = 3;
+    ''',
+    # Notifications outbox
+    4: f'''
+        {SQL_CREATE_OUTBOX_TABLE};
+        {SQL_CREATE_OUTBOX_PENDING_INDEX};
+        PRAGMA user_version = 4;
+    ''',
+}
+
+SCHEMA_VERSION: int = max(SQL_MIGRATIONS)
+
 SQL_READ_CHATS_TABLE = '''
     SELECT * FROM chats
 '''
@@ -61,31 +214,68 @@ SQL_READ_CHATS_WHERE_ID = '''
 '''
 
 SQL_READ_SUS_TABLE = '''
-    SELECT * FROM suscriptions
+    SELECT s.chat, m.name, s.last, s.manga
+    FROM suscriptions s JOIN mangas m ON m.id = s.manga
 '''
 
 SQL_READ_SUS_WHERE_CHAT = '''
-    SELECT * FROM suscriptions WHERE chat = ?
+    SELECT s.chat, m.name, s.last, s.manga
+    FROM suscriptions s JOIN mangas m ON m.id = s.manga
+    WHERE s.chat = ?
 '''
 
 SQL_READ_SUS_WHERE_MANGA = '''
-    SELECT * FROM suscriptions WHERE manga = ?
+    SELECT s.chat, m.name, s.last, s.manga
+    FROM suscriptions s JOIN mangas m ON m.id = s.manga
+    WHERE m.name = ?
+'''
+
+SQL_READ_MANGAS_WITH_LAST_CHAPTER_WHERE_ID = '''
+    SELECT m.name, m.url,
+           c.name, c.number, c.url, c.date, m.name,
+           m.id
+    FROM mangas m
+    LEFT JOIN manga_chapters c
+        ON c.manga = m.id AND c.name = m.last_chapter
+    WHERE m.id = ?
 '''
 
 SQL_READ_MANGA_CHAPTERS_TABLE = '''
-    SELECT * FROM manga_chapters
+    SELECT c.name, c.number, c.url, c.date, m.name, c.manga
+    FROM manga_chapters c JOIN mangas m ON m.id = c.manga
 '''
 
 SQL_READ_MANGA_CHAPTERS_WHERE_MANGA_NAME = '''
-    SELECT * FROM manga_chapters WHERE manga = ?
+    SELECT c.name, c.number, c.url, c.date, m.name, c.manga
+    FROM manga_chapters c JOIN mangas m ON m.id = c.manga
+    WHERE m.name = ?
 '''
 
 SQL_READ_MANGAS_TABLE = '''
-    SELECT * FROM mangas
+    SELECT name, url, last_chapter, id FROM mangas
 '''
 
 SQL_READ_MANGAS_WHERE_NAME = '''
-    SELECT * FROM mangas WHERE name = ?
+    SELECT name, url, last_chapter, id FROM mangas WHERE name = ?
+'''
+
+SQL_READ_MANGAS_WITH_LAST_CHAPTER = '''
+    SELECT m.name, m.url,
+           c.name, c.number, c.url, c.date, m.name,
+           m.id
+    FROM mangas m
+    LEFT JOIN manga_chapters c
+        ON c.manga = m.id AND c.name = m.last_chapter
+'''
+
+SQL_READ_MANGAS_WITH_LAST_CHAPTER_WHERE_NAME = '''
+    SELECT m.name, m.url,
+           c.name, c.number, c.url, c.date, m.name,
+           m.id
+    FROM mangas m
+    LEFT JOIN manga_chapters c
+        ON c.manga = m.id AND c.name = m.last_chapter
+    WHERE m.name = ?
 '''
 
 SQL_INSERT_CHAT = '''
@@ -93,12 +283,13 @@ SQL_INSERT_CHAT = '''
 '''
 
 SQL_INSERT_SUSCRIPTION = '''
-    INSERT INTO suscriptions (chat, manga, last) VALUES (?, ?, ?)
+    INSERT INTO suscriptions (chat, manga, last)
+    VALUES (?, (SELECT id FROM mangas WHERE name = ?), ?)
 '''
 
 SQL_INSERT_MANGA_CHAPTER = '''
     INSERT INTO manga_chapters (name, number, url, date, manga)
-    VALUES (?, ?, ?, ?, ?)
+    VALUES (?, ?, ?, ?, (SELECT id FROM mangas WHERE name = ?))
 '''
 
 SQL_INSERT_MANGA = '''
@@ -110,11 +301,24 @@ SQL_DELETE_CHAT = '''
 '''
 
 SQL_DELETE_SUSCRIPTION = '''
-    DELETE FROM suscriptions WHERE chat = ? AND manga = ?
+    DELETE FROM suscriptions
+    WHERE chat = ? AND manga = (SELECT id FROM mangas WHERE name = ?)
+'''
+
+# Delivered notifications go too: their key would match the notifications of
+# a suscription made again later, which would be ignored
+SQL_DELETE_OUTBOX_WHERE_SUSCRIPTION = '''
+    DELETE FROM outbox
+    WHERE chat = ? AND manga = (SELECT id FROM mangas WHERE name = ?)
+'''
+
+SQL_DELETE_OUTBOX_WHERE_CHAT = '''
+    DELETE FROM outbox WHERE chat = ?
 '''
 
 SQL_DELETE_MANGA_CHAPTER = '''
-    DELETE FROM manga_chapters WHERE name = ? AND manga = ?
+    DELETE FROM manga_chapters
+    WHERE name = ? AND manga = (SELECT id FROM mangas WHERE name = ?)
 '''
 
 SQL_DELETE_MANGA = '''
@@ -126,7 +330,8 @@ SQL_UPDATE_CHAT_NAME = '''
 '''
 
 SQL_UPDATE_SUSCRIPTION_LAST = '''
-    UPDATE suscriptions SET last = ? WHERE chat = ? AND manga = ?
+    UPDATE suscriptions SET last = ?
+    WHERE chat = ? AND manga = (SELECT id FROM mangas WHERE name = ?)
 '''
 
 # SQL_UPDATE_MANGA_CHAPTER: Not happening
@@ -135,6 +340,120 @@ SQL_UPDATE_MANGA = '''
     UPDATE mangas SET last_chapter = ? WHERE name = ?
 '''
 
+# Moves the pointer to the given chapter if it's now the newest one
+SQL_UPDATE_MANGA_IF_NEWER = f'''
+    UPDATE mangas SET last_chapter = ?
+    WHERE name = ? AND ? = (
+        SELECT name FROM manga_chapters
+        WHERE manga_chapters.manga = mangas.id
+        ORDER BY {CHAPTER_RECENCY} LIMIT 1
+    )
+'''
+
+# Points the manga back to its newest chapter if its pointer was the given one
+SQL_UPDATE_MANGA_REPOINT = f'''
+    UPDATE mangas SET last_chapter = (
+        SELECT name FROM manga_chapters
+        WHERE manga_chapters.manga = mangas.id
+        ORDER BY {CHAPTER_RECENCY} LIMIT 1
+    )
+    WHERE name = ? AND last_chapter = ?
+'''
+
+
+# A newer chapter supersedes the notifications of the chat for that manga that
+# are still pending
+SQL_DELETE_OUTBOX_SUPERSEDED = '''
+    DELETE FROM outbox
+    WHERE chat = ? AND manga = ? AND chapter <> ? AND delivered IS NULL
+'''
+
+SQL_INSERT_OUTBOX = '''
+    INSERT OR IGNORE INTO outbox (key, chat, manga, chapter, number, url,
+                                  created)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_UPDATE_SUSCRIPTION_LAST_WHERE_IDS = '''
+    UPDATE suscriptions SET last = ? WHERE chat = ? AND manga = ?
+'''
+
+SQL_READ_OUTBOX_PENDING = '''
+    SELECT o.id, o.key, o.attempts, o.chat, ch.name, o.manga, m.name,
+           o.chapter, o.number, o.url, o.created
+    FROM outbox o
+    JOIN chats ch ON ch.id = o.chat
+    JOIN mangas m ON m.id = o.manga
+    WHERE o.delivered IS NULL AND o.attempts < ? AND o.id > ?
+    ORDER BY o.id
+    LIMIT ?
+'''
+
+SQL_UPDATE_OUTBOX_DELIVERED = '''
+    UPDATE outbox SET delivered = ?, attempts = attempts + 1 WHERE id = ?
+'''
+
+SQL_UPDATE_OUTBOX_FAILED = '''
+    UPDATE outbox SET attempts = attempts + 1 WHERE id = ?
+'''
+
+# Delivered notifications, and those given up on, older than the cutoff
+SQL_DELETE_OUTBOX_FINISHED = '''
+    DELETE FROM outbox
+    WHERE delivered < ? OR (delivered IS NULL AND attempts >= ? AND created < ?)
+'''
+
+# Deletes up to a batch of chapters outside the retention policy. A chapter is
+# kept if it's among the newest `keep_last` of its manga (disabled when <= 0)
+# or newer than the cutoff (disabled when NULL). The chapter a manga points to
+# as its last one is never deleted.
+SQL_DELETE_EXPIRED_MANGA_CHAPTERS = f'''
+    DELETE FROM manga_chapters WHERE rowid IN (
+        SELECT c.rowid FROM (
+            SELECT rowid, name, date, manga, ROW_NUMBER() OVER (
+                PARTITION BY manga ORDER BY {CHAPTER_RECENCY}
+            ) AS position
+            FROM manga_chapters
+        ) c
+        JOIN mangas m ON m.id = c.manga
+        WHERE c.name IS NOT m.last_chapter
+          AND (? <= 0 OR c.position > ?)
+          AND (? IS NULL OR c.date < ?)
+        LIMIT ?
+    )
+'''
+
+SQL_SET_INCREMENTAL_AUTO_VACUUM = '''
+    PRAGMA auto_vacuum = INCREMENTAL
+'''
+
+SQL_READ_AUTO_VACUUM = '''
+    PRAGMA auto_vacuum
+'''
+
+SQL_READ_PAGE_COUNT = '''
+    PRAGMA page_count
+'''
+
+SQL_READ_PAGE_SIZE = '''
+    PRAGMA page_size
+'''
+
+SQL_VACUUM = '''
+    VACUUM
+'''
+
+SQL_INCREMENTAL_VACUUM = '''
+    PRAGMA incremental_vacuum
+'''
+
+SQL_OPTIMIZE = '''
+    PRAGMA optimize
+'''
+
+# PRAGMA auto_vacuum reports INCREMENTAL as 2
+AUTO_VACUUM_INCREMENTAL: int = 2
+
 
 class Database:
     """Class to manage the database operations with primitive types"""
@@ -162,16 +481,48 @@ class Database:
             raise DomainException("Error initializing the database")
 
     def create(self) -> None:
-        """Creates the database and the tables if they don't exist"""
+        """Creates the database and the tables if they don't exist. An
+        existing database is migrated to the current schema first"""
         try:
+            fresh: bool = not self.manager.read_query(SQL_READ_TABLE_EXISTS,
+                                                      "mangas")
+            if fresh:
+                self.manager.exc_query(SQL_SET_INCREMENTAL_AUTO_VACUUM)
+            else:
+                self.migrate()
+
             self.manager.exc_query(SQL_CREATE_CHATS_TABLE)
             self.manager.exc_query(SQL_CREATE_SUSCRIPTIONS_TABLE)
             self.manager.exc_query(SQL_CREATE_MANGA_CHAPTERS_TABLE)
             self.manager.exc_query(SQL_CREATE_MANGAS_TABLE)
+            self.manager.exc_query(SQL_CREATE_MANGA_CHAPTERS_DATE_INDEX)
+            self.manager.exc_query(SQL_CREATE_OUTBOX_TABLE)
+            self.manager.exc_query(SQL_CREATE_OUTBOX_PENDING_INDEX)
+
+            if fresh:
+                self.manager.exc_query(
+                    f"PRAGMA user_version = {SCHEMA_VERSION}"
+                )
         except InfrastructureException as e:
             log("bot", "error", ["domain.database", f"Error initializating the database: {e}"])
             raise DomainException("Error initializating the database")
 
+    def schema_version(self) -> int:
+        """Reads the schema version stamped in the database"""
+        return int(self.manager.read_query(SQL_READ_SCHEMA_VERSION)[0][0])
+
+    def migrate(self) -> None:
+        """Applies, in order, the migrations the database is missing"""
+        current: int = self.schema_version()
+
+        for version in sorted(SQL_MIGRATIONS):
+            if version <= current:
+                continue
+
+            log("bot", "info",
+                ["domain.database", f"Migrating schema to version {version}"])
+            self.manager.exc_script(SQL_MIGRATIONS[version])
+
     def read_chats(self) -> list[tuple[int, str]]:
         """Reads the chats table"""
         db_chats: list[tuple[str, ...]]
@@ -199,43 +550,43 @@ class Database:
 
         return chat
 
-    def read_suscriptions(self) -> list[tuple[int, str, str]]:
+    def read_suscriptions(self) -> list[tuple[int, str, str, int]]:
         """Reads the suscriptions table"""
         db_suscriptions: list[tuple[str, ...]]
-        suscriptions: list[tuple[int, str, str]] = []
+        suscriptions: list[tuple[int, str, str, int]] = []
 
         db_suscriptions = self.manager.read_query(SQL_READ_SUS_TABLE)
 
         for sus in db_suscriptions:
-            suscriptions.append((int(sus[0]), sus[1], sus[2]))
+            suscriptions.append((int(sus[0]), sus[1], sus[2], int(sus[3])))
 
         return suscriptions
 
     def read_suscription_by_chat(self, chat: int) -> \
-            list[tuple[int, str, str]]:
+            list[tuple[int, str, str, int]]:
         """Reads the suscriptions table"""
         db_suscriptions: list[tuple[str, ...]]
-        suscriptions: list[tuple[int, str, str]] = []
+        suscriptions: list[tuple[int, str, str, int]] = []
 
         db_suscriptions = self.manager.read_query(SQL_READ_SUS_WHERE_CHAT,
                                                   str(chat,))
 
         for sus in db_suscriptions:
-            suscriptions.append((int(sus[0]), sus[1], sus[2]))
+            suscriptions.append((int(sus[0]), sus[1], sus[2], int(sus[3])))
 
         return suscriptions
 
     def read_suscription_by_manga(self, manga: str) -> \
-            list[tuple[int, str, str]]:
+            list[tuple[int, str, str, int]]:
         """Reads the suscriptions table"""
         db_suscriptions: list[tuple[str, ...]]
-        suscriptions: list[tuple[int, str, str]] = []
+        suscriptions: list[tuple[int, str, str, int]] = []
 
         db_suscriptions = self.manager.read_query(SQL_READ_SUS_WHERE_MANGA,
                                                   str(manga,))
 
         for sus in db_suscriptions:
-            suscriptions.append((int(sus[0]), sus[1], sus[2]))
+            suscriptions.append((int(sus[0]), sus[1], sus[2], int(sus[3])))
 
         return suscriptions
 
@@ -278,6 +629,27 @@ class Database:
 
         return db_mangas
 
+    def read_mangas_with_last_chapter(self) -> list[tuple[Any, ...]]:
+        """Reads the mangas table together with the chapter its last_chapter
+        pointer refers to. Chapter columns are None if there's none"""
+        return self.manager.read_query(SQL_READ_MANGAS_WITH_LAST_CHAPTER)
+
+    def read_manga_with_last_chapter_by_name(self, name: str) -> \
+            list[tuple[Any, ...]]:
+        """Reads the mangas table by name together with its last chapter"""
+        return self.manager.read_query(
+            SQL_READ_MANGAS_WITH_LAST_CHAPTER_WHERE_NAME,
+            str(name,)
+        )
+
+    def read_manga_with_last_chapter_by_id(self, id: int) -> \
+            list[tuple[Any, ...]]:
+        """Reads the mangas table by ID together with its last chapter"""
+        return self.manager.read_query(
+            SQL_READ_MANGAS_WITH_LAST_CHAPTER_WHERE_ID,
+            id
+        )
+
     def insert_chat(self, chat_id: int, chat_name: str) -> bool:
         """Inserts a chat in the database"""
         done: bool = False
@@ -311,13 +683,18 @@ class Database:
 
     def insert_manga_chapter(self, chapter_name: str,
                              chapter_number: str, chapter_url: str,
-                             chapter_date: str, manga_name: str) -> bool:
-        """Inserts a manga chapter in the database"""
+                             chapter_date: int, manga_name: str) -> bool:
+        """Inserts a manga chapter in the database. The manga last_chapter
+        pointer is moved to it within the same transaction if it's newer"""
         done: bool = False
         try:
-            self.manager.exc_query(SQL_INSERT_MANGA_CHAPTER,
-                                   chapter_name, chapter_number,
-                                   chapter_url, chapter_date, manga_name)
+            self.manager.exc_transaction(
+                (SQL_INSERT_MANGA_CHAPTER,
+                 (chapter_name, chapter_number, chapter_url, chapter_date,
+                  manga_name)),
+                (SQL_UPDATE_MANGA_IF_NEWER,
+                 (chapter_name, manga_name, chapter_name)),
+            )
             done = True
         except InfrastructureException as err:
             log("bot", "error",
@@ -338,10 +715,15 @@ class Database:
         return done
 
     def delete_chat(self, id: int) -> bool:
-        """Deletes a chat from the database"""
+        """Deletes a chat from the database, along with its notifications"""
         done: bool = False
         try:
-            self.manager.exc_query(SQL_DELETE_CHAT, str(id))
+            rowcounts: list[int] = self.manager.exc_transaction(
+                (SQL_DELETE_CHAT, (id,)),
+                (SQL_DELETE_OUTBOX_WHERE_CHAT, (id,)),
+            )
+            if rowcounts[0] == 0:
+                raise InfrastructureException("No rows affected")
             done = True
         except InfrastructureException as err:
             log("bot", "error",
@@ -350,11 +732,16 @@ class Database:
         return done
 
     def delete_suscription(self, chat_id: int, manga_name: str) -> bool:
-        """Deletes a suscription from the database"""
+        """Deletes a suscription from the database, along with its
+        notifications"""
         done: bool = False
         try:
-            self.manager.exc_query(SQL_DELETE_SUSCRIPTION,
-                                   str(chat_id), manga_name)
+            rowcounts: list[int] = self.manager.exc_transaction(
+                (SQL_DELETE_SUSCRIPTION, (chat_id, manga_name)),
+                (SQL_DELETE_OUTBOX_WHERE_SUSCRIPTION, (chat_id, manga_name)),
+            )
+            if rowcounts[0] == 0:
+                raise InfrastructureException("No rows affected")
             done = True
         except InfrastructureException as err:
             log("bot", "error",
@@ -363,11 +750,16 @@ class Database:
         return done
 
     def delete_manga_chapter(self, manga_name: str, chapter_name: str) -> bool:
-        """Deletes a manga chapter from the database"""
+        """Deletes a manga chapter from the database. If the manga pointed to
+        it, the pointer falls back to the newest remaining chapter"""
         done: bool = False
         try:
-            self.manager.exc_query(SQL_DELETE_MANGA_CHAPTER,
-                                   chapter_name, manga_name)
+            rowcounts: list[int] = self.manager.exc_transaction(
+                (SQL_DELETE_MANGA_CHAPTER, (chapter_name, manga_name)),
+                (SQL_UPDATE_MANGA_REPOINT, (manga_name, chapter_name)),
+            )
+            if rowcounts[0] == 0:
+                raise InfrastructureException("No rows affected")
             done = True
         except InfrastructureException as err:
             log("bot", "error",
@@ -425,6 +817,156 @@ class Database:
 
         return done
 
+    def enqueue_notifications(self, chats: list[int], manga_id: int,
+                              chapter: str, number: str, url: str,
+                              created: int) -> bool:
+        """Writes the notifications of a chapter for the given chats to the
+        outbox and moves their suscriptions to it, as a single transaction.
+        Pending notifications of older chapters for those chats are dropped"""
+        done: bool = False
+        queries: list[tuple[str, tuple[Any, ...]]] = []
+
+        for chat in chats:
+            queries.append((SQL_DELETE_OUTBOX_SUPERSEDED,
+                            (chat, manga_id, chapter)))
+            queries.append((SQL_INSERT_OUTBOX,
+                            (f"{chat}:{manga_id}:{chapter}", chat, manga_id,
+                             chapter, number, url, created)))
+            queries.append((SQL_UPDATE_SUSCRIPTION_LAST_WHERE_IDS,
+                            (chapter, chat, manga_id)))
+
+        try:
+            self.manager.exc_transaction(*queries)
+            done = True
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error enqueuing notifications: {err}"])
+
+        return done
+
+    def read_pending_notifications(self, after: int, max_attempts: int,
+                                   limit: int) -> list[tuple[Any, ...]]:
+        """Reads up to `limit` notifications not delivered yet, with less
+        than `max_attempts` attempts and ID after `after`, in ID order"""
+        return self.manager.read_query(SQL_READ_OUTBOX_PENDING,
+                                       max_attempts, after, limit)
+
+    def mark_notifications(self, delivered: list[int], failed: list[int],
+                           when: int) -> bool:
+        """Marks the notifications as delivered at `when`, or counts the
+        failed attempt"""
+        done: bool = False
+        queries: list[tuple[str, tuple[Any, ...]]] = \
+            [(SQL_UPDATE_OUTBOX_DELIVERED, (when, id)) for id in delivered] + \
+            [(SQL_UPDATE_OUTBOX_FAILED, (id,)) for id in failed]
+
+        try:
+            self.manager.exc_transaction(*queries)
+            done = True
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error marking notifications: {err}"])
+
+        return done
+
+    def delete_finished_notifications(self, cutoff: int,
+                                      max_attempts: int) -> int:
+        """Deletes the notifications delivered before the `cutoff` epoch and
+        those created before it that ran out of attempts. Returns how many"""
+        deleted: int = 0
+        try:
+            deleted = self.manager.exc_transaction(
+                (SQL_DELETE_OUTBOX_FINISHED, (cutoff, max_attempts, cutoff)),
+            )[0]
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error deleting notifications: {err}"])
+
+        return deleted
+
+    def delete_expired_manga_chapters(self, keep_last: int,
+                                      cutoff: Optional[int],
+                                      limit: int) -> int:
+        """Deletes up to `limit` chapters outside the retention policy: the
+        newest `keep_last` chapters of each manga and those dated after the
+        `cutoff` epoch are kept. Returns the number of deleted chapters"""
+        deleted: int = 0
+        try:
+            deleted = self.manager.exc_transaction(
+                (SQL_DELETE_EXPIRED_MANGA_CHAPTERS,
+                 (keep_last, keep_last, cutoff, cutoff, limit)),
+            )[0]
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error deleting expired chapters: {err}"])
+
+        return deleted
+
+    def size(self) -> int:
+        """Size in bytes of the database file"""
+        page_count: int = int(self.manager.read_query(SQL_READ_PAGE_COUNT)[0][0])
+        page_size: int = int(self.manager.read_query(SQL_READ_PAGE_SIZE)[0][0])
+
+        return page_count * page_size
+
+    def compact(self) -> None:
+        """Returns free pages to the filesystem and refreshes the query
+        planner statistics. Databases created before incremental auto vacuum
+        was enabled are switched to it with a one-off full VACUUM.
+
+        It runs on a connection of its own, so it's meant to be called from a
+        worker thread without stalling the main connection"""
+        try:
+            # Read on its own connection too, the main one reports the mode it
+            # last saw until its next transaction
+            mode: int = int(
+                self.manager.maintain(SQL_READ_AUTO_VACUUM)[0][0][0]
+            )
+
+            if mode != AUTO_VACUUM_INCREMENTAL:
+                log("bot", "info",
+                    ["domain.database", "Enabling incremental auto vacuum"])
+                self.manager.maintain(SQL_SET_INCREMENTAL_AUTO_VACUUM,
+                                      SQL_VACUUM, SQL_OPTIMIZE)
+            else:
+                self.manager.maintain(SQL_INCREMENTAL_VACUUM, SQL_OPTIMIZE)
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error compacting the database: {err}"])
+
+    def backup(self, target: str, pages: int, sleep: float) -> bool:
+        """Copies a consistent snapshot of the database into the target file,
+        `pages` pages at a time. A step that finds the database busy or
+        locked is retried after `sleep` seconds"""
+        done: bool = False
+        try:
+            self.manager.backup(target, pages, sleep)
+            done = True
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error backing up the database: {err}"])
+
+        return done
+
+    def restore(self, source: str) -> bool:
+        """Replaces the database content with the snapshot in source, and
+        migrates it to the current schema if it was taken before"""
+        done: bool = False
+        try:
+            self.manager.restore(source)
+            self.create()
+            done = True
+        except InfrastructureException as err:
+            log("bot", "error",
+                ["domain.database", f"Error restoring the database: {err}"])
+        except DomainException as err:
+            log("bot", "error", [
+                "domain.database",
+                f"Error migrating the restored database: {err}"
+            ])
+
+        return done
+
     def close(self) -> None:
         """Closes the database"""
         self.manager.close()
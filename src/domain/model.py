@@ -1,7 +1,9 @@
 """Module in charge to define the model to represent the objects for the app"""
-from typing import Optional
-from datetime import datetime
-from dataclasses import dataclass
+import sys
+import calendar
+from typing import Iterable, Iterator, Optional, Union
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
 
 try:
     from src.utils import log
@@ -10,41 +12,192 @@ except ModuleNotFoundError:
     from utils import log
     from domain.domain_exception import DomainException
 
+EPOCH: datetime = datetime(1970, 1, 1)
+
 
-@dataclass
 class MangaChapter():
     """Models a manga chapter.
 
     - Chapter name (if any)(NOT manga name)
     - Number, string because some chapters are not trutly numeric
     - A link (html)
-    - Date as datetime
-    - Manga to which it belongs
-    """
-    name:   str
-    number: str
-    url:    str
-    date:   datetime
-    manga:  str
+    - Date as datetime, kept as epoch seconds and only materialized on access
+    - Manga to which it belongs, plus its ID when read from the database
 
-
-@dataclass
+    The date can be given either as a datetime or as the epoch seconds stored
+    in the database, so reads don't need to parse anything. Slotted, with the
+    manga name interned, as there are many more chapters than mangas.
+    """
+    __slots__ = ("name", "number", "url", "timestamp", "manga", "manga_id",
+                 "_date")
+
+    name:       str
+    number:     str
+    url:        str
+    timestamp:  int
+    manga:      str
+    manga_id:   Optional[int]
+    _date:      Optional[datetime]
+
+    def __init__(self, name: str, number: str, url: str,
+                 date: Union[datetime, int], manga: str,
+                 manga_id: Optional[int] = None) -> None:
+        self.name = name
+        self.number = number
+        self.url = url
+        self.manga = sys.intern(manga)
+        self.manga_id = manga_id
+        self.date = date
+
+    @property
+    def date(self) -> datetime:
+        if self._date is None:
+            self._date = epoch_to_datetime(self.timestamp)
+        return self._date
+
+    @date.setter
+    def date(self, value: Union[datetime, int]) -> None:
+        if isinstance(value, datetime):
+            self.timestamp = datetime_to_epoch(value)
+            self._date = value
+        else:
+            self.timestamp = int(value)
+            self._date = None
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MangaChapter):
+            return NotImplemented
+        return (self.name, self.number, self.url, self.timestamp,
+                self.manga) == (other.name, other.number, other.url,
+                                other.timestamp, other.manga)
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.number, self.url, self.timestamp,
+                     self.manga))
+
+    def __repr__(self) -> str:
+        return (f"MangaChapter(name={self.name!r}, number={self.number!r}, "
+                f"url={self.url!r}, date={self.date!r}, manga={self.manga!r})")
+
+
+@dataclass(frozen=True, slots=True)
 class Manga():
     """Models a manga.
 
     - Name
     - A link (html)
     - Last chapter, string because some chapters are not trutly numeric
+    - ID, the database surrogate key. Not part of the comparison, as the name
+      identifies the manga just as well
+
+    Immutable: a changed manga is replaced by a new instance. The name is
+    interned so chapters and suscriptions share the same string.
     """
     name:   str
     link:   str
     last_chapter: Optional[MangaChapter]
+    id:     Optional[int] = field(default=None, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "name", sys.intern(self.name))
+
+
+class MangaIndex():
+    """Collection of mangas indexed by name, link and ID.
+
+    Iterates in insertion order. Names are unique, while links are not (new
+    mangas are created without one), so a link lookup returns the first manga
+    added with it, as the linear search did.
+    """
+
+    def __init__(self, mangas: Iterable[Manga] = ()) -> None:
+        self._by_name: dict[str, Manga] = {}
+        self._by_link: dict[str, list[Manga]] = {}
+        self._by_id: dict[int, Manga] = {}
+
+        for manga in mangas:
+            self.add(manga)
+
+    def add(self, manga: Manga) -> None:
+        """Adds a manga, replacing any other with the same name"""
+        self.remove(manga.name)
+        self._by_name[manga.name] = manga
+        self._by_link.setdefault(manga.link, []).append(manga)
+        if manga.id is not None:
+            self._by_id[manga.id] = manga
+
+    def remove(self, name: str) -> Optional[Manga]:
+        """Removes a manga by name, returning it if it was there"""
+        manga: Optional[Manga] = self._by_name.pop(name, None)
+        if manga is None:
+            return None
+
+        same_link: list[Manga] = self._by_link[manga.link]
+        same_link.remove(manga)
+        if not same_link:
+            del self._by_link[manga.link]
+        if manga.id is not None:
+            self._by_id.pop(manga.id, None)
+
+        return manga
+
+    def by_name(self, name: str) -> Optional[Manga]:
+        return self._by_name.get(name)
+
+    def by_link(self, link: str) -> Optional[Manga]:
+        same_link: Optional[list[Manga]] = self._by_link.get(link)
+        return same_link[0] if same_link else None
+
+    def by_id(self, manga_id: int) -> Optional[Manga]:
+        return self._by_id.get(manga_id)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._by_name
+
+    def __iter__(self) -> Iterator[Manga]:
+        return iter(self._by_name.values())
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+
+class ChapterIndex():
+    """Set of chapters keyed by name and number, the same fields
+    search_chapter_in_list compares"""
+
+    def __init__(self, chapters: Iterable[MangaChapter] = ()) -> None:
+        self._keys: set[tuple[str, str]] = set()
+
+        for chapter in chapters:
+            self.add(chapter)
+
+    def add(self, chapter: MangaChapter) -> None:
+        self._keys.add((chapter.name, chapter.number))
+
+    def __contains__(self, chapter: object) -> bool:
+        if not isinstance(chapter, MangaChapter):
+            return False
+        return (chapter.name, chapter.number) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
 
 
 ##############################################################################
 #                                  LOW LEVEL                                 #
 ##############################################################################
 
+def datetime_to_epoch(date: datetime) -> int:
+    """Converts a datetime into epoch seconds. Naive datetimes are taken as
+    they are, the same way SQLite's strftime('%s') does"""
+    return calendar.timegm(date.utctimetuple())
+
+
+def epoch_to_datetime(timestamp: int) -> datetime:
+    """Converts epoch seconds back into a naive datetime"""
+    return EPOCH + timedelta(seconds=timestamp)
+
+
 def search_manga_by_name(mangas: list[Manga], name: str) -> Optional[Manga]:
     """Searchs the manga list by provided name"""
     item: Optional[Manga] = None
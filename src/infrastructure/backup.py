@@ -0,0 +1,83 @@
+"""Module in charge of the database snapshot files: naming, compression and
+rotation"""
+import os
+import gzip
+import shutil
+from datetime import datetime
+
+try:
+    from src.utils import log
+    from src.infrastructure.infra_exception import InfrastructureException
+except ModuleNotFoundError:
+    from utils import log
+    from infrastructure.infra_exception import InfrastructureException
+
+SNAPSHOT_EXTENSION: str = ".db"
+COMPRESSED_EXTENSION: str = ".gz"
+
+
+def snapshot_path(directory: str, prefix: str, now: datetime) -> str:
+    """Returns the path of a new, uncompressed snapshot. Names sort in
+    chronological order"""
+    return os.path.join(
+        directory,
+        f"{prefix}_{now.strftime('%Y%m%d_%H%M%S')}{SNAPSHOT_EXTENSION}"
+    )
+
+
+def list_snapshots(directory: str, prefix: str) -> list[str]:
+    """Lists the snapshots in the directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith(f"{prefix}_") and (
+            name.endswith(SNAPSHOT_EXTENSION) or
+            name.endswith(SNAPSHOT_EXTENSION + COMPRESSED_EXTENSION)
+        )
+    )
+
+
+def compress(path: str) -> str:
+    """Gzips the file, removing the original. Returns the new path"""
+    target: str = path + COMPRESSED_EXTENSION
+    try:
+        with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+    except Exception as err:
+        raise InfrastructureException(err) from err
+
+    return target
+
+
+def decompress(path: str, target: str) -> None:
+    """Gunzips the file into the target path"""
+    try:
+        with gzip.open(path, "rb") as src, open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+    except Exception as err:
+        raise InfrastructureException(err) from err
+
+
+def rotate(directory: str, prefix: str, keep: int) -> list[str]:
+    """Removes the oldest snapshots, keeping the newest `keep` ones, or all of
+    them if `keep` isn't positive. Returns the removed paths"""
+    removed: list[str] = []
+
+    if keep <= 0:
+        return removed
+
+    for path in list_snapshots(directory, prefix)[:-keep]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as err:
+            log("bot", "warning",
+                ["backup.rotate", f"Couldn't remove snapshot {path}: {err}"])
+
+    return removed
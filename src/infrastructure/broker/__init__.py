@@ -2,17 +2,20 @@ try:
     from src.infrastructure.broker.config import BrokerConfig
     from src.infrastructure.broker.rabbitmq import RabbitMQManager
     from src.infrastructure.broker.publisher import ResponsePublisher
+    from src.infrastructure.broker.ratelimit import RateLimiter
     from src.infrastructure.broker.consumer import EventConsumer, DeliveryErrorConsumer
 except ModuleNotFoundError:
     from infrastructure.broker.config import BrokerConfig
     from infrastructure.broker.rabbitmq import RabbitMQManager
     from infrastructure.broker.publisher import ResponsePublisher
+    from infrastructure.broker.ratelimit import RateLimiter
     from infrastructure.broker.consumer import EventConsumer, DeliveryErrorConsumer
 
 __all__ = [
     "BrokerConfig",
     "RabbitMQManager",
     "ResponsePublisher",
+    "RateLimiter",
     "EventConsumer",
     "DeliveryErrorConsumer",
 ]
@@ -0,0 +1,129 @@
+import time
+import asyncio
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+import aio_pika
+
+Publish = Callable[[aio_pika.Message, str], Awaitable[None]]
+
+
+class Histogram:
+    """Counts of the observed values per bucket, by upper bound"""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds: tuple[float, ...] = tuple(sorted(bounds))
+        self.counts: list[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> dict[str, Any]:
+        buckets: dict[str, int] = {
+            f"<={bound:g}": count
+            for bound, count in zip(self.bounds, self.counts)
+        }
+        buckets["+inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "buckets": buckets,
+        }
+
+
+class PublishBuffer:
+    """Collects the messages published within `flush_interval` seconds, or
+    up to `max_size` of them, and writes them to the broker together.
+
+    AMQP has no batch publish: a flush writes the whole batch back to back
+    and awaits its confirms at once. Every caller still waits for, and gets
+    the error of, its own message.
+    """
+
+    FLUSH_SIZE_BOUNDS: tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+    LATENCY_BOUNDS: tuple[float, ...] = (
+        0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5
+    )
+
+    def __init__(
+        self,
+        publish: Publish,
+        max_size: int = 100,
+        flush_interval: float = 0.005,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._publish = publish
+        self._max_size = max(max_size, 1)
+        self._flush_interval = flush_interval
+        self._clock = clock
+
+        # (message, routing key, caller future, time queued)
+        self._pending: list[tuple[aio_pika.Message, str,
+                                  asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: set[asyncio.Task] = set()
+
+        self.flush_sizes: Histogram = Histogram(self.FLUSH_SIZE_BOUNDS)
+        self.latency: Histogram = Histogram(self.LATENCY_BOUNDS)
+
+    async def publish(self, message: aio_pika.Message,
+                      routing_key: str) -> None:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((message, routing_key, future, self._clock()))
+
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._flush_interval, self._flush)
+
+        await future
+
+    async def flush(self) -> None:
+        """Writes the pending messages and waits for every write started"""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        """Flush size and queue-to-confirm latency histograms"""
+        return {
+            "pending": len(self._pending),
+            "flush_sizes": self.flush_sizes.snapshot(),
+            "latency": self.latency.snapshot(),
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task: asyncio.Task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list[tuple[aio_pika.Message, str,
+                                             asyncio.Future, float]]) -> None:
+        self.flush_sizes.observe(len(batch))
+        results: list[Any] = await asyncio.gather(
+            *(self._publish(message, routing_key)
+              for message, routing_key, _, _ in batch),
+            return_exceptions=True
+        )
+
+        now: float = self._clock()
+        for (_, _, future, queued), result in zip(batch, results):
+            self.latency.observe(now - queued)
+            # The caller may be gone
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(None)
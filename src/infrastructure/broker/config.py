@@ -9,6 +9,27 @@ class BrokerConfig:
     user: str = "guest"
     password: str = "guest"
     vhost: str = "/"
+    # Publishes awaiting their broker confirm at the same time
+    confirm_window: int = 256
+    # Publishes buffered and written together, up to batch_size or for
+    # batch_interval seconds. A size of 0 disables the buffer.
+    batch_size: int = 0
+    batch_interval: float = 0.005
+    # Unacknowledged events the broker sends ahead, and handlers run at the
+    # same time (0 runs a task per event, bounded by the prefetch)
+    prefetch_count: int = 32
+    consumer_workers: int = 0
+    # Subscriber queue arguments: seconds unused before the broker deletes
+    # it, and events kept (oldest dropped first). 0 disables each one
+    queue_expires: int = 0
+    queue_max_length: int = 0
+    # Management API, used to delete stale subscriber queues if set, and
+    # seconds a queue must have been idle to be considered stale
+    management_url: str = ""
+    stale_queue_idle: int = 3600
+    # Seconds before each retry of a failed event. Once used up it's
+    # dead-lettered. Without delays failed events are requeued right away
+    retry_delays: tuple[int, ...] = (5, 30, 300)
 
     @classmethod
     def from_env(cls) -> "BrokerConfig":
@@ -18,6 +39,22 @@ class BrokerConfig:
             user=os.getenv("RABBITMQ_USER", "guest"),
             password=os.getenv("RABBITMQ_PASSWORD", "guest"),
             vhost=os.getenv("RABBITMQ_VHOST", "/"),
+            confirm_window=int(os.getenv("RABBITMQ_CONFIRM_WINDOW", "256")),
+            batch_size=int(os.getenv("RABBITMQ_BATCH_SIZE", "0")),
+            batch_interval=float(os.getenv("RABBITMQ_BATCH_MS", "5")) / 1000,
+            prefetch_count=int(os.getenv("RABBITMQ_PREFETCH", "32")),
+            consumer_workers=int(os.getenv("RABBITMQ_CONSUMER_WORKERS", "0")),
+            queue_expires=int(os.getenv("RABBITMQ_QUEUE_EXPIRES", "0")),
+            queue_max_length=int(os.getenv("RABBITMQ_QUEUE_MAX_LENGTH", "0")),
+            management_url=os.getenv("RABBITMQ_MANAGEMENT_URL", ""),
+            stale_queue_idle=int(
+                os.getenv("RABBITMQ_STALE_QUEUE_IDLE", "3600")
+            ),
+            retry_delays=tuple(
+                int(delay) for delay in
+                os.getenv("RABBITMQ_RETRY_DELAYS", "5,30,300").split(",")
+                if delay.strip()
+            ),
         )
 
     def amqp_url(self) -> str:
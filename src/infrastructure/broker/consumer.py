@@ -1,15 +1,23 @@
+import time
 import json
-from typing import Any, Awaitable, Callable, Optional
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable, Optional, Sequence
 
 from aio_pika import IncomingMessage, Queue
 
 try:
+    from src.utils import log
     from src.infrastructure.broker.rabbitmq import RabbitMQManager
+    from src.infrastructure.broker.retry import RetryRouter, settle
 except ModuleNotFoundError:
+    from utils import log
     from infrastructure.broker.rabbitmq import RabbitMQManager
+    from infrastructure.broker.retry import RetryRouter, settle
 
 
 OnMessage = Callable[[dict[str, Any]], Awaitable[None]]
+OrderKey = Callable[[dict[str, Any]], Optional[Hashable]]
 
 
 class EventConsumer:
@@ -18,23 +26,196 @@ class EventConsumer:
         manager: RabbitMQManager,
         queue: Queue,
         callback: OnMessage,
+        prefetch_count: int = 32,
+        workers: int = 0,
+        retry_delays: Sequence[int] = (),
+        order_key: Optional[OrderKey] = None,
     ) -> None:
         self._manager = manager
         self._queue = queue
         self._callback = callback
         self._consumer_tag: Optional[str] = None
+        # Failed events are retried after each delay, then dead-lettered.
+        # Without delays they're requeued
+        self._retry: Optional[RetryRouter] = RetryRouter(
+            manager, queue.name, retry_delays
+        ) if retry_delays else None
+        # Unacknowledged deliveries the broker sends ahead. Handlers run as a
+        # task per delivery, or in a pool of `workers` tasks if set
+        self._prefetch_count = prefetch_count
+        self._workers = workers
+        self._jobs: asyncio.Queue[IncomingMessage] = asyncio.Queue()
+        self._worker_tasks: list[asyncio.Task] = []
+        # Events with the same order key (the chat) are handled one at a time
+        # in arrival order, and those of different keys concurrently, as many
+        # at once as workers (or the prefetch). They stay unacknowledged in
+        # their key's queue until handled, bounded by the prefetch
+        self._order_key = order_key
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(
+            workers if workers > 0 else max(prefetch_count, 1)
+        )
+        self._keyed: dict[Hashable, deque[IncomingMessage]] = {}
+        self._runners: set[asyncio.Task] = set()
+
+        self.in_progress: int = 0
+        self._idle: asyncio.Event = asyncio.Event()
+        self._idle.set()
+        self.processed: int = 0
+        self.failed: int = 0
+        self.handling_time: float = 0.0
 
     async def start(self) -> None:
-        async def _on_message(message: IncomingMessage) -> None:
-            async with message.process(requeue=True):
-                body: dict[str, Any] = json.loads(message.body.decode())
-                await self._callback(body)
+        if self._retry is not None:
+            await self._retry.declare()
+        if self._prefetch_count > 0:
+            await self._queue.channel.set_qos(
+                prefetch_count=self._prefetch_count
+            )
 
-        self._consumer_tag = await self._queue.consume(_on_message)
+        if self._order_key is not None:
+            self._consumer_tag = await self._queue.consume(self._enqueue)
+        elif self._workers > 0:
+            self._worker_tasks = [
+                asyncio.create_task(self._work())
+                for _ in range(self._workers)
+            ]
+            self._consumer_tag = await self._queue.consume(self._jobs.put)
+        else:
+            self._consumer_tag = await self._queue.consume(self._process)
 
-    async def stop(self) -> None:
+    async def stop(self, timeout: float = 0) -> bool:
+        """Stops consuming and waits up to `timeout` seconds for the events
+        already delivered to be handled. Returns whether they were"""
         if self._consumer_tag is not None:
             await self._queue.cancel(self._consumer_tag)
+            self._consumer_tag = None
+
+        drained: bool = True
+        if self.in_progress or not self._jobs.empty() or self._keyed:
+            try:
+                await asyncio.wait_for(self._drain(), timeout)
+            except asyncio.TimeoutError:
+                drained = False
+
+        # The events being handled are requeued as they're cancelled, and
+        # those still waiting for their turn are requeued here
+        for task in [*self._worker_tasks, *self._runners]:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, *self._runners,
+                             return_exceptions=True)
+        self._worker_tasks = []
+        await self._requeue_waiting()
+        return drained
+
+    async def _requeue_waiting(self) -> None:
+        """Returns the deliveries not handled yet to the queue"""
+        waiting: list[IncomingMessage] = [
+            message for pending in self._keyed.values() for message in pending
+        ]
+        self._keyed.clear()
+        while not self._jobs.empty():
+            waiting.append(self._jobs.get_nowait())
+            self._jobs.task_done()
+
+        for message in waiting:
+            try:
+                await message.reject(requeue=True)
+            except Exception as err:
+                # Redelivered anyway once the channel closes
+                log("bot", "warning", [
+                    "EventConsumer",
+                    f"Couldn't requeue event {message.message_id}: {err}"
+                ])
+
+    async def _drain(self) -> None:
+        if self._worker_tasks:
+            await self._jobs.join()
+        while self._runners:
+            await asyncio.gather(*self._runners, return_exceptions=True)
+        await self._idle.wait()
+
+    def stats(self) -> dict[str, Any]:
+        """Handler counters: deliveries queued for the workers or waiting for
+        their key's turn, keys with events and events being handled,
+        processed and failed, and the mean handling time"""
+        return {
+            "queued": self._jobs.qsize() +
+            sum(len(pending) for pending in self._keyed.values()),
+            "keys": len(self._keyed),
+            "in_progress": self.in_progress,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_time": self.handling_time / self.processed
+            if self.processed else 0.0,
+            **(self._retry.stats() if self._retry is not None else {}),
+        }
+
+    async def _work(self) -> None:
+        while True:
+            message: IncomingMessage = await self._jobs.get()
+            try:
+                await self._process(message)
+            except Exception:
+                # Already rejected and counted
+                pass
+            finally:
+                self._jobs.task_done()
+
+    async def _enqueue(self, message: IncomingMessage) -> None:
+        """Queues the delivery behind the events of its key, starting their
+        runner if it wasn't running. Those without a key, or that can't be
+        decoded, are processed right away"""
+        key: Optional[Hashable] = None
+        try:
+            key = self._order_key(json.loads(message.body.decode()))
+        except (ValueError, AttributeError):
+            pass
+        if key is None:
+            await self._process(message)
+            return
+
+        pending: Optional[deque[IncomingMessage]] = self._keyed.get(key)
+        if pending is None:
+            pending = self._keyed[key] = deque()
+            task: asyncio.Task = asyncio.create_task(self._run(key, pending))
+            self._runners.add(task)
+            task.add_done_callback(self._runners.discard)
+        pending.append(message)
+
+    async def _run(self, key: Hashable,
+                   pending: deque[IncomingMessage]) -> None:
+        """Processes the events of a key in order, taking a slot for each one
+        so that the other keys get their turn"""
+        while pending:
+            async with self._slots:
+                message: IncomingMessage = pending.popleft()
+                try:
+                    await self._process(message)
+                except Exception:
+                    # Already requeued and counted
+                    pass
+        del self._keyed[key]
+
+    async def _process(self, message: IncomingMessage) -> None:
+        """Runs the callback for the delivery and settles it"""
+        self.in_progress += 1
+        self._idle.clear()
+        start: float = time.monotonic()
+        try:
+            handled: bool = await settle(message, self._callback, self._retry)
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            if handled:
+                self.processed += 1
+                self.handling_time += time.monotonic() - start
+            else:
+                self.failed += 1
+        finally:
+            self.in_progress -= 1
+            if self.in_progress == 0:
+                self._idle.set()
 
 
 class DeliveryErrorConsumer:
@@ -42,23 +223,50 @@ class DeliveryErrorConsumer:
         self,
         manager: RabbitMQManager,
         callback: Callable[[dict[str, Any]], Awaitable[None]],
+        retry_delays: Sequence[int] = (),
     ) -> None:
         self._manager = manager
         self._callback = callback
         self._queue: Optional[Queue] = None
         self._consumer_tag: Optional[str] = None
+        self._retry_delays = retry_delays
+        self._retry: Optional[RetryRouter] = None
+        self._handling: set[asyncio.Task] = set()
 
     async def start(self) -> None:
         self._queue = await self._manager.declare_error_queue()
+        if self._retry_delays:
+            self._retry = RetryRouter(self._manager, self._queue.name,
+                                      self._retry_delays)
+            await self._retry.declare()
+
+        async def _handle(body: dict[str, Any]) -> None:
+            if body.get("status") == "failed":
+                await self._callback(body)
 
         async def _on_message(message: IncomingMessage) -> None:
-            async with message.process(requeue=True):
-                body: dict[str, Any] = json.loads(message.body.decode())
-                if body.get("status") == "failed":
-                    await self._callback(body)
+            task: Optional[asyncio.Task] = asyncio.current_task()
+            if task is not None:
+                self._handling.add(task)
+            try:
+                await settle(message, _handle, self._retry)
+            finally:
+                self._handling.discard(task)
 
         self._consumer_tag = await self._queue.consume(_on_message)
 
-    async def stop(self) -> None:
+    def stats(self) -> dict[str, int]:
+        """Retry and dead-letter counters"""
+        return self._retry.stats() if self._retry is not None else {}
+
+    async def stop(self, timeout: float = 0) -> bool:
+        """Stops consuming and waits up to `timeout` seconds for the
+        delivery errors being handled. Returns whether they were"""
         if self._consumer_tag is not None and self._queue is not None:
             await self._queue.cancel(self._consumer_tag)
+            self._consumer_tag = None
+
+        if not self._handling:
+            return True
+        _, pending = await asyncio.wait(set(self._handling), timeout=timeout)
+        return not pending
@@ -0,0 +1,77 @@
+import json
+import time
+import uuid
+import itertools
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Built once: json.dumps with non default options builds an encoder per call.
+# ASCII output keeps emojis from widening the whole string to UCS-4.
+_encoder: json.JSONEncoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return _encoder.encode(obj).encode()
+
+
+# orjson, if installed, serializes several times faster than the stdlib
+dumps: Callable[[Any], bytes] = \
+    orjson.dumps if orjson is not None else _stdlib_dumps
+
+
+class EnvelopeSerializer:
+    """Serializes the response envelopes of a bot.
+
+    Response IDs are a random per-process prefix plus a counter, and the
+    timestamp text is reused within the same second, instead of an UUID and
+    a datetime per message. The envelope is dumped in a single call.
+    """
+
+    def __init__(self, bot_id: str) -> None:
+        self._bot_id: str = bot_id
+        self._id_prefix: str = f"{uuid.uuid4().hex[:16]}-"
+        self._ids: Any = itertools.count(1)
+        self._second: int = -1
+        self._second_text: str = ""
+
+    def response_id(self) -> str:
+        """A new response ID, unique across restarts"""
+        return f"{self._id_prefix}{next(self._ids):x}"
+
+    def timestamp(self) -> str:
+        """Current UTC time in ISO 8601, with microseconds"""
+        now: float = time.time()
+        second: int = int(now)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S",
+                                              time.gmtime(second))
+        return f"{self._second_text}.{int((now - second) * 1e6):06d}+00:00"
+
+    def serialize(
+        self,
+        response_type: str,
+        chat_id: int,
+        payload: dict[str, Any],
+        response_id: str,
+        correlation_id: str = "",
+        reply_to: Optional[str] = None,
+    ) -> bytes:
+        envelope: dict[str, Any] = {
+            "response_id": response_id,
+            "correlation_id": correlation_id,
+            "timestamp": self.timestamp(),
+            "bot_id": self._bot_id,
+            "chat_id": chat_id,
+            "response_type": response_type,
+            "payload": payload,
+        }
+        if reply_to:
+            envelope["reply_to"] = reply_to
+
+        return dumps(envelope)
@@ -1,21 +1,89 @@
-import json
-import uuid
-from datetime import datetime, timezone
+import asyncio
 from typing import Any, Optional
 
 import aio_pika
+from pamqp.commands import Basic
 
 try:
+    from src.infrastructure.infra_exception import InfrastructureException
     from src.infrastructure.broker.rabbitmq import RabbitMQManager
+    from src.infrastructure.broker.batching import PublishBuffer
+    from src.infrastructure.broker.envelope import EnvelopeSerializer, dumps
+    from src.infrastructure.broker.ratelimit import RateLimiter, INTERACTIVE, BULK
 except ModuleNotFoundError:
+    from infrastructure.infra_exception import InfrastructureException
     from infrastructure.broker.rabbitmq import RabbitMQManager
+    from infrastructure.broker.batching import PublishBuffer
+    from infrastructure.broker.envelope import EnvelopeSerializer, dumps
+    from infrastructure.broker.ratelimit import RateLimiter, INTERACTIVE, BULK
+
+# AMQP priorities of interactive replies and bulk notifications, honoured by
+# the responses queue if it's declared with x-max-priority
+INTERACTIVE_PRIORITY: int = 5
+BULK_PRIORITY: int = 1
 
 
 class ResponsePublisher:
-    def __init__(self, manager: RabbitMQManager, bot_id: str) -> None:
+    def __init__(self, manager: RabbitMQManager, bot_id: str,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 confirm_window: int = 256,
+                 batch_size: int = 0,
+                 batch_interval: float = 0.005) -> None:
         self._manager = manager
         self._bot_id = bot_id
+        self._serializer = EnvelopeSerializer(bot_id)
+        # Paces the messages sent to chats, if set
+        self.rate_limiter = rate_limiter
         self._responses_exchange: Optional[aio_pika.Exchange] = None
+        # Publishes are pipelined: up to confirm_window of them wait for
+        # their broker confirm at the same time
+        self._window = asyncio.Semaphore(confirm_window)
+        self.in_flight: int = 0
+        self.confirmed: int = 0
+        self.nacked: int = 0
+        # Optional micro-batching of the publishes, disabled with size 0
+        self.buffer: Optional[PublishBuffer] = PublishBuffer(
+            self._publish_confirmed, batch_size, batch_interval
+        ) if batch_size > 0 else None
+
+    async def _publish(self, message: aio_pika.Message,
+                       routing_key: str) -> None:
+        if self.buffer is not None:
+            await self.buffer.publish(message, routing_key)
+        else:
+            await self._publish_confirmed(message, routing_key)
+
+    async def _publish_confirmed(self, message: aio_pika.Message,
+                                 routing_key: str) -> None:
+        """Publishes the message and waits for the broker to confirm it.
+        Raises if the broker rejects it"""
+        exchange = await self._ensure_exchange()
+        async with self._window:
+            self.in_flight += 1
+            try:
+                confirmation = await exchange.publish(
+                    message, routing_key=routing_key
+                )
+            finally:
+                self.in_flight -= 1
+
+        if isinstance(confirmation, Basic.Nack):
+            self.nacked += 1
+            raise InfrastructureException(
+                f"Message {message.message_id} rejected by the broker"
+            )
+        self.confirmed += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Publisher confirms counters, and batching histograms if on"""
+        stats: dict[str, Any] = {
+            "in_flight": self.in_flight,
+            "confirmed": self.confirmed,
+            "nacked": self.nacked,
+        }
+        if self.buffer is not None:
+            stats["batching"] = self.buffer.stats()
+        return stats
 
     async def _ensure_exchange(self) -> aio_pika.Exchange:
         if self._responses_exchange is None:
@@ -31,24 +99,24 @@ class ResponsePublisher:
         payload: dict[str, Any],
         correlation_id: str = "",
         reply_to: Optional[str] = None,
+        response_id: Optional[str] = None,
+        bulk: bool = False,
     ) -> None:
-        exchange = await self._ensure_exchange()
-        envelope = {
-            "response_id": str(uuid.uuid4()),
-            "correlation_id": correlation_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "bot_id": self._bot_id,
-            "chat_id": chat_id,
-            "response_type": response_type,
-            "payload": payload,
-        }
-        if reply_to:
-            envelope["reply_to"] = reply_to
+        response_id = response_id or self._serializer.response_id()
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(chat_id,
+                                            BULK if bulk else INTERACTIVE)
 
-        await exchange.publish(
+        await self._publish(
             aio_pika.Message(
-                body=json.dumps(envelope).encode(),
+                body=self._serializer.serialize(
+                    response_type, chat_id, payload, response_id,
+                    correlation_id, reply_to
+                ),
                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                message_id=response_id,
+                priority=BULK_PRIORITY if bulk else INTERACTIVE_PRIORITY,
             ),
             routing_key="response",
         )
@@ -62,6 +130,8 @@ class ResponsePublisher:
         reply_markup: Optional[list[list[dict[str, str]]]] = None,
         disable_web_page_preview: Optional[bool] = None,
         reply_to: Optional[str] = None,
+        response_id: Optional[str] = None,
+        bulk: bool = False,
     ) -> None:
         payload: dict[str, Any] = {"text": text}
         if parse_mode:
@@ -72,7 +142,9 @@ class ResponsePublisher:
             payload["reply_markup"] = reply_markup
         if disable_web_page_preview is not None:
             payload["disable_web_page_preview"] = disable_web_page_preview
-        await self.publish_response("text", chat_id, payload, reply_to=reply_to)
+        await self.publish_response("text", chat_id, payload,
+                                    reply_to=reply_to, response_id=response_id,
+                                    bulk=bulk)
 
     async def publish_edit(
         self,
@@ -101,20 +173,14 @@ class ResponsePublisher:
             payload["text"] = text
         if show_alert:
             payload["show_alert"] = show_alert
-        envelope = {
-            "response_id": str(uuid.uuid4()),
-            "correlation_id": "",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "bot_id": self._bot_id,
-            "chat_id": chat_id,
-            "response_type": "answer_callback_query",
-            "payload": payload,
-        }
-        exchange = await self._ensure_exchange()
-        await exchange.publish(
+        await self._publish(
             aio_pika.Message(
-                body=json.dumps(envelope).encode(),
+                body=self._serializer.serialize(
+                    "answer_callback_query", chat_id, payload,
+                    self._serializer.response_id()
+                ),
                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                priority=INTERACTIVE_PRIORITY,
             ),
             routing_key="response",
         )
@@ -125,16 +191,15 @@ class ResponsePublisher:
         subscriber_id: str,
         commands: list[dict[str, str]],
     ) -> None:
-        exchange = await self._ensure_exchange()
         envelope = {
             "action": "register",
             "bot_id": bot_id,
             "subscriber_id": subscriber_id,
             "commands": commands,
         }
-        await exchange.publish(
+        await self._publish(
             aio_pika.Message(
-                body=json.dumps(envelope).encode(),
+                body=dumps(envelope),
                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
             ),
             routing_key="subscriber-commands",
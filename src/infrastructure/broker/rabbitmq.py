@@ -1,44 +1,177 @@
+import re
+import json
 import uuid
-from typing import Optional
+import asyncio
+import urllib.request
+from datetime import datetime, timezone
+from typing import Any, Optional
+from urllib.parse import quote
 
 import aio_pika
 from aio_pika import RobustConnection, Channel, Queue
+from aio_pika.exceptions import ChannelPreconditionFailed
 
 try:
+    from src.utils import log
     from src.infrastructure.broker.config import BrokerConfig
 except ModuleNotFoundError:
+    from utils import log
     from infrastructure.broker.config import BrokerConfig
 
+# Channel roles. Each one gets its own channel, so flow control on the
+# publishes doesn't stall the consumers, nor a busy consumer the others.
+EVENTS: str = "events"
+ERRORS: str = "errors"
+PUBLISH: str = "publish"
+
+EVENTS_EXCHANGE: str = "tg-if.events"
+
+# Subscriber queues named by the old random scheme, left behind by restarts
+STALE_QUEUE_PATTERN: re.Pattern = re.compile(r"^subscriber\.[0-9a-f]{8}$")
+
 
 class RabbitMQManager:
     def __init__(self, config: BrokerConfig) -> None:
         self._config = config
         self._connection: Optional[RobustConnection] = None
-        self._channel: Optional[Channel] = None
+        self._channels: dict[str, Channel] = {}
 
     async def connect(self) -> None:
         self._connection = await aio_pika.connect_robust(self._config.amqp_url())
-        self._channel = await self._connection.channel()
+        # Robust channels are reopened on reconnection, with their QoS,
+        # declarations and consumers
+        self._connection.reconnect_callbacks.add(self._on_reconnect)
+        self._channels = {
+            EVENTS: await self._connection.channel(publisher_confirms=False),
+            ERRORS: await self._connection.channel(publisher_confirms=False),
+            PUBLISH: await self._connection.channel(publisher_confirms=True),
+        }
+
+    def _on_reconnect(self, *args) -> None:
+        log("bot", "warning",
+            ["RabbitMQManager", "Reconnected to the broker, channels restored"])
 
     async def declare_subscriber_queue(
         self,
         routing_key: str,
         queue_name: Optional[str] = None,
     ) -> Queue:
-        queue = await self._channel.declare_queue(
-            name=queue_name or f"subscriber.{uuid.uuid4().hex[:8]}",
-            durable=True,
-        )
-        exchange = await self._channel.declare_exchange(
-            "tg-if.events",
+        """Declares the queue of the bot events and binds it. A named queue
+        is durable and survives restarts. Without a name it's a throwaway
+        queue, deleted with its consumer.
+
+        The broker refuses to redeclare a queue with other arguments, so if
+        the expiry or length limit changed the existing queue is used as is"""
+        arguments: dict[str, Any] = {}
+        if self._config.queue_expires > 0:
+            arguments["x-expires"] = self._config.queue_expires * 1000
+        if self._config.queue_max_length > 0:
+            arguments["x-max-length"] = self._config.queue_max_length
+
+        name: str = queue_name or f"subscriber.{uuid.uuid4().hex[:8]}"
+        channel: Channel = self.channel(EVENTS)
+        try:
+            queue = await channel.declare_queue(
+                name=name,
+                durable=queue_name is not None,
+                auto_delete=queue_name is None,
+                arguments=arguments or None,
+            )
+        except ChannelPreconditionFailed as err:
+            log("bot", "error", [
+                "RabbitMQManager",
+                f"Queue {name} exists with other arguments than {arguments} "
+                f"(RABBITMQ_QUEUE_EXPIRES, RABBITMQ_QUEUE_MAX_LENGTH), kept "
+                f"as is. Delete it to apply them, or set them through a "
+                f"policy and unset these variables: {err}"
+            ])
+            # The broker closed the channel, it's replaced by a new one
+            try:
+                await channel.close()
+            except Exception:
+                pass
+            channel = self._channels[EVENTS] = \
+                await self._connection.channel(publisher_confirms=False)
+            queue = await channel.declare_queue(name=name, passive=True)
+        exchange = await channel.declare_exchange(
+            EVENTS_EXCHANGE,
             aio_pika.ExchangeType.TOPIC,
             durable=True,
         )
         await queue.bind(exchange, routing_key=routing_key)
         return queue
 
+    async def delete_stale_queues(self, keep: str,
+                                  routing_key: str) -> list[str]:
+        """Deletes, through the management API, the subscriber queues with
+        random names left behind by this bot. Returns their names.
+
+        The broker may be shared, so a queue is only deleted if it's bound to
+        the events exchange with the bot routing key, has no consumers and
+        has been idle for `stale_queue_idle` seconds"""
+        base: str = (f"{self._config.management_url.rstrip('/')}/api/queues/"
+                     f"{quote(self._config.vhost, safe='')}")
+        queues: list[dict[str, Any]] = await asyncio.to_thread(
+            self._get_management, base
+        )
+
+        deleted: list[str] = []
+        for queue in queues:
+            name: str = queue.get("name", "")
+            if name == keep or queue.get("consumers", 0) > 0 or \
+                    not STALE_QUEUE_PATTERN.match(name) or \
+                    not self._idle(queue):
+                continue
+
+            bindings: list[dict[str, Any]] = await asyncio.to_thread(
+                self._get_management,
+                f"{base}/{quote(name, safe='')}/bindings"
+            )
+            if not any(binding.get("source") == EVENTS_EXCHANGE and
+                       binding.get("routing_key") == routing_key
+                       for binding in bindings):
+                continue
+
+            # A failed delete closes its channel
+            async with await self._connection.channel() as channel:
+                try:
+                    await channel.queue_delete(name, if_unused=True)
+                    deleted.append(name)
+                except Exception as err:
+                    log("bot", "warning", [
+                        "RabbitMQManager", f"Queue {name} not deleted: {err}"
+                    ])
+
+        return deleted
+
+    def _idle(self, queue: dict[str, Any]) -> bool:
+        """Whether the management API reports the queue idle for long
+        enough. A queue without an idle time is in use"""
+        idle_since: str = queue.get("idle_since", "")
+        try:
+            since: datetime = datetime.fromisoformat(
+                idle_since.replace(" ", "T")
+            )
+        except ValueError:
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        idle: float = (datetime.now(timezone.utc) - since).total_seconds()
+        return idle >= self._config.stale_queue_idle
+
+    def _get_management(self, url: str) -> Any:
+        manager = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+        manager.add_password(None, url, self._config.user,
+                             self._config.password)
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPBasicAuthHandler(manager)
+        )
+        with opener.open(url, timeout=10) as response:
+            return json.load(response)
+
     async def declare_error_queue(self) -> Queue:
-        queue = await self._channel.declare_queue(
+        queue = await self.channel(ERRORS).declare_queue(
             "chaptnotifier.delivery.errors",
             durable=True,
         )
@@ -49,16 +182,15 @@ class RabbitMQManager:
             "topic": aio_pika.ExchangeType.TOPIC,
             "direct": aio_pika.ExchangeType.DIRECT,
         }
-        return await self._channel.declare_exchange(
+        return await self.channel(PUBLISH).declare_exchange(
             name,
             type_map.get(exchange_type, aio_pika.ExchangeType.DIRECT),
             durable=True,
         )
 
-    @property
-    def channel(self) -> Channel:
-        assert self._channel is not None, "Not connected"
-        return self._channel
+    def channel(self, role: str = PUBLISH) -> Channel:
+        assert role in self._channels, "Not connected"
+        return self._channels[role]
 
     async def disconnect(self) -> None:
         if self._connection:
@@ -0,0 +1,149 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+# Lanes of the outbound scheduler, in priority order. Interactive replies go
+# before bulk notifications, which use the capacity left over.
+INTERACTIVE: int = 0
+BULK: int = 1
+LANES: tuple[str, ...] = ("interactive", "bulk")
+
+
+class RateLimiter:
+    """Outbound scheduler for Telegram's limits: a global token bucket of
+    `rate` messages per second (up to `burst` at once) and at least
+    `chat_interval` seconds between messages to the same chat.
+
+    Callers wait in a lane and are granted a token in priority order, first
+    come first served within a lane. A caller whose chat is still within its
+    interval doesn't hold back the others.
+    """
+
+    # Chats tracked for spacing before the stale ones are pruned
+    MAX_TRACKED_CHATS: int = 10000
+
+    def __init__(
+        self,
+        rate: float = 30.0,
+        burst: int = 30,
+        chat_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ) -> None:
+        self._rate = rate
+        self._burst = max(burst, 1)
+        self._chat_interval = max(chat_interval, 0.0)
+        self._clock = clock
+        self._sleep = sleep
+
+        self._tokens: float = float(self._burst)
+        self._updated: float = clock()
+        # Chat ID -> earliest time of its next message
+        self._chat_next: dict[int, float] = {}
+        self._lanes: list[list[tuple[int, asyncio.Future]]] = \
+            [[] for _ in LANES]
+        self._pump: Optional[asyncio.Task] = None
+
+        self.acquired: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+    async def acquire(self, chat_id: int, lane: int = INTERACTIVE) -> float:
+        """Waits for a slot to send a message to the chat. Returns the
+        seconds waited"""
+        start: float = self._clock()
+        self._refill(start)
+
+        if self._tokens >= 1 and self._chat_ready(chat_id, start) and \
+                not self._ready_waiter(lane + 1, start):
+            self._grant(chat_id, start)
+        else:
+            future: asyncio.Future = \
+                asyncio.get_running_loop().create_future()
+            self._lanes[lane].append((chat_id, future))
+            if self._pump is None or self._pump.done():
+                self._pump = asyncio.create_task(self._run())
+            await future
+
+        wait: float = self._clock() - start
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+        return wait
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth per lane and wait time metrics"""
+        return {
+            "waiting": {name: len(self._lanes[lane])
+                        for lane, name in enumerate(LANES)},
+            "acquired": self.acquired,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def _refill(self, now: float) -> None:
+        if self._rate <= 0:
+            self._tokens = float(self._burst)
+        else:
+            self._tokens = min(float(self._burst),
+                               self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _chat_ready(self, chat_id: int, now: float) -> bool:
+        return self._chat_next.get(chat_id, now) <= now
+
+    def _ready_waiter(self, lanes: int, now: float) -> bool:
+        """Whether a caller in the first `lanes` lanes could go now"""
+        return any(not future.done() and self._chat_ready(chat_id, now)
+                   for lane in self._lanes[:lanes]
+                   for chat_id, future in lane)
+
+    def _grant(self, chat_id: int, now: float) -> None:
+        self._tokens -= 1
+        if len(self._chat_next) >= self.MAX_TRACKED_CHATS:
+            self._chat_next = {chat: next_slot
+                               for chat, next_slot in self._chat_next.items()
+                               if next_slot > now}
+        self._chat_next[chat_id] = now + self._chat_interval
+
+    def _next_waiter(self, now: float) -> tuple[Optional[asyncio.Future],
+                                                Optional[float]]:
+        """First caller, by lane, whose chat can go now. Otherwise the
+        seconds until one of them can"""
+        delay: Optional[float] = None
+        for lane in self._lanes:
+            for index, (chat_id, future) in enumerate(lane):
+                if future.done():
+                    continue
+                ready_at: float = self._chat_next.get(chat_id, now)
+                if ready_at <= now:
+                    del lane[index]
+                    self._grant(chat_id, now)
+                    return future, None
+                delay = ready_at - now if delay is None \
+                    else min(delay, ready_at - now)
+        return None, delay
+
+    async def _run(self) -> None:
+        """Hands out the tokens to the waiting callers"""
+        while True:
+            # Callers cancelled while waiting
+            for lane in self._lanes:
+                lane[:] = [waiter for waiter in lane if not waiter[1].done()]
+            if not any(self._lanes):
+                return
+
+            now: float = self._clock()
+            self._refill(now)
+
+            delay: Optional[float]
+            if self._tokens >= 1:
+                future, delay = self._next_waiter(now)
+                if future is not None:
+                    future.set_result(None)
+                    continue
+            else:
+                delay = (1 - self._tokens) / self._rate
+
+            await self._sleep(delay or 0)
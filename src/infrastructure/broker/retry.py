@@ -0,0 +1,133 @@
+import json
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+import aio_pika
+from aio_pika.abc import AbstractIncomingMessage
+from pamqp.commands import Basic
+
+try:
+    from src.utils import log
+    from src.infrastructure.infra_exception import InfrastructureException
+    from src.infrastructure.broker.rabbitmq import RabbitMQManager, PUBLISH
+except ModuleNotFoundError:
+    from utils import log
+    from infrastructure.infra_exception import InfrastructureException
+    from infrastructure.broker.rabbitmq import RabbitMQManager, PUBLISH
+
+RETRIES_HEADER: str = "x-retries"
+ERROR_HEADER: str = "x-last-error"
+
+
+class RetryRouter:
+    """Delayed retries and dead-lettering for the deliveries of a queue.
+
+    A failed delivery is published, with its retry count in a header, to the
+    retry queue of the next delay. Those queues hold it for their TTL and then
+    dead-letter it back to the original queue. Once the delays are used up,
+    or if it can't even be decoded, it goes to the `<queue>.dead` queue to be
+    inspected by hand.
+    """
+
+    def __init__(self, manager: RabbitMQManager, queue_name: str,
+                 delays: Sequence[int]) -> None:
+        self._manager = manager
+        self._queue_name = queue_name
+        self._delays: tuple[int, ...] = tuple(delays)
+
+        self.retried: int = 0
+        self.dead_lettered: int = 0
+
+    @property
+    def dead_letter_queue(self) -> str:
+        return f"{self._queue_name}.dead"
+
+    def retry_queue(self, delay: int) -> str:
+        return f"{self._queue_name}.retry.{delay}s"
+
+    async def declare(self) -> None:
+        channel = self._manager.channel(PUBLISH)
+        for delay in self._delays:
+            await channel.declare_queue(
+                self.retry_queue(delay),
+                durable=True,
+                arguments={
+                    "x-message-ttl": delay * 1000,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self._queue_name,
+                },
+            )
+        await channel.declare_queue(self.dead_letter_queue, durable=True)
+
+    async def reject(self, message: AbstractIncomingMessage,
+                     error: Exception, poison: bool = False) -> str:
+        """Routes a failed delivery to its retry or dead-letter queue, and
+        returns the queue. Poison deliveries are dead-lettered right away.
+        The delivery must still be acknowledged by the caller"""
+        headers: dict[str, Any] = dict(message.headers or {})
+        retries: int = int(headers.get(RETRIES_HEADER, 0))
+
+        target: str
+        if poison or retries >= len(self._delays):
+            target = self.dead_letter_queue
+            self.dead_lettered += 1
+            log("bot", "warning", [
+                "RetryRouter",
+                f"Message {message.message_id} dead-lettered after {retries} "
+                f"retries: {error}"
+            ])
+        else:
+            target = self.retry_queue(self._delays[retries])
+            headers[RETRIES_HEADER] = retries + 1
+            self.retried += 1
+
+        headers[ERROR_HEADER] = str(error)[:200]
+        exchange = self._manager.channel(PUBLISH).default_exchange
+        confirmation = await exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                headers=headers,
+                content_type=message.content_type,
+                message_id=message.message_id,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=target,
+        )
+        if isinstance(confirmation, Basic.Nack):
+            raise InfrastructureException(f"{target} rejected the message")
+        return target
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+async def settle(message: AbstractIncomingMessage,
+                 handle: Callable[[Any], Awaitable[None]],
+                 retry: Optional[RetryRouter]) -> bool:
+    """Decodes and handles a delivery, and acknowledges it. Returns whether
+    it was handled.
+
+    Without a retry router a failed delivery is requeued. With one, it's
+    acknowledged once routed for a delayed retry or dead-lettered, and only
+    requeued if that fails.
+    """
+    async with message.process(requeue=True):
+        if retry is None:
+            await handle(json.loads(message.body.decode()))
+            return True
+
+        try:
+            body: Any = json.loads(message.body.decode())
+        except ValueError as err:
+            await retry.reject(message, err, poison=True)
+            return False
+
+        try:
+            await handle(body)
+        except Exception as err:
+            await retry.reject(message, err)
+            return False
+
+        return True
@@ -1,5 +1,6 @@
 import sqlite3
 import threading
+from typing import Any
 
 try:
     from src.utils import log
@@ -14,23 +15,25 @@ class SqliteManager:
 
     TODO: Beware Lock could be wrong and could need to be changed to Semaphore"""
 
+    file:   str
     db_con: sqlite3.Connection
     lock:   threading.Lock
 
     def __init__(self, file: str):
         try:
             log("bot", "info", ["sqlite_manager", f"Connecting to {file}"])
+            self.file = file
             self.lock = threading.Lock()
             with self.lock:
                 self.db_con = sqlite3.connect(file, check_same_thread=False)
         except Exception as err:
             raise InfrastructureException(err) from err
 
-    def read_query(self, reader_query: str, *args: str) -> \
-            list[tuple[str, ...]]:
+    def read_query(self, reader_query: str, *args: Any) -> \
+            list[tuple[Any, ...]]:
         """Execute a reader query and return the result as a list of
         tuples containing strings"""
-        result: list[tuple[str, ...]] = []
+        result: list[tuple[Any, ...]] = []
         try:
             with self.lock:
                 result = self.db_con.execute(reader_query, args).fetchall()
@@ -40,7 +43,7 @@ class SqliteManager:
 
         return result
 
-    def exc_query(self, exc_query: str, *args: str) -> None:
+    def exc_query(self, exc_query: str, *args: Any) -> None:
         """Execute a non-reader query"""
         try:
             with self.lock:
@@ -52,6 +55,101 @@ class SqliteManager:
         except Exception as err:
             raise InfrastructureException(err) from err
 
+    def exc_transaction(self, *queries: tuple[str, tuple[Any, ...]]) -> \
+            list[int]:
+        """Execute several non-reader queries, each with its own arguments,
+        as a single transaction. Returns the rows affected by each query, so
+        the caller decides which ones were mandatory"""
+        rowcounts: list[int] = []
+        try:
+            with self.lock:
+                try:
+                    for query, args in queries:
+                        cursor: sqlite3.Cursor = \
+                            self.db_con.execute(query, args)
+                        rowcounts.append(cursor.rowcount)
+                    self.db_con.commit()
+                except Exception:
+                    self.db_con.rollback()
+                    raise
+
+        except Exception as err:
+            raise InfrastructureException(err) from err
+
+        return rowcounts
+
+    def exc_script(self, script: str) -> None:
+        """Execute several statements as a single transaction. Any failure
+        rolls back the whole script"""
+        try:
+            with self.lock:
+                try:
+                    self.db_con.executescript(f"BEGIN;\n{script}\nCOMMIT;")
+                except Exception:
+                    if self.db_con.in_transaction:
+                        self.db_con.rollback()
+                    raise
+
+        except Exception as err:
+            raise InfrastructureException(err) from err
+
+    def backup(self, target: str, pages: int = 64,
+               sleep: float = 0.01) -> None:
+        """Copy a consistent snapshot of the database into the target file,
+        a few pages at a time. A step that finds the database busy or locked
+        is retried after `sleep` seconds.
+
+        The copy is read through its own connection, so this is meant to be
+        run from a worker thread while the main connection keeps working.
+        SQLite restarts the copy if the database changes in between"""
+        try:
+            source: sqlite3.Connection = sqlite3.connect(self.file)
+            destination: sqlite3.Connection = sqlite3.connect(target)
+            try:
+                source.backup(destination, pages=pages, sleep=sleep)
+            finally:
+                destination.close()
+                source.close()
+
+        except Exception as err:
+            raise InfrastructureException(err) from err
+
+    def maintain(self, *queries: str) -> list[list[tuple[Any, ...]]]:
+        """Execute maintenance statements, such as VACUUM or PRAGMA optimize,
+        and return the rows read by each one.
+
+        They run through their own connection, without taking the lock, so
+        this is meant to be run from a worker thread while the main connection
+        keeps working. Writes on it wait for a VACUUM to finish, up to the
+        connection timeout"""
+        rows: list[list[tuple[Any, ...]]] = []
+        try:
+            maintenance: sqlite3.Connection = \
+                sqlite3.connect(self.file, isolation_level=None)
+            try:
+                for query in queries:
+                    rows.append(maintenance.execute(query).fetchall())
+            finally:
+                maintenance.close()
+
+        except Exception as err:
+            raise InfrastructureException(err) from err
+
+        return rows
+
+    def restore(self, source: str) -> None:
+        """Replace the database content with the one in the source file"""
+        try:
+            snapshot: sqlite3.Connection = sqlite3.connect(source)
+            try:
+                with self.lock:
+                    snapshot.backup(self.db_con)
+            finally:
+                snapshot.close()
+
+        except Exception as err:
+            raise InfrastructureException(err) from err
+
     def close(self) -> None:
         try:
             with self.lock:
@@ -4,7 +4,9 @@ Chapter Notifier Telegram Bot
 This bot checks for new content on certain websites to notify the user that has
 previously suscribed about it.
 """
+import signal
 import asyncio
+from datetime import timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 try:
@@ -14,14 +16,40 @@ try:
         SUBSCRIBER_ID,
         INCOMING_ROUTING_KEY,
         BOT_COMMANDS,
+        CHAPTER_RETENTION_COUNT,
+        CHAPTER_RETENTION_DAYS,
+        COMPACTION_BATCH_SIZE,
+        COMPACTION_HOUR,
+        BACKUP_DIRPATH,
+        BACKUP_PREFIX,
+        BACKUP_KEEP,
+        BACKUP_COMPRESS,
+        BACKUP_HOUR,
+        REPORTING_RECONCILE_EVERY,
+        OUTBOX_DRAIN_SECONDS,
+        OUTBOX_RETENTION_DAYS,
+        SEND_RATE_LIMIT,
+        SEND_RATE_BURST,
+        SEND_CHAT_INTERVAL,
+        SHUTDOWN_TIMEOUT,
+        EVENT_DEDUP_SIZE,
+        EVENT_DEDUP_TTL,
+        DISPATCH_PER_CHAT_ORDER,
     )
     from src.app.handlers import COMMAND_MAP, CALLBACK_MAP
-    from src.app.cron import perform_search_generator
-    from src.app.dispatcher import EventDispatcher
+    from src.app.cron import (
+        perform_search_generator,
+        perform_drain_generator,
+        perform_compaction_generator,
+        perform_backup_generator,
+        wait_for_jobs,
+    )
+    from src.app.dispatcher import EventDispatcher, SeenEvents, chat_key
     from src.app.actions import handle_delivery_error
     from src.infrastructure.broker import (
         RabbitMQManager,
         ResponsePublisher,
+        RateLimiter,
         EventConsumer,
         DeliveryErrorConsumer,
     )
@@ -33,14 +61,40 @@ except ModuleNotFoundError:
         SUBSCRIBER_ID,
         INCOMING_ROUTING_KEY,
         BOT_COMMANDS,
+        CHAPTER_RETENTION_COUNT,
+        CHAPTER_RETENTION_DAYS,
+        COMPACTION_BATCH_SIZE,
+        COMPACTION_HOUR,
+        BACKUP_DIRPATH,
+        BACKUP_PREFIX,
+        BACKUP_KEEP,
+        BACKUP_COMPRESS,
+        BACKUP_HOUR,
+        REPORTING_RECONCILE_EVERY,
+        OUTBOX_DRAIN_SECONDS,
+        OUTBOX_RETENTION_DAYS,
+        SEND_RATE_LIMIT,
+        SEND_RATE_BURST,
+        SEND_CHAT_INTERVAL,
+        SHUTDOWN_TIMEOUT,
+        EVENT_DEDUP_SIZE,
+        EVENT_DEDUP_TTL,
+        DISPATCH_PER_CHAT_ORDER,
     )
     from app.handlers import COMMAND_MAP, CALLBACK_MAP
-    from app.cron import perform_search_generator
-    from app.dispatcher import EventDispatcher
+    from app.cron import (
+        perform_search_generator,
+        perform_drain_generator,
+        perform_compaction_generator,
+        perform_backup_generator,
+        wait_for_jobs,
+    )
+    from app.dispatcher import EventDispatcher, SeenEvents, chat_key
     from app.actions import handle_delivery_error
     from infrastructure.broker import (
         RabbitMQManager,
         ResponsePublisher,
+        RateLimiter,
         EventConsumer,
         DeliveryErrorConsumer,
     )
@@ -58,23 +112,45 @@ async def main() -> None:
     await manager.connect()
 
     subscriber_queue = await manager.declare_subscriber_queue(
-        INCOMING_ROUTING_KEY
+        INCOMING_ROUTING_KEY, f"subscriber.{SUBSCRIBER_ID}"
     )
 
-    publisher = ResponsePublisher(manager, BOT_ID)
+    if broker_config.management_url:
+        try:
+            stale: list[str] = await manager.delete_stale_queues(
+                keep=subscriber_queue.name, routing_key=INCOMING_ROUTING_KEY
+            )
+            log("bot", "info", ["main", f"Stale queues deleted: {stale}"])
+        except Exception as err:
+            log("bot", "warning",
+                ["main", f"Couldn't clean up stale queues: {err}"])
+
+    rate_limiter = RateLimiter(
+        SEND_RATE_LIMIT, SEND_RATE_BURST, SEND_CHAT_INTERVAL
+    ) if SEND_RATE_LIMIT > 0 else None
+    publisher = ResponsePublisher(
+        manager, BOT_ID, rate_limiter, broker_config.confirm_window,
+        broker_config.batch_size, broker_config.batch_interval
+    )
 
     dispatcher = EventDispatcher(
         publisher=publisher,
         command_map=COMMAND_MAP,
         callback_map=CALLBACK_MAP,
+        seen=SeenEvents(EVENT_DEDUP_SIZE, EVENT_DEDUP_TTL),
     )
 
     event_consumer = EventConsumer(
-        manager, subscriber_queue, dispatcher.handle_event
+        manager, subscriber_queue, dispatcher.handle_event,
+        broker_config.prefetch_count, broker_config.consumer_workers,
+        broker_config.retry_delays,
+        order_key=chat_key if DISPATCH_PER_CHAT_ORDER else None,
     )
     await event_consumer.start()
 
-    error_consumer = DeliveryErrorConsumer(manager, handle_delivery_error)
+    error_consumer = DeliveryErrorConsumer(
+        manager, handle_delivery_error, broker_config.retry_delays
+    )
     await error_consumer.start()
 
     await publisher.register_commands(
@@ -88,25 +164,102 @@ async def main() -> None:
     log("bot", "info", ["main", "Bot commands registered"])
 
     log("bot", "info", ["main", "Running discovery for init"])
-    search_fn = perform_search_generator(publisher, BOT_ID)
+    search_fn = perform_search_generator(
+        publisher, BOT_ID, REPORTING_RECONCILE_EVERY
+    )
     await search_fn()
 
+    scheduler.add_job(search_fn, "cron", minute="*/15")
+
+    scheduler.add_job(
+        perform_drain_generator(publisher, BOT_ID),
+        "interval", seconds=OUTBOX_DRAIN_SECONDS
+    )
+
     scheduler.add_job(
-        perform_search_generator(publisher, BOT_ID), "cron", minute="*/15"
+        perform_compaction_generator(
+            keep_last=CHAPTER_RETENTION_COUNT,
+            max_age=timedelta(days=CHAPTER_RETENTION_DAYS)
+            if CHAPTER_RETENTION_DAYS > 0 else None,
+            batch_size=COMPACTION_BATCH_SIZE,
+            outbox_max_age=timedelta(days=OUTBOX_RETENTION_DAYS),
+        ),
+        "cron", hour=COMPACTION_HOUR, minute=30
     )
 
+    if BACKUP_DIRPATH:
+        scheduler.add_job(
+            perform_backup_generator(
+                BACKUP_DIRPATH, BACKUP_PREFIX, BACKUP_KEEP, BACKUP_COMPRESS
+            ),
+            "cron", hour=BACKUP_HOUR, minute=5
+        )
+
+    async def log_broker_stats() -> None:
+        log("bot", "debug", ["main", f"Events: {event_consumer.stats()}"])
+        log("bot", "debug",
+            ["main", f"Events seen: {dispatcher.seen.stats()}"])
+        log("bot", "debug",
+            ["main", f"Delivery errors: {error_consumer.stats()}"])
+        log("bot", "debug", ["main", f"Publisher: {publisher.stats()}"])
+
+    scheduler.add_job(log_broker_stats, "interval", minutes=5)
+
     log("bot", "info", ["main", "Bot ready. Waiting for events..."])
 
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            # Not supported on Windows, KeyboardInterrupt still stops it
+            pass
+
     try:
-        await asyncio.Event().wait()
+        await stop.wait()
+        log("bot", "info", ["main", "Stopping bot"])
     except asyncio.CancelledError:
         pass
     finally:
-        await event_consumer.stop()
-        await error_consumer.stop()
-        await manager.disconnect()
+        await shutdown(
+            event_consumer, error_consumer, publisher, manager,
+            SHUTDOWN_TIMEOUT
+        )
         log("bot", "info", ["main", "Bot stopped"])
 
 
+async def shutdown(
+    event_consumer: EventConsumer,
+    error_consumer: DeliveryErrorConsumer,
+    publisher: ResponsePublisher,
+    manager: RabbitMQManager,
+    timeout: float,
+) -> None:
+    """Stops taking events and scheduling jobs, gives the events being
+    handled and the jobs running up to `timeout` seconds to finish, writes
+    the buffered responses and disconnects"""
+    loop = asyncio.get_running_loop()
+    deadline: float = loop.time() + timeout
+
+    def remaining() -> float:
+        return max(deadline - loop.time(), 0)
+
+    scheduler.shutdown(wait=False)
+
+    if not await event_consumer.stop(remaining()):
+        log("bot", "warning",
+            ["shutdown", "Events still being handled, they'll be redelivered"])
+    if not await error_consumer.stop(remaining()):
+        log("bot", "warning",
+            ["shutdown", "Delivery errors still being handled"])
+    if not await wait_for_jobs(remaining()):
+        log("bot", "warning", ["shutdown", "Jobs still running, cut off"])
+
+    if publisher.buffer is not None:
+        await publisher.buffer.flush()
+    await manager.disconnect()
+
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,195 @@
+import os
+import asyncio
+import unittest
+import threading
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+os.environ["TB_CHAPTER_NOTIFIER_TEST"] = "True"
+
+try:
+    import src.app.actions as actions
+    from src.app.client import memory, DATABASE_FILEPATH
+    from src.infrastructure.broker import ResponsePublisher
+except ModuleNotFoundError:
+    import app.actions as actions
+    from app.client import memory, DATABASE_FILEPATH
+    from infrastructure.broker import ResponsePublisher
+
+
+class TestAppActions(unittest.IsolatedAsyncioTestCase):
+    """Tests for the app actions"""
+
+    database_filepath: str = \
+        DATABASE_FILEPATH.replace("roger_test", "test_actions_db")
+
+    def setUp(self) -> None:
+        memory.close()
+        memory.init(self.database_filepath)
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        memory.close()
+        if os.path.exists(self.database_filepath):
+            os.remove(self.database_filepath)
+
+        return super().tearDown()
+
+    def add_release(self, manga: str, chapter: str) -> None:
+        self.assertTrue(memory.insert_manga(manga, ""))
+        self.assertTrue(memory.insert_manga_chapter(
+            chapter, chapter, f"https://{chapter}", datetime(2024, 10, 18),
+            manga
+        ))
+
+    async def test_process_reporting_grouped(self):
+        """Pending suscriptions are notified once per release and marked as
+        notified, while up to date ones are left alone"""
+        self.add_release("Manga 1", "Chapter 1")
+        self.add_release("Manga 2", "Chapter 2")
+        for chat_id in (1, 2, 3):
+            self.assertTrue(memory.insert_chat(chat_id, f"Chat {chat_id}"))
+            self.assertTrue(memory.insert_suscription(chat_id, "Manga 1", ""))
+        self.assertTrue(memory.insert_suscription(1, "Manga 2", "Chapter 2"))
+
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+
+        report = await actions.process_reporting(publisher, "bot")
+
+        self.assertEqual(3, len(report))
+        self.assertTrue(all(error is None for _, error in report))
+        self.assertEqual(3, publisher.publish_text.await_count)
+        self.assertEqual(
+            {1, 2, 3},
+            {c.kwargs["chat_id"] for c in publisher.publish_text.await_args_list}
+        )
+        self.assertEqual(
+            1,
+            len({c.kwargs["text"]
+                 for c in publisher.publish_text.await_args_list})
+        )
+        self.assertTrue(all(
+            sus.last == "Chapter 1"
+            for sus in memory.read_suscription_by_manga("Manga 1")
+        ))
+
+        publisher.publish_text.reset_mock()
+        self.assertEqual([], await actions.process_reporting(publisher, "bot"))
+        publisher.publish_text.assert_not_awaited()
+
+    async def test_process_reporting_failed_chat(self):
+        """A notification that fails to publish stays in the outbox and is
+        retried with the same key by the next drain, alone"""
+        self.add_release("Manga 1", "Chapter 1")
+        for chat_id in (1, 2):
+            self.assertTrue(memory.insert_chat(chat_id, f"Chat {chat_id}"))
+            self.assertTrue(memory.insert_suscription(chat_id, "Manga 1", ""))
+
+        async def publish_text(chat_id: int, **kwargs) -> None:
+            if chat_id == 2:
+                raise ConnectionError("broker down")
+
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+        publisher.publish_text.side_effect = publish_text
+
+        report = await actions.process_reporting(publisher, "bot")
+
+        errors = {sus.chat.id: error for sus, error in report}
+        self.assertIsNone(errors[1])
+        self.assertIsInstance(errors[2], ConnectionError)
+        first_key: str = \
+            publisher.publish_text.await_args_list[1].kwargs["response_id"]
+
+        publisher.publish_text.reset_mock(side_effect=True)
+        report = await actions.drain_outbox(publisher, "bot")
+
+        self.assertEqual([(2, None)],
+                         [(sus.chat.id, error) for sus, error in report])
+        publisher.publish_text.assert_awaited_once()
+        self.assertEqual(
+            first_key,
+            publisher.publish_text.await_args.kwargs["response_id"]
+        )
+        self.assertEqual([], await actions.drain_outbox(publisher, "bot"))
+
+    async def test_process_reporting_updated_only(self):
+        """Only the suscriptions to the updated mangas and those marked for
+        reporting are notified"""
+        for manga in ("Manga 1", "Manga 2", "Manga 3"):
+            self.add_release(manga, f"{manga} Chapter 1")
+        self.assertTrue(memory.insert_chat(1, "Chat 1"))
+        for manga in ("Manga 1", "Manga 2", "Manga 3"):
+            self.assertTrue(memory.insert_suscription(1, manga, ""))
+
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+
+        self.assertEqual(
+            [], await actions.process_reporting(publisher, "bot", set())
+        )
+
+        actions.mark_for_reporting("Manga 3")
+        report = await actions.process_reporting(publisher, "bot",
+                                                 {"Manga 1"})
+
+        self.assertEqual({"Manga 1", "Manga 3"},
+                         {sus.manga.name for sus, _ in report})
+
+        report = await actions.process_reporting(publisher, "bot")
+
+        self.assertEqual(["Manga 2"], [sus.manga.name for sus, _ in report])
+
+    async def test_drain_outbox_digest(self):
+        """In digest mode a chat with several chapters gets one message, and
+        a chat with one chapter the usual notification"""
+        self.add_release("Manga 1", "Chapter 1")
+        self.add_release("Manga 2", "Chapter 2")
+        for chat_id in (1, 2):
+            self.assertTrue(memory.insert_chat(chat_id, f"Chat {chat_id}"))
+            self.assertTrue(memory.insert_suscription(chat_id, "Manga 1", ""))
+        self.assertTrue(memory.insert_suscription(1, "Manga 2", ""))
+
+        # Enqueued, but not published without a broker
+        for manga in ("Manga 1", "Manga 2"):
+            actions.mark_for_reporting(manga)
+        report = await actions.process_reporting(None, "bot", set())
+        self.assertTrue(all(error is not None for _, error in report))
+
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+        report = await actions.drain_outbox(publisher, "bot", digest=True)
+
+        self.assertEqual(3, len(report))
+        self.assertEqual(2, publisher.publish_text.await_count)
+        texts = {c.kwargs["chat_id"]: c.kwargs["text"]
+                 for c in publisher.publish_text.await_args_list}
+        self.assertIn("Chapter 1", texts[1])
+        self.assertIn("Chapter 2", texts[1])
+        self.assertNotIn("Chapter 2", texts[2])
+
+    async def test_compact_chapter_history_off_loop(self):
+        """The database keeps answering on the event loop while the
+        compaction, a full VACUUM on old databases, is running"""
+        manager = memory.raw_db.manager
+        maintain = manager.maintain
+        started: threading.Event = threading.Event()
+        read: threading.Event = threading.Event()
+        read_while_running: list[bool] = []
+
+        def blocking_maintain(*queries: str) -> list:
+            started.set()
+            read_while_running.append(read.wait(5))
+            return maintain(*queries)
+
+        with patch.object(manager, "maintain", blocking_maintain):
+            compaction = asyncio.create_task(
+                actions.compact_chapter_history(0, None, 10)
+            )
+            self.assertTrue(await asyncio.to_thread(started.wait, 5))
+            self.assertGreater(memory.size(), 0)
+            read.set()
+            await compaction
+
+        self.assertTrue(read_while_running and all(read_while_running))
+
+if __name__ == "__main__":
+    unittest.main()
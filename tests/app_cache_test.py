@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import unittest
+from datetime import datetime
+
+try:
+    import src.app.cache as cache
+    import src.domain.database as idb
+    from src.domain.communications import Chat
+except ModuleNotFoundError:
+    import app.cache as cache
+    import domain.database as idb
+    from domain.communications import Chat
+
+
+class TestAppCache(unittest.TestCase):
+    """Tests for the write-through cache over the app database"""
+
+    database_filepath: str = "tests/test_cache.db"
+    snapshot_filepath: str = "tests/test_cache_snapshot.db"
+
+    def tearDown(self) -> None:
+        """Remove the test database files"""
+        for path in (self.database_filepath, self.snapshot_filepath):
+            if os.path.exists(path):
+                os.remove(path)
+
+        return super().tearDown()
+
+    def test_load_existing_data(self) -> None:
+        """Rows already in the database are served from the cache"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+        self.assertTrue(memory.insert_chat(1, "chat_name"))
+        self.assertTrue(memory.insert_manga("manga_name", "manga_url"))
+        self.assertTrue(memory.insert_suscription(1, "manga_name", ""))
+        memory.close()
+
+        memory = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+
+        self.assertEqual(memory.read_chat_by_id(1), Chat(1, "chat_name"))
+        self.assertEqual(len(memory.read_mangas()), 1)
+        self.assertEqual(len(memory.read_suscription_by_chat(1)), 1)
+        self.assertEqual(memory.stats()["hits"], 3)
+        self.assertEqual(memory.stats()["misses"], 0)
+        self.assertEqual(memory.stats()["entries"], 3)
+
+    def test_write_through(self) -> None:
+        """Writes are visible in the cache and match the database"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.insert_chat(1, "chat_name"))
+        self.assertTrue(memory.update_chat_name(1, "new_name"))
+        self.assertTrue(memory.insert_manga("manga_name", "manga_url"))
+        self.assertTrue(memory.insert_suscription(1, "manga_name", ""))
+        self.assertTrue(memory.insert_manga_chapter(
+            "chapter_name", "1", "chapter_url",
+            datetime(2024, 10, 18, 10, 44, 59), "manga_name"
+        ))
+        self.assertTrue(
+            memory.update_suscription_last(1, "manga_name", "chapter_name")
+        )
+
+        manga = memory.read_manga_by_name("manga_name")[0]
+        self.assertIsNotNone(manga.last_chapter)
+        self.assertEqual(manga.last_chapter.name, "chapter_name")
+        self.assertEqual(memory.read_chat_by_id(1), Chat(1, "new_name"))
+
+        cached = memory.read_suscriptions()
+        self.assertEqual(cached[0].last, "chapter_name")
+        self.assertEqual(cached, cache.Database.read_suscriptions(memory))
+
+        self.assertTrue(memory.delete_suscription(1, "manga_name"))
+        self.assertTrue(memory.delete_chat(1))
+        self.assertEqual(memory.read_suscription_by_manga("manga_name"), [])
+        self.assertIsNone(memory.read_chat_by_id(1))
+
+    def test_failed_write_not_cached(self) -> None:
+        """A write rejected by the database leaves the cache untouched"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.insert_chat(1, "chat_name"))
+        self.assertFalse(memory.insert_chat(1, "other_name"))
+
+        self.assertEqual(memory.read_chats(), [Chat(1, "chat_name")])
+
+    def test_bounded(self) -> None:
+        """Past its bound the suscriptions of the chats read least recently
+        are evicted, and served again once read back from the database"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase(max_entries=2)
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.insert_manga("manga_1", "manga_url"))
+        self.assertTrue(memory.insert_manga("manga_2", "manga_url"))
+        for chat_id in (1, 2):
+            self.assertTrue(memory.insert_chat(chat_id, f"chat_{chat_id}"))
+            self.assertTrue(memory.insert_suscription(chat_id, "manga_1", ""))
+        self.assertTrue(memory.stats()["complete"])
+
+        self.assertEqual(len(memory.read_suscription_by_chat(1)), 1)
+        self.assertTrue(memory.insert_suscription(1, "manga_2", ""))
+
+        self.assertFalse(memory.stats()["complete"])
+        self.assertEqual(memory.stats()["evictions"], 1)
+        self.assertEqual(memory.stats()["entries"], 6)
+
+        misses: int = memory.stats()["misses"]
+        self.assertEqual(len(memory.read_suscriptions()), 3)
+        self.assertEqual(len(memory.read_suscription_by_chat(2)), 1)
+        self.assertEqual(memory.stats()["misses"], misses + 2)
+
+        hits: int = memory.stats()["hits"]
+        self.assertEqual(len(memory.read_suscription_by_chat(2)), 1)
+        self.assertEqual(memory.stats()["hits"], hits + 1)
+        self.assertEqual(memory.stats()["misses"], misses + 2)
+
+    def test_bounded_on_load(self) -> None:
+        """A database already past the bound is still served from memory,
+        for the chats that fit"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+        self.assertTrue(memory.insert_manga("manga_name", "manga_url"))
+        for chat_id in (1, 2, 3):
+            self.assertTrue(memory.insert_chat(chat_id, f"chat_{chat_id}"))
+            self.assertTrue(
+                memory.insert_suscription(chat_id, "manga_name", "")
+            )
+        memory.close()
+
+        memory = cache.CachedDatabase(max_entries=1)
+        memory.init(self.database_filepath)
+
+        self.assertFalse(memory.stats()["complete"])
+        self.assertEqual(memory.stats()["evictions"], 2)
+
+        for chat_id in (1, 2, 3):
+            suscriptions = memory.read_suscription_by_chat(chat_id)
+            self.assertEqual([sus.chat.id for sus in suscriptions], [chat_id])
+        # Only the chat read last fits
+        self.assertEqual(memory.stats()["misses"], 3)
+        self.assertEqual(len(memory.read_suscription_by_chat(3)), 1)
+        self.assertEqual(memory.stats()["misses"], 3)
+        self.assertEqual(len(memory.read_chats()), 3)
+
+    def test_restore_reloads(self) -> None:
+        """Restoring a snapshot reloads the cache from it"""
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.insert_chat(1, "chat_1"))
+        self.assertTrue(memory.backup(self.snapshot_filepath))
+        self.assertTrue(memory.insert_chat(2, "chat_2"))
+
+        self.assertTrue(memory.restore(self.snapshot_filepath))
+        self.assertEqual(memory.read_chats(), [Chat(1, "chat_1")])
+
+    def test_restore_migrates(self) -> None:
+        """A snapshot taken before the current schema is migrated before the
+        cache is loaded from it"""
+
+        legacy = sqlite3.connect(self.snapshot_filepath)
+        legacy.executescript('''
+            CREATE TABLE chats (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE suscriptions (
+                chat INTEGER NOT NULL, manga TEXT NOT NULL, last TEXT,
+                PRIMARY KEY (chat, manga)
+            );
+            CREATE TABLE manga_chapters (
+                name TEXT NOT NULL, number TEXT, url TEXT, date TEXT,
+                manga TEXT NOT NULL, PRIMARY KEY (manga, name)
+            );
+            CREATE TABLE mangas (
+                name TEXT PRIMARY KEY, url TEXT NOT NULL, last_chapter TEXT
+            );
+            INSERT INTO chats VALUES (1, 'chat_1');
+            INSERT INTO mangas VALUES ('manga_name', 'manga_url', '');
+            INSERT INTO suscriptions VALUES (1, 'manga_name', '');
+            INSERT INTO manga_chapters
+                VALUES ('chapter_name', '1', 'chapter_url',
+                        '2024-10-18 10:44:59', 'manga_name');
+        ''')
+        legacy.close()
+
+        memory: cache.CachedDatabase = cache.CachedDatabase()
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.restore(self.snapshot_filepath))
+
+        self.assertEqual(memory.raw_db.schema_version(),
+                         idb.SCHEMA_VERSION)
+        self.assertTrue(memory.stats()["complete"])
+        self.assertEqual(memory.read_chats(), [Chat(1, "chat_1")])
+        manga = memory.read_manga_by_name("manga_name")[0]
+        self.assertEqual(manga.last_chapter.name, "chapter_name")
+        self.assertEqual(len(memory.read_suscription_by_chat(1)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+os.environ["TB_CHAPTER_NOTIFIER_TEST"] = "True"
+
+try:
+    from src.domain.model import MangaChapter
+    from src.domain.communications import Chat
+    from src.app.communications import notify_suscribers
+    from src.infrastructure.broker import ResponsePublisher
+except ModuleNotFoundError:
+    from domain.model import MangaChapter
+    from domain.communications import Chat
+    from app.communications import notify_suscribers
+    from infrastructure.broker import ResponsePublisher
+
+
+class TestAppCommunications(unittest.IsolatedAsyncioTestCase):
+    """Tests for the app communications"""
+
+    chapter: MangaChapter = MangaChapter(
+        "Chapter 1", "1", "https://chapter1", datetime(2024, 10, 18),
+        "Manga 1"
+    )
+
+    async def test_notify_suscribers_bounded(self):
+        """Publications run concurrently up to the limit, and results keep
+        the chats order along with their errors"""
+        chats: list[Chat] = [Chat(i, f"Chat {i}") for i in range(20)]
+        in_flight: int = 0
+        max_in_flight: int = 0
+
+        async def publish_text(chat_id: int, **kwargs) -> None:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Later chats finish first
+            await asyncio.sleep(0.001 * (20 - chat_id))
+            in_flight -= 1
+            if chat_id % 5 == 0:
+                raise ConnectionError(f"chat {chat_id}")
+
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+        publisher.publish_text.side_effect = publish_text
+
+        results = await notify_suscribers(self.chapter, chats, publisher,
+                                          "bot", concurrency=4)
+
+        self.assertEqual(4, max_in_flight)
+        self.assertEqual(chats, [chat for chat, _ in results])
+        self.assertEqual(
+            [0, 5, 10, 15],
+            [chat.id for chat, error in results
+             if isinstance(error, ConnectionError)]
+        )
+        self.assertEqual(16, sum(error is None for _, error in results))
+        self.assertTrue(all(c.kwargs["bulk"]
+                            for c in publisher.publish_text.await_args_list))
+
+    async def test_notify_suscribers_empty(self):
+        """No chats, no publications"""
+        publisher: ResponsePublisher = AsyncMock(spec=ResponsePublisher)
+
+        self.assertEqual(
+            [], await notify_suscribers(self.chapter, [], publisher, "bot")
+        )
+        publisher.publish_text.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+os.environ["TB_CHAPTER_NOTIFIER_TEST"] = "True"
+
+try:
+    import src.app.cron as cron
+except ModuleNotFoundError:
+    import app.cron as cron
+
+
+class TestAppCron(unittest.IsolatedAsyncioTestCase):
+    """Tests for the app cron jobs"""
+
+    async def test_perform_search_reconciliation(self):
+        """Searches report the updated mangas, and every few runs all the
+        suscriptions"""
+        reporting = AsyncMock(return_value=[])
+
+        with patch.object(cron, "explore_web", return_value={"Manga 1"}), \
+                patch.object(cron, "process_reporting", reporting):
+            perform_search = cron.perform_search_generator(
+                None, "bot", reconcile_every=3
+            )
+            for _ in range(4):
+                await perform_search()
+
+        self.assertEqual(
+            [None, {"Manga 1"}, {"Manga 1"}, None],
+            [c.args[2] for c in reporting.await_args_list]
+        )
+
+    async def test_wait_for_jobs(self):
+        """Shutdown waits for the running jobs, up to the timeout"""
+        release: asyncio.Event = asyncio.Event()
+
+        async def reporting(*args) -> list:
+            await release.wait()
+            return []
+
+        with patch.object(cron, "explore_web", return_value=set()), \
+                patch.object(cron, "process_reporting", reporting):
+            job = asyncio.create_task(cron.perform_search_generator()())
+            await asyncio.sleep(0)
+
+            self.assertFalse(await cron.wait_for_jobs(0.01))
+            release.set()
+            self.assertTrue(await cron.wait_for_jobs(1))
+
+        self.assertTrue(job.done())
+        self.assertTrue(await cron.wait_for_jobs(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -195,6 +195,22 @@ class TestAppDatabase(unittest.TestCase):
         self.assertEqual(len(mangas), 1)
         self.assertEqual(mangas[0], manga)
 
+    def test_read_manga_by_id(self) -> None:
+        """Test the read_manga_by_id method"""
+
+        memory: database.Database = database.Database()
+        memory.init(self.database_filepath)
+
+        self.assertTrue(memory.insert_manga("manga_name", "manga_url", ""))
+
+        mangas: list[Manga] = memory.read_manga_by_name("manga_name")
+        self.assertIsNotNone(mangas[0].id)
+
+        manga: Optional[Manga] = memory.read_manga_by_id(mangas[0].id)
+        self.assertEqual(manga, Manga("manga_name", "manga_url", None))
+        self.assertEqual(manga.id, mangas[0].id)
+        self.assertIsNone(memory.read_manga_by_id(mangas[0].id + 1))
+
     def test_read_manga_by_name_not_exists(self) -> None:
         """Test the read_manga_by_name method with a non existing manga"""
 
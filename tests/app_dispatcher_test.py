@@ -0,0 +1,84 @@
+import os
+import unittest
+from unittest.mock import AsyncMock
+
+os.environ["TB_CHAPTER_NOTIFIER_TEST"] = "True"
+
+try:
+    from src.app.dispatcher import EventDispatcher, SeenEvents, chat_key
+    from src.infrastructure.broker import ResponsePublisher
+except ModuleNotFoundError:
+    from app.dispatcher import EventDispatcher, SeenEvents, chat_key
+    from infrastructure.broker import ResponsePublisher
+
+
+def command(chat_id: int, message_id: int, **kwargs) -> dict:
+    return {
+        "event_type": "command",
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "routing_context": {"command": "list"},
+        **kwargs,
+    }
+
+
+class TestSeenEvents(unittest.TestCase):
+    """Tests for the recently handled events set"""
+
+    def test_ttl_and_size(self) -> None:
+        """Events are forgotten once expired, or oldest first when full"""
+        now: list[float] = [0.0]
+        seen: SeenEvents = SeenEvents(max_size=2, ttl=10,
+                                      clock=lambda: now[0])
+
+        self.assertTrue(seen.add("a"))
+        self.assertFalse(seen.add("a"))
+        self.assertTrue(seen.add("b"))
+        self.assertTrue(seen.add("c"))
+        self.assertTrue(seen.add("a"))
+
+        now[0] = 20
+        self.assertTrue(seen.add("c"))
+        self.assertEqual({"size": 1, "duplicates": 1, "evicted": 2},
+                         seen.stats())
+
+
+class TestEventDispatcher(unittest.IsolatedAsyncioTestCase):
+    """Tests for the event dispatcher"""
+
+    def setUp(self) -> None:
+        self.handler = AsyncMock()
+        self.dispatcher = EventDispatcher(
+            AsyncMock(spec=ResponsePublisher), {"list": self.handler}, {}
+        )
+        return super().setUp()
+
+    async def test_redelivery_dropped(self):
+        """A redelivered event doesn't reach the handler again"""
+        await self.dispatcher.handle_event(command(1, 10, event_id="e1"))
+        await self.dispatcher.handle_event(command(1, 10, event_id="e1"))
+        await self.dispatcher.handle_event(command(1, 11))
+        await self.dispatcher.handle_event(command(1, 11))
+        await self.dispatcher.handle_event(command(2, 11))
+
+        self.assertEqual(3, self.handler.await_count)
+        self.assertEqual(2, self.dispatcher.seen.stats()["duplicates"])
+
+    async def test_failed_event_retried(self):
+        """An event whose handler failed is handled again when retried"""
+        self.handler.side_effect = [ValueError("failed"), None]
+
+        with self.assertRaises(ValueError):
+            await self.dispatcher.handle_event(command(1, 10))
+        await self.dispatcher.handle_event(command(1, 10))
+
+        self.assertEqual(2, self.handler.await_count)
+
+    def test_chat_key(self):
+        """Events are ordered by their chat, if they have one"""
+        self.assertEqual(1, chat_key(command(1, 10)))
+        self.assertIsNone(chat_key({"event_type": "command"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
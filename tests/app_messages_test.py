@@ -176,5 +176,38 @@ class TestAppMessages(unittest.TestCase):
         self.assertEqual(result[1][1]["text"], ">")
 
 
+    def test_split_message_fits(self):
+        """Test the split_message function with lines that fit in one
+        message"""
+        result = msgs.split_message("header\n", ["a\n", "b\n"])
+
+        self.assertEqual(result, ["header\na\nb\n"])
+
+    def test_split_message_at_limit(self):
+        """Test the split_message function splitting whole lines at the
+        limit, repeating the header"""
+        result = msgs.split_message("H:", ["aaaa", "bbbb", "cccc"], limit=10)
+
+        self.assertEqual(result, ["H:aaaabbbb", "H:cccc"])
+        self.assertTrue(all(len(message) <= 10 for message in result))
+
+    def test_split_message_long_line(self):
+        """Test the split_message function with a line longer than the
+        limit"""
+        result = msgs.split_message("H:", ["a" * 20], limit=10)
+
+        self.assertEqual(result, ["H:" + "a" * 8])
+
+    def test_split_message_utf16(self):
+        """Test the split_message function measuring in UTF-16 code units,
+        where an emoji takes two, and not cutting one in half"""
+        result = msgs.split_message("🔔", ["📖a\n", "📖b\n", "📖" * 5],
+                                    limit=9)
+
+        self.assertEqual(result, ["🔔📖a\n", "🔔📖b\n", "🔔📖📖📖"])
+        self.assertTrue(all(msgs.utf16_length(message) <= 9
+                            for message in result))
+
+
 if __name__ == "__main__":
     unittest.main()
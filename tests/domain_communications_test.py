@@ -481,6 +481,17 @@ class TestDomainCommunications(unittest.TestCase):
         self.assertIsNone(suscriptions)
         self.assertFalse(done)
 
+    def test_chat_index(self):
+        """Chats are found and removed by ID"""
+        index: coms.ChatIndex = coms.ChatIndex(
+            [coms.Chat(1, "Chat 1"), coms.Chat(2, "Chat 2")]
+        )
+
+        self.assertEqual(coms.Chat(2, "Chat 2"), index.by_id(2))
+        self.assertEqual(coms.Chat(1, "Chat 1"), index.remove(1))
+        self.assertNotIn(1, index)
+        self.assertEqual(1, len(index))
+
 
 if __name__ == "__main__":
     unittest.main()
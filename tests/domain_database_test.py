@@ -1,4 +1,5 @@
 import os
+import sqlite3
 import unittest
 from typing import Optional
 
@@ -78,10 +79,11 @@ class TestDomainDatabase(unittest.TestCase):
         memory.init(self.database_filepath)
         memory.create()
 
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
         self.assertTrue(
             memory.insert_manga_chapter(
                 "Chapter 1", "1",
-                "url", "date",
+                "url", 1729248299,
                 "Manga 1"
             )
         )
@@ -91,9 +93,42 @@ class TestDomainDatabase(unittest.TestCase):
         self.assertEqual(chapters[0][0], "Chapter 1")
         self.assertEqual(chapters[0][1], "1")
         self.assertEqual(chapters[0][2], "url")
-        self.assertEqual(chapters[0][3], "date")
+        self.assertEqual(chapters[0][3], 1729248299)
         self.assertEqual(chapters[0][4], "Manga 1")
 
+    def test_db_insert_manga_chapter_unknown_manga(self):
+        """Test a chapter can't be inserted for a manga not in the database"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertFalse(
+            memory.insert_manga_chapter(
+                "Chapter 1", "1",
+                "url", 1729248299,
+                "Manga 1"
+            )
+        )
+
+    def test_db_read_manga_with_last_chapter_by_id(self):
+        """Test the read manga by ID function"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        self.assertTrue(memory.insert_manga("Manga 2", "url"))
+
+        mangas: list[tuple] = memory.read_manga_with_last_chapter_by_id(2)
+
+        self.assertEqual(len(mangas), 1)
+        self.assertEqual(mangas[0][0], "Manga 2")
+        self.assertEqual(mangas[0][7], 2)
+
     def test_db_read_chat_by_id(self):
         """Test the read chat by id function"""
 
@@ -176,7 +211,7 @@ class TestDomainDatabase(unittest.TestCase):
                 chapter_name="Chapter 1",
                 chapter_number="1",
                 chapter_url="url",
-                chapter_date="date",
+                chapter_date=1729248299,
                 manga_name="Manga 1"
             )
         )
@@ -187,7 +222,7 @@ class TestDomainDatabase(unittest.TestCase):
         self.assertEqual(chapters[0][0], "Chapter 1")
         self.assertEqual(chapters[0][1], "1")
         self.assertEqual(chapters[0][2], "url")
-        self.assertEqual(chapters[0][3], "date")
+        self.assertEqual(chapters[0][3], 1729248299)
         self.assertEqual(chapters[0][4], "Manga 1")
 
     def test_db_read_manga_by_name(self):
@@ -268,7 +303,7 @@ class TestDomainDatabase(unittest.TestCase):
             chapter_name="Chapter 1",
             chapter_number="1",
             chapter_url="url",
-            chapter_date="date",
+            chapter_date=1729248299,
             manga_name="Manga 1"
             )
         )
@@ -365,6 +400,348 @@ class TestDomainDatabase(unittest.TestCase):
             memory.update_manga("Manga 2", "New Chapter")
         )
 
+    def test_db_insert_manga_chapter_moves_last_chapter(self):
+        """Test inserting chapters keeps the manga last chapter pointer on
+        the newest one"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 2", "2", "url", 200, "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 1", "1", "url", 100, "Manga 1"))
+
+        mangas: list[tuple] = memory.read_mangas_with_last_chapter()
+
+        self.assertEqual(mangas[0][0], "Manga 1")
+        self.assertEqual(mangas[0][2], "Chapter 2")
+        self.assertEqual(mangas[0][5], 200)
+
+        self.assertTrue(memory.delete_manga_chapter("Manga 1", "Chapter 2"))
+
+        mangas = memory.read_manga_with_last_chapter_by_name("Manga 1")
+
+        self.assertEqual(mangas[0][2], "Chapter 1")
+
+    def test_db_chapters_with_the_same_date(self):
+        """Test chapters dated the same are ranked by insertion, latest
+        first, by the pointer, its fallback and the retention alike"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 1", "1", "url", 100, "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 2", "2", "url", 100, "Manga 1"))
+
+        mangas: list[tuple] = memory.read_manga_with_last_chapter_by_name(
+            "Manga 1")
+
+        self.assertEqual(mangas[0][2], "Chapter 2")
+
+        self.assertEqual(memory.delete_expired_manga_chapters(1, None, 10), 1)
+        self.assertEqual(
+            [chapter[0] for chapter in memory.read_manga_chapters()],
+            ["Chapter 2"]
+        )
+
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 3", "3", "url", 100, "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 4", "4", "url", 100, "Manga 1"))
+        self.assertTrue(memory.delete_manga_chapter("Manga 1", "Chapter 4"))
+
+        mangas = memory.read_manga_with_last_chapter_by_name("Manga 1")
+
+        self.assertEqual(mangas[0][2], "Chapter 3")
+
+        memory.close()
+
+    def test_db_read_mangas_without_last_chapter(self):
+        """Test a manga without chapters is read with an empty pointer"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+
+        mangas: list[tuple] = memory.read_mangas_with_last_chapter()
+
+        self.assertEqual(mangas[0][0], "Manga 1")
+        self.assertIsNone(mangas[0][2])
+
+    def test_db_delete_expired_manga_chapters_keep_last(self):
+        """Test only the newest chapters of each manga are kept"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        self.assertTrue(memory.insert_manga("Manga 2", "url"))
+        for number in range(1, 6):
+            self.assertTrue(memory.insert_manga_chapter(
+                f"Chapter {number}", str(number), "url", number * 100,
+                "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 1", "1", "url", 100, "Manga 2"))
+
+        self.assertEqual(memory.delete_expired_manga_chapters(2, None, 2), 2)
+        self.assertEqual(memory.delete_expired_manga_chapters(2, None, 2), 1)
+        self.assertEqual(memory.delete_expired_manga_chapters(2, None, 2), 0)
+
+        chapters: list[tuple] = memory.read_manga_chapters()
+
+        self.assertEqual(
+            sorted((chapter[4], chapter[0]) for chapter in chapters),
+            [("Manga 1", "Chapter 4"), ("Manga 1", "Chapter 5"),
+             ("Manga 2", "Chapter 1")]
+        )
+
+    def test_db_delete_expired_manga_chapters_cutoff(self):
+        """Test chapters older than the cutoff are deleted, except the one
+        each manga points to as its last chapter"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 1", "1", "url", 100, "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 2", "2", "url", 200, "Manga 1"))
+        self.assertTrue(memory.insert_manga_chapter(
+            "Chapter 3", "3", "url", 300, "Manga 1"))
+
+        self.assertEqual(memory.delete_expired_manga_chapters(0, 250, 10), 2)
+        self.assertEqual(memory.delete_expired_manga_chapters(0, 1000, 10), 0)
+
+        chapters: list[tuple] = memory.read_manga_chapters()
+
+        self.assertEqual([chapter[0] for chapter in chapters], ["Chapter 3"])
+
+    def test_db_compact(self):
+        """Test compaction switches a database to incremental auto vacuum
+        and gives back the space of deleted chapters"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+        memory.manager.exc_query("PRAGMA auto_vacuum = NONE")
+        memory.manager.exc_query(database.SQL_VACUUM)
+
+        memory.compact()
+
+        self.assertEqual(
+            memory.manager.maintain(database.SQL_READ_AUTO_VACUUM)[0][0][0],
+            database.AUTO_VACUUM_INCREMENTAL
+        )
+
+        self.assertTrue(memory.insert_manga("Manga 1", "url"))
+        for number in range(200):
+            self.assertTrue(memory.insert_manga_chapter(
+                f"Chapter {number}", str(number), "url" * 100, number,
+                "Manga 1"))
+
+        size: int = memory.size()
+
+        self.assertEqual(
+            memory.delete_expired_manga_chapters(1, None, 500), 199
+        )
+        memory.compact()
+
+        self.assertLess(memory.size(), size)
+
+        memory.close()
+
+    def test_db_notifications_outbox(self):
+        """Enqueued notifications move the suscription, supersede older
+        pending ones of the chat and are read until marked delivered"""
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_chat(1, "Chat 1"))
+        self.assertTrue(memory.insert_manga("Manga 1", "url", ""))
+        self.assertTrue(memory.insert_suscription(1, "Manga 1", ""))
+        manga_id: int = memory.read_manga_by_name("Manga 1")[0][3]
+
+        self.assertTrue(memory.enqueue_notifications(
+            [1], manga_id, "Chapter 1", "1", "url1", 100))
+        self.assertTrue(memory.enqueue_notifications(
+            [1], manga_id, "Chapter 2", "2", "url2", 200))
+        # Enqueuing the same notification again is a no-op
+        self.assertTrue(memory.enqueue_notifications(
+            [1], manga_id, "Chapter 2", "2", "url2", 300))
+
+        self.assertEqual(memory.read_suscriptions()[0][2], "Chapter 2")
+        pending = memory.read_pending_notifications(0, 10, 100)
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0][1], f"1:{manga_id}:Chapter 2")
+        self.assertEqual(pending[0][6:10],
+                         ("Manga 1", "Chapter 2", "2", "url2"))
+
+        self.assertTrue(memory.mark_notifications([], [pending[0][0]], 400))
+        self.assertEqual(memory.read_pending_notifications(0, 1, 100), [])
+        self.assertTrue(memory.mark_notifications([pending[0][0]], [], 500))
+        self.assertEqual(memory.read_pending_notifications(0, 10, 100), [])
+
+        self.assertEqual(memory.delete_finished_notifications(500, 10), 0)
+        self.assertEqual(memory.delete_finished_notifications(501, 10), 1)
+
+    def test_db_notifications_outbox_resuscription(self):
+        """A chat suscribed again gets the notifications it already got
+        before, and a deleted chat loses its pending ones"""
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertTrue(memory.insert_chat(1, "Chat 1"))
+        self.assertTrue(memory.insert_manga("Manga 1", "url", ""))
+        self.assertTrue(memory.insert_suscription(1, "Manga 1", ""))
+        manga_id: int = memory.read_manga_by_name("Manga 1")[0][3]
+
+        self.assertTrue(memory.enqueue_notifications(
+            [1], manga_id, "Chapter 1", "1", "url1", 100))
+        pending = memory.read_pending_notifications(0, 10, 100)
+        self.assertTrue(memory.mark_notifications([pending[0][0]], [], 200))
+
+        self.assertTrue(memory.delete_suscription(1, "Manga 1"))
+        self.assertTrue(memory.insert_suscription(1, "Manga 1", ""))
+        self.assertTrue(memory.enqueue_notifications(
+            [1], manga_id, "Chapter 1", "1", "url1", 300))
+
+        pending = memory.read_pending_notifications(0, 10, 100)
+        self.assertEqual([row[7] for row in pending], ["Chapter 1"])
+
+        self.assertTrue(memory.delete_chat(1))
+        self.assertEqual(
+            memory.manager.read_query("SELECT COUNT(*) FROM outbox")[0][0], 0
+        )
+        self.assertFalse(memory.delete_chat(1))
+
+        memory.close()
+
+    def test_db_create_stamps_schema_version(self):
+        """Test a new database is created at the current schema version"""
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        self.assertEqual(memory.schema_version(), database.SCHEMA_VERSION)
+        self.assertEqual(
+            memory.manager.read_query(database.SQL_READ_AUTO_VACUUM)[0][0],
+            database.AUTO_VACUUM_INCREMENTAL
+        )
+
+    def test_db_migrate_legacy_schema(self):
+        """Test a legacy database gets epoch dates, a last chapter pointer and
+        integer manga IDs"""
+
+        legacy = sqlite3.connect(self.database_filepath)
+        legacy.executescript('''
+            CREATE TABLE chats (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE suscriptions (
+                chat INTEGER NOT NULL, manga TEXT NOT NULL, last TEXT,
+                PRIMARY KEY (chat, manga)
+            );
+            CREATE TABLE manga_chapters (
+                name TEXT NOT NULL, number TEXT, url TEXT, date TEXT,
+                manga TEXT NOT NULL, PRIMARY KEY (manga, name)
+            );
+            CREATE TABLE mangas (
+                name TEXT PRIMARY KEY, url TEXT NOT NULL, last_chapter TEXT
+            );
+            INSERT INTO chats VALUES (1, 'Chat 1');
+            INSERT INTO mangas VALUES ('Manga 1', 'url', '');
+            INSERT INTO mangas VALUES ('Manga 2', 'url', '');
+            INSERT INTO suscriptions VALUES (1, 'Manga 2', 'Chapter 0');
+            INSERT INTO manga_chapters
+                VALUES ('Chapter 1', '1', 'url', '2024-10-18 10:44:59',
+                        'Manga 1');
+        ''')
+        legacy.close()
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        chapters: list[tuple] = memory.read_manga_chapters()
+        mangas: list[tuple] = memory.read_mangas_with_last_chapter()
+        suscriptions: list[tuple] = memory.read_suscriptions()
+
+        self.assertEqual(memory.schema_version(), database.SCHEMA_VERSION)
+        self.assertEqual(chapters[0][0], "Chapter 1")
+        self.assertEqual(chapters[0][3], 1729248299)
+        self.assertEqual(chapters[0][4], "Manga 1")
+        self.assertEqual(chapters[0][5], 1)
+        self.assertEqual(mangas[0][2], "Chapter 1")
+        self.assertEqual(suscriptions[0], (1, "Manga 2", "Chapter 0", 2))
+
+        memory.close()
+
+    def test_db_migrate_orphan_chapters(self):
+        """Test the mangas created for orphan chapters while migrating point
+        to their newest chapter"""
+
+        legacy = sqlite3.connect(self.database_filepath)
+        legacy.executescript('''
+            CREATE TABLE chats (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE suscriptions (
+                chat INTEGER NOT NULL, manga TEXT NOT NULL, last TEXT,
+                PRIMARY KEY (chat, manga)
+            );
+            CREATE TABLE manga_chapters (
+                name TEXT NOT NULL, number TEXT, url TEXT, date INTEGER,
+                manga TEXT NOT NULL, PRIMARY KEY (manga, name)
+            );
+            CREATE TABLE mangas (
+                name TEXT PRIMARY KEY, url TEXT NOT NULL, last_chapter TEXT
+            );
+            INSERT INTO chats VALUES (1, 'Chat 1');
+            INSERT INTO suscriptions VALUES (1, 'Manga 2', 'Chapter 0');
+            INSERT INTO manga_chapters
+                VALUES ('Chapter 2', '2', 'url', 200, 'Manga 1');
+            INSERT INTO manga_chapters
+                VALUES ('Chapter 1', '1', 'url', 100, 'Manga 1');
+            PRAGMA user_version = 2;
+        ''')
+        legacy.close()
+
+        memory: database.Database = database.Database()
+
+        memory.init(self.database_filepath)
+        memory.create()
+
+        mangas: dict[str, tuple] = {
+            manga[0]: manga for manga in memory.read_mangas_with_last_chapter()
+        }
+
+        self.assertEqual(mangas["Manga 1"][2], "Chapter 2")
+        self.assertEqual(mangas["Manga 1"][5], 200)
+        self.assertIsNone(mangas["Manga 2"][2])
+
+        memory.close()
+
     def test_close(self):
         """Test the close function"""    
         memory: database.Database = database.Database()
@@ -412,5 +412,78 @@ class TestDomainModel(unittest.TestCase):
 
         self.assertEqual(4, len(chapters))
 
+    def test_manga_chapter_epoch_date(self):
+        """A chapter built from epoch seconds matches one built from the
+        equivalent datetime, and materializes the same date"""
+        date: datetime = datetime.strptime("2024-10-18 10:44:59",
+                                           "%Y-%m-%d %H:%M:%S")
+
+        from_date: model.MangaChapter = model.MangaChapter(
+            "Chapter 1", "1", "https://www.manga1.com/chapter1", date,
+            "Manga 1"
+        )
+        from_epoch: model.MangaChapter = model.MangaChapter(
+            "Chapter 1", "1", "https://www.manga1.com/chapter1", 1729248299,
+            "Manga 1"
+        )
+
+        self.assertEqual(from_date.timestamp, 1729248299)
+        self.assertEqual(from_date, from_epoch)
+        self.assertEqual(from_epoch.date, date)
+
+    def test_manga_names_interned(self):
+        """Chapters and mangas share a single string per manga name, and
+        mangas can't be modified"""
+        name: str = "".join(("Manga ", "1"))
+        manga: model.Manga = model.Manga(name, "", None)
+        chapter: model.MangaChapter = model.MangaChapter(
+            "Chapter 1", "1", "url", 0, "".join(("Manga ", "1"))
+        )
+
+        self.assertIs(manga.name, chapter.manga)
+        self.assertFalse(hasattr(chapter, "__dict__"))
+        with self.assertRaises(AttributeError):
+            manga.link = "other"  # type: ignore
+
+    def test_manga_index(self):
+        """Mangas are found by name, link and ID, and removed from every
+        index"""
+        mangas: list[model.Manga] = [
+            model.Manga("Manga 1", "https://www.manga1.com", None, 1),
+            model.Manga("Manga 2", "", None, 2),
+            model.Manga("Manga 3", "", None),
+        ]
+        index: model.MangaIndex = model.MangaIndex(mangas)
+
+        self.assertEqual(3, len(index))
+        self.assertEqual(mangas, list(index))
+        self.assertIs(mangas[0], index.by_link("https://www.manga1.com"))
+        self.assertIs(mangas[1], index.by_id(2))
+        self.assertIs(mangas[1], index.by_link(""))
+        self.assertIn("Manga 3", index)
+
+        self.assertIs(mangas[1], index.remove("Manga 2"))
+        self.assertIsNone(index.by_name("Manga 2"))
+        self.assertIsNone(index.by_id(2))
+        self.assertIs(mangas[2], index.by_link(""))
+        self.assertIsNone(index.remove("Manga 2"))
+
+    def test_chapter_index(self):
+        """Chapters are matched by name and number"""
+        date: datetime = datetime(2024, 10, 18)
+        index: model.ChapterIndex = model.ChapterIndex([
+            model.MangaChapter("Chapter 1", "1", "url1", date, "Manga 1"),
+        ])
+
+        self.assertIn(
+            model.MangaChapter("Chapter 1", "1", "other", date, "Manga 1"),
+            index
+        )
+        self.assertNotIn(
+            model.MangaChapter("Chapter 1", "2", "url1", date, "Manga 1"),
+            index
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+try:
+    import src.infrastructure.backup as backup
+except ModuleNotFoundError:
+    import infrastructure.backup as backup
+
+
+class TestInfraBackup(unittest.TestCase):
+    """Tests for the database snapshot files infrastructure"""
+
+    def setUp(self) -> None:
+        self.directory: str = tempfile.mkdtemp()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        return super().tearDown()
+
+    def _snapshot(self, minutes: int) -> str:
+        """Creates an empty snapshot taken the given minutes ago"""
+        path: str = backup.snapshot_path(
+            self.directory, "db", datetime.now() - timedelta(minutes=minutes)
+        )
+        with open(path, "wb") as file:
+            file.write(b"snapshot")
+        return path
+
+    def test_compress_and_decompress(self):
+        """Validates that a compressed snapshot can be decompressed back"""
+        path: str = self._snapshot(0)
+
+        compressed: str = backup.compress(path)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(compressed.endswith(backup.COMPRESSED_EXTENSION))
+
+        backup.decompress(compressed, path)
+
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"snapshot")
+
+    def test_rotate_keeps_newest(self):
+        """Validates that rotation removes the oldest snapshots only"""
+        oldest: str = self._snapshot(30)
+        older: str = backup.compress(self._snapshot(20))
+        newest: list[str] = [self._snapshot(10), self._snapshot(0)]
+
+        with open(os.path.join(self.directory, "unrelated.db"), "w"):
+            pass
+
+        removed: list[str] = backup.rotate(self.directory, "db", 2)
+
+        self.assertEqual(removed, [oldest, older])
+        self.assertEqual(backup.list_snapshots(self.directory, "db"), newest)
+
+    def test_rotate_disabled(self):
+        """Validates that no snapshot is removed without a positive limit"""
+        self._snapshot(0)
+
+        self.assertEqual(backup.rotate(self.directory, "db", 0), [])
+        self.assertEqual(len(backup.list_snapshots(self.directory, "db")), 1)
@@ -0,0 +1,203 @@
+import json
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+try:
+    from src.infrastructure.broker.consumer import EventConsumer
+except ModuleNotFoundError:
+    from infrastructure.broker.consumer import EventConsumer
+
+
+class FakeMessage():
+    """Incoming message recording how it was settled"""
+
+    def __init__(self, body: dict) -> None:
+        self.body: bytes = json.dumps(body).encode()
+        self.settled: str = ""
+
+    @asynccontextmanager
+    async def process(self, requeue: bool = False):
+        try:
+            yield self
+        except BaseException:
+            # Like aio_pika, cancelled handlers are settled too
+            self.settled = "requeued" if requeue else "rejected"
+            raise
+        self.settled = "acked"
+
+    async def reject(self, requeue: bool = False) -> None:
+        self.settled = "requeued" if requeue else "rejected"
+
+
+class TestEventConsumer(unittest.IsolatedAsyncioTestCase):
+    """Tests for the event consumer"""
+
+    def queue(self) -> MagicMock:
+        queue = MagicMock()
+        queue.channel.set_qos = AsyncMock()
+        queue.consume = AsyncMock(return_value="tag")
+        queue.cancel = AsyncMock()
+        return queue
+
+    async def test_worker_pool(self):
+        """Workers bound the handlers running at once, acknowledge the
+        handled events and requeue the failed ones"""
+        running: int = 0
+        max_running: int = 0
+
+        async def callback(body: dict) -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+            if body["id"] == 3:
+                raise ValueError("handler failed")
+
+        queue: MagicMock = self.queue()
+        consumer: EventConsumer = EventConsumer(
+            MagicMock(), queue, callback, prefetch_count=10, workers=2
+        )
+        await consumer.start()
+
+        queue.channel.set_qos.assert_awaited_once_with(prefetch_count=10)
+        on_message = queue.consume.await_args.args[0]
+        messages = [FakeMessage({"id": i}) for i in range(6)]
+        for message in messages:
+            await on_message(message)
+
+        await consumer._jobs.join()
+        await consumer.stop()
+
+        self.assertEqual(2, max_running)
+        self.assertEqual(["acked"] * 3 + ["requeued"] + ["acked"] * 2,
+                         [message.settled for message in messages])
+        stats = consumer.stats()
+        self.assertEqual(5, stats["processed"])
+        self.assertEqual(1, stats["failed"])
+        self.assertEqual(0, stats["in_progress"])
+
+    async def test_task_per_event(self):
+        """Without workers the broker calls the handler for each event"""
+        callback = AsyncMock()
+        queue: MagicMock = self.queue()
+        consumer: EventConsumer = EventConsumer(MagicMock(), queue, callback)
+        await consumer.start()
+
+        message = FakeMessage({"id": 1})
+        await queue.consume.await_args.args[0](message)
+
+        callback.assert_awaited_once_with({"id": 1})
+        self.assertEqual("acked", message.settled)
+
+    async def test_stop_drains(self):
+        """Stopping cancels the consumer and waits for the events being
+        handled, up to the timeout"""
+        release: asyncio.Event = asyncio.Event()
+
+        async def callback(body: dict) -> None:
+            await release.wait()
+
+        queue: MagicMock = self.queue()
+        consumer: EventConsumer = EventConsumer(MagicMock(), queue, callback,
+                                                workers=1)
+        await consumer.start()
+        self.assertTrue(await consumer.stop(0))
+
+        await consumer.start()
+        message = FakeMessage({"id": 1})
+        await queue.consume.await_args.args[0](message)
+        await asyncio.sleep(0)
+
+        self.assertFalse(await consumer.stop(0.01))
+        queue.cancel.assert_awaited_with("tag")
+
+        await consumer.start()
+        await queue.consume.await_args.args[0](FakeMessage({"id": 2}))
+        await asyncio.sleep(0)
+        asyncio.get_running_loop().call_later(0.01, release.set)
+
+        self.assertTrue(await consumer.stop(1))
+
+    async def test_per_chat_order(self):
+        """Events of a chat run one at a time in arrival order, without
+        holding the workers other chats need, and are only settled once
+        handled. A failed one is requeued without retry delays"""
+        log: list[tuple[str, int, int]] = []
+        release: dict[int, asyncio.Event] = {1: asyncio.Event(),
+                                             2: asyncio.Event()}
+
+        async def callback(body: dict) -> None:
+            log.append(("start", body["chat_id"], body["id"]))
+            if body["id"] == 0:
+                await release[body["chat_id"]].wait()
+            log.append(("end", body["chat_id"], body["id"]))
+            if body["id"] == 2:
+                raise ValueError("handler failed")
+
+        queue: MagicMock = self.queue()
+        consumer: EventConsumer = EventConsumer(
+            MagicMock(), queue, callback, prefetch_count=8, workers=2,
+            order_key=lambda body: body.get("chat_id")
+        )
+        await consumer.start()
+
+        on_message = queue.consume.await_args.args[0]
+        messages = [FakeMessage({"chat_id": 1, "id": i}) for i in range(4)]
+        messages.append(FakeMessage({"chat_id": 2, "id": 0}))
+        for message in messages:
+            await on_message(message)
+        await asyncio.sleep(0)
+
+        self.assertEqual([("start", 1, 0), ("start", 2, 0)], log)
+        self.assertEqual([""] * 5, [message.settled for message in messages])
+        self.assertEqual(2, consumer.stats()["keys"])
+        self.assertEqual(3, consumer.stats()["queued"])
+
+        release[2].set()
+        release[1].set()
+        self.assertTrue(await consumer.stop(1))
+
+        self.assertEqual(
+            [("start", 1, 0), ("end", 1, 0), ("start", 1, 1), ("end", 1, 1),
+             ("start", 1, 2), ("end", 1, 2), ("start", 1, 3), ("end", 1, 3)],
+            [entry for entry in log if entry[1] == 1]
+        )
+        self.assertEqual(["acked", "acked", "requeued", "acked", "acked"],
+                         [message.settled for message in messages])
+        stats = consumer.stats()
+        self.assertEqual(0, stats["keys"])
+        self.assertEqual(0, stats["queued"])
+        self.assertEqual(4, stats["processed"])
+        self.assertEqual(1, stats["failed"])
+
+    async def test_per_chat_order_stop_requeues(self):
+        """Stopping past the timeout requeues the event being handled and
+        those still waiting for their chat, none of them acknowledged"""
+        async def callback(body: dict) -> None:
+            await asyncio.Event().wait()
+
+        queue: MagicMock = self.queue()
+        consumer: EventConsumer = EventConsumer(
+            MagicMock(), queue, callback, workers=1,
+            order_key=lambda body: body.get("chat_id")
+        )
+        await consumer.start()
+
+        on_message = queue.consume.await_args.args[0]
+        messages = [FakeMessage({"chat_id": chat_id, "id": i})
+                    for i, chat_id in enumerate((1, 1, 2))]
+        for message in messages:
+            await on_message(message)
+        await asyncio.sleep(0)
+
+        self.assertFalse(await consumer.stop(0.01))
+        self.assertEqual(["requeued"] * 3,
+                         [message.settled for message in messages])
+        self.assertEqual(0, consumer.stats()["queued"])
+
+
+if __name__ == "__main__":
+    unittest.main()
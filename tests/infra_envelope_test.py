@@ -0,0 +1,50 @@
+import json
+import unittest
+from datetime import datetime, timezone
+
+try:
+    from src.infrastructure.broker.envelope import EnvelopeSerializer
+except ModuleNotFoundError:
+    from infrastructure.broker.envelope import EnvelopeSerializer
+
+
+class TestEnvelopeSerializer(unittest.TestCase):
+    """Tests for the response envelope serializer"""
+
+    def test_serialize(self) -> None:
+        """Envelopes carry the static and per message fields"""
+        serializer: EnvelopeSerializer = EnvelopeSerializer("bot")
+
+        envelope = json.loads(serializer.serialize(
+            "text", 1, {"text": "🔔 Chapter"}, "id", reply_to="errors"
+        ))
+
+        self.assertEqual({
+            "response_id": "id",
+            "correlation_id": "",
+            "bot_id": "bot",
+            "chat_id": 1,
+            "response_type": "text",
+            "payload": {"text": "🔔 Chapter"},
+            "reply_to": "errors",
+        }, {k: v for k, v in envelope.items() if k != "timestamp"})
+
+        timestamp = datetime.fromisoformat(envelope["timestamp"])
+        self.assertEqual(timezone.utc, timestamp.tzinfo)
+        self.assertLess(
+            abs((datetime.now(timezone.utc) - timestamp).total_seconds()), 5
+        )
+
+    def test_response_ids(self) -> None:
+        """Response IDs are unique, also between serializers"""
+        first: EnvelopeSerializer = EnvelopeSerializer("bot")
+        second: EnvelopeSerializer = EnvelopeSerializer("bot")
+
+        ids = [first.response_id() for _ in range(1000)] + \
+            [second.response_id() for _ in range(1000)]
+
+        self.assertEqual(2000, len(set(ids)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from pamqp.commands import Basic
+
+try:
+    from src.infrastructure.infra_exception import InfrastructureException
+    from src.infrastructure.broker.publisher import ResponsePublisher
+except ModuleNotFoundError:
+    from infrastructure.infra_exception import InfrastructureException
+    from infrastructure.broker.publisher import ResponsePublisher
+
+
+class TestResponsePublisher(unittest.IsolatedAsyncioTestCase):
+    """Tests for the response publisher confirms"""
+
+    def publisher(self, publish, **kwargs) -> ResponsePublisher:
+        exchange = MagicMock()
+        exchange.publish = AsyncMock(side_effect=publish)
+        manager = MagicMock()
+        manager.get_exchange = AsyncMock(return_value=exchange)
+        return ResponsePublisher(manager, "bot", **kwargs)
+
+    async def test_nack_raises(self):
+        """A message rejected by the broker is an error, not a delivery"""
+        async def publish(message, routing_key: str):
+            return Basic.Nack() if message.message_id == "nacked" \
+                else Basic.Ack()
+
+        publisher: ResponsePublisher = self.publisher(publish)
+
+        await publisher.publish_text(1, "text", response_id="acked")
+        with self.assertRaises(InfrastructureException):
+            await publisher.publish_text(1, "text", response_id="nacked")
+
+        self.assertEqual({"in_flight": 0, "confirmed": 1, "nacked": 1},
+                         publisher.stats())
+
+    async def test_confirm_window(self):
+        """Publishes are pipelined up to the confirm window"""
+        in_flight: int = 0
+        max_in_flight: int = 0
+
+        async def publish(message, routing_key: str):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return Basic.Ack()
+
+        publisher: ResponsePublisher = self.publisher(publish,
+                                                      confirm_window=3)
+
+        await asyncio.gather(*(publisher.publish_text(chat_id, "text")
+                               for chat_id in range(10)))
+
+        self.assertEqual(3, max_in_flight)
+        self.assertEqual(10, publisher.stats()["confirmed"])
+
+    async def test_batching(self):
+        """Buffered publishes are written in batches of up to the batch size,
+        or whatever is pending once the interval elapses, and each caller
+        gets its own result"""
+        async def publish(message, routing_key: str):
+            await asyncio.sleep(0)
+            return Basic.Nack() if message.message_id == "3" else Basic.Ack()
+
+        publisher: ResponsePublisher = self.publisher(
+            publish, batch_size=4, batch_interval=0.01
+        )
+
+        async def send(response_id: str) -> None:
+            await publisher.publish_text(1, "text", response_id=response_id)
+
+        tasks = [asyncio.create_task(send(str(i))) for i in range(6)]
+        await asyncio.sleep(0)
+        self.assertEqual(2, publisher.stats()["batching"]["pending"])
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.assertIsInstance(results[3], InfrastructureException)
+        self.assertEqual(5, sum(result is None for result in results))
+
+        stats = publisher.stats()["batching"]
+        self.assertEqual(2, stats["flush_sizes"]["count"])
+        self.assertEqual(1, stats["flush_sizes"]["buckets"]["<=2"])
+        self.assertEqual(1, stats["flush_sizes"]["buckets"]["<=5"])
+        self.assertEqual(6, stats["latency"]["count"])
+
+
+if __name__ == "__main__":
+    unittest.main()
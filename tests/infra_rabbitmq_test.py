@@ -0,0 +1,161 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aio_pika.exceptions import ChannelPreconditionFailed
+
+try:
+    import src.infrastructure.broker.rabbitmq as rabbitmq
+    from src.infrastructure.broker.config import BrokerConfig
+except ModuleNotFoundError:
+    import infrastructure.broker.rabbitmq as rabbitmq
+    from infrastructure.broker.config import BrokerConfig
+
+
+class TestRabbitMQManager(unittest.IsolatedAsyncioTestCase):
+    """Tests for the broker connection manager"""
+
+    async def connected(self, config: BrokerConfig) -> rabbitmq.RabbitMQManager:
+        async def open_channel(**kwargs) -> MagicMock:
+            channel = MagicMock()
+            channel.declare_queue = AsyncMock()
+            channel.declare_exchange = AsyncMock()
+            channel.queue_delete = AsyncMock()
+            channel.__aenter__ = AsyncMock(return_value=channel)
+            channel.__aexit__ = AsyncMock(return_value=None)
+            return channel
+
+        connection = MagicMock()
+        connection.channel = AsyncMock(side_effect=open_channel)
+
+        with patch.object(rabbitmq.aio_pika, "connect_robust",
+                          AsyncMock(return_value=connection)):
+            manager = rabbitmq.RabbitMQManager(config)
+            await manager.connect()
+        return manager
+
+    async def test_channel_per_role(self):
+        """Events, delivery errors and publishes use their own channels, and
+        only the publishing one runs in confirm mode"""
+        channels: list[MagicMock] = []
+
+        async def open_channel(publisher_confirms: bool) -> MagicMock:
+            channel = MagicMock()
+            channel.publisher_confirms = publisher_confirms
+            channel.declare_queue = AsyncMock()
+            channel.declare_exchange = AsyncMock()
+            channels.append(channel)
+            return channel
+
+        connection = MagicMock()
+        connection.channel = AsyncMock(side_effect=open_channel)
+
+        with patch.object(rabbitmq.aio_pika, "connect_robust",
+                          AsyncMock(return_value=connection)):
+            manager = rabbitmq.RabbitMQManager(BrokerConfig())
+            await manager.connect()
+
+        self.assertEqual(3, len(channels))
+        connection.reconnect_callbacks.add.assert_called_once()
+
+        await manager.declare_subscriber_queue("incoming.#")
+        await manager.declare_error_queue()
+        await manager.get_exchange("tg-if.responses", "direct")
+
+        events = manager.channel(rabbitmq.EVENTS)
+        errors = manager.channel(rabbitmq.ERRORS)
+        publish = manager.channel(rabbitmq.PUBLISH)
+        self.assertEqual(3, len({id(events), id(errors), id(publish)}))
+        events.declare_queue.assert_awaited_once()
+        errors.declare_queue.assert_awaited_once()
+        publish.declare_exchange.assert_awaited_once()
+        publish.declare_queue.assert_not_awaited()
+        self.assertEqual([False, False, True],
+                         [events.publisher_confirms, errors.publisher_confirms,
+                          publish.publisher_confirms])
+
+
+    async def test_subscriber_queue(self):
+        """A named subscriber queue is durable and gets the configured
+        expiry and length limit"""
+        manager = await self.connected(
+            BrokerConfig(queue_expires=3600, queue_max_length=1000)
+        )
+
+        await manager.declare_subscriber_queue("incoming.#", "subscriber.svc")
+
+        kwargs = manager.channel(rabbitmq.EVENTS).declare_queue.await_args.kwargs
+        self.assertEqual("subscriber.svc", kwargs["name"])
+        self.assertTrue(kwargs["durable"])
+        self.assertFalse(kwargs["auto_delete"])
+        self.assertEqual({"x-expires": 3600000, "x-max-length": 1000},
+                         kwargs["arguments"])
+
+    async def test_subscriber_queue_arguments_changed(self):
+        """A subscriber queue declared before with other arguments is used
+        as is, through a new channel"""
+        manager = await self.connected(BrokerConfig(queue_max_length=1000))
+        failed = manager.channel(rabbitmq.EVENTS)
+        failed.close = AsyncMock()
+        failed.declare_queue.side_effect = ChannelPreconditionFailed()
+
+        queue = await manager.declare_subscriber_queue("incoming.#",
+                                                       "subscriber.svc")
+
+        failed.close.assert_awaited_once()
+        events = manager.channel(rabbitmq.EVENTS)
+        self.assertIsNot(failed, events)
+        events.declare_queue.assert_awaited_once_with(name="subscriber.svc",
+                                                      passive=True)
+        self.assertIs(events.declare_queue.return_value, queue)
+        queue.bind.assert_awaited_once()
+
+    async def test_delete_stale_queues(self):
+        """Only random subscriber queues bound to the bot events, without
+        consumers and idle for long enough are deleted"""
+        manager = await self.connected(
+            BrokerConfig(management_url="http://localhost:15672",
+                         stale_queue_idle=3600)
+        )
+        old: str = "2024-10-18 10:44:59"
+        recent: str = datetime.now(timezone.utc).isoformat()
+        queues = [
+            {"name": "subscriber.svc", "consumers": 0, "idle_since": old},
+            {"name": "subscriber.0a1b2c3d", "consumers": 0, "idle_since": old},
+            {"name": "subscriber.4e5f6a7b", "consumers": 1},
+            {"name": "subscriber.8c9d0e1f", "consumers": 0,
+             "idle_since": recent},
+            {"name": "subscriber.2a3b4c5d", "consumers": 0},
+            {"name": "subscriber.6e7f8a9b", "consumers": 0, "idle_since": old},
+            {"name": "chaptnotifier.delivery.errors", "consumers": 0,
+             "idle_since": old},
+        ]
+        bound_here = [
+            {"source": "", "routing_key": "subscriber.0a1b2c3d"},
+            {"source": rabbitmq.EVENTS_EXCHANGE,
+             "routing_key": "incoming.events.bot.#"},
+        ]
+        # Another service's queue, named alike
+        bound_elsewhere = [
+            {"source": rabbitmq.EVENTS_EXCHANGE,
+             "routing_key": "incoming.events.other.#"},
+        ]
+
+        def get_management(url: str):
+            if url.endswith("/api/queues/%2F"):
+                return queues
+            if "subscriber.6e7f8a9b" in url:
+                return bound_elsewhere
+            return bound_here
+
+        with patch.object(manager, "_get_management",
+                          side_effect=get_management):
+            deleted = await manager.delete_stale_queues(
+                keep="subscriber.svc", routing_key="incoming.events.bot.#"
+            )
+
+        self.assertEqual(["subscriber.0a1b2c3d"], deleted)
+
+
+if __name__ == "__main__":
+    unittest.main()
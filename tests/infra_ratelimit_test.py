@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+try:
+    from src.infrastructure.broker.ratelimit import RateLimiter, INTERACTIVE, BULK
+except ModuleNotFoundError:
+    from infrastructure.broker.ratelimit import RateLimiter, INTERACTIVE, BULK
+
+
+class FakeClock():
+    """Clock advanced by the sleeps only"""
+
+    def __init__(self) -> None:
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(0)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """Tests for the outbound rate limiter"""
+
+    def limiter(self, clock: FakeClock, **kwargs) -> RateLimiter:
+        return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+    async def test_global_rate(self):
+        """Past the burst, messages to different chats are spaced by the
+        global rate"""
+        clock: FakeClock = FakeClock()
+        limiter: RateLimiter = self.limiter(clock, rate=10, burst=2,
+                                            chat_interval=1.0)
+
+        waits = [await limiter.acquire(chat_id) for chat_id in range(4)]
+
+        self.assertEqual([0.0, 0.0], waits[:2])
+        self.assertAlmostEqual(0.1, waits[2])
+        self.assertAlmostEqual(0.1, waits[3])
+
+    async def test_chat_interval(self):
+        """Messages to the same chat are spaced by the chat interval"""
+        clock: FakeClock = FakeClock()
+        limiter: RateLimiter = self.limiter(clock, rate=30, burst=30,
+                                            chat_interval=1.0)
+
+        await limiter.acquire(1)
+        self.assertAlmostEqual(1.0, await limiter.acquire(1))
+        self.assertEqual(0.0, await limiter.acquire(2))
+
+    async def test_interactive_first(self):
+        """Interactive callers are granted before the bulk ones already
+        waiting"""
+        clock: FakeClock = FakeClock()
+        limiter: RateLimiter = self.limiter(clock, rate=10, burst=1,
+                                            chat_interval=0)
+        order: list[str] = []
+
+        async def send(name: str, chat_id: int, lane: int) -> None:
+            await limiter.acquire(chat_id, lane)
+            order.append(name)
+
+        tasks = [asyncio.create_task(send(f"bulk {chat_id}", chat_id, BULK))
+                 for chat_id in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(send("reply", 9, INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(["bulk 0", "reply", "bulk 1", "bulk 2"], order)
+
+    async def test_waiting_chat_skipped(self):
+        """A caller waiting for its chat interval doesn't hold back the
+        callers behind it"""
+        clock: FakeClock = FakeClock()
+        limiter: RateLimiter = self.limiter(clock, rate=100, burst=100,
+                                            chat_interval=1.0)
+
+        await limiter.acquire(1, BULK)
+        late = asyncio.create_task(limiter.acquire(1, BULK))
+        await asyncio.sleep(0)
+
+        self.assertEqual(0.0, await limiter.acquire(2, BULK))
+        self.assertAlmostEqual(1.0, await late)
+
+    async def test_stats(self):
+        """Waiting callers show up as queue depth per lane, and their waits
+        in the metrics"""
+        clock: FakeClock = FakeClock()
+        limiter: RateLimiter = self.limiter(clock, rate=1, burst=1,
+                                            chat_interval=0)
+
+        tasks = [asyncio.create_task(limiter.acquire(chat_id, BULK))
+                 for chat_id in range(3)]
+        await asyncio.sleep(0)
+        self.assertEqual({"interactive": 0, "bulk": 2},
+                         limiter.stats()["waiting"])
+
+        await asyncio.gather(*tasks)
+
+        stats = limiter.stats()
+        self.assertEqual({"interactive": 0, "bulk": 0}, stats["waiting"])
+        self.assertEqual(3, stats["acquired"])
+        self.assertAlmostEqual(2.0, stats["max_wait"])
+        self.assertAlmostEqual(1.0, stats["avg_wait"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+from pamqp.commands import Basic
+
+try:
+    from src.infrastructure.broker.retry import RetryRouter, settle
+except ModuleNotFoundError:
+    from infrastructure.broker.retry import RetryRouter, settle
+
+
+class FakeMessage():
+    """Incoming message recording how it was settled"""
+
+    def __init__(self, body: bytes, headers: dict = None) -> None:
+        self.body: bytes = body
+        self.headers: dict = headers or {}
+        self.message_id: str = "id"
+        self.content_type: str = "application/json"
+        self.settled: str = ""
+
+    @asynccontextmanager
+    async def process(self, requeue: bool = False):
+        try:
+            yield self
+        except Exception:
+            self.settled = "requeued" if requeue else "rejected"
+            raise
+        self.settled = "acked"
+
+
+class TestRetryRouter(unittest.IsolatedAsyncioTestCase):
+    """Tests for the delayed retries and dead-lettering"""
+
+    def setUp(self) -> None:
+        self.exchange = MagicMock()
+        self.exchange.publish = AsyncMock(return_value=Basic.Ack())
+        manager = MagicMock()
+        manager.channel.return_value.default_exchange = self.exchange
+        manager.channel.return_value.declare_queue = AsyncMock()
+        self.manager = manager
+        self.router: RetryRouter = RetryRouter(manager, "events", (5, 30))
+
+        return super().setUp()
+
+    def published(self) -> tuple[str, dict]:
+        call = self.exchange.publish.await_args
+        return call.kwargs["routing_key"], dict(call.args[0].headers)
+
+    async def test_declare(self):
+        """A retry queue per delay dead-letters back to the queue"""
+        await self.router.declare()
+
+        declare = self.manager.channel.return_value.declare_queue
+        self.assertEqual(["events.retry.5s", "events.retry.30s", "events.dead"],
+                         [c.args[0] for c in declare.await_args_list])
+        self.assertEqual({
+            "x-message-ttl": 30000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "events",
+        }, declare.await_args_list[1].kwargs["arguments"])
+
+    async def test_retries_then_dead_letter(self):
+        """A failing event is retried after each delay, then dead-lettered,
+        and acknowledged every time"""
+        handle = AsyncMock(side_effect=ValueError("handler failed"))
+        headers: dict = {}
+
+        for target in ("events.retry.5s", "events.retry.30s", "events.dead"):
+            message = FakeMessage(json.dumps({"id": 1}).encode(), headers)
+            self.assertFalse(await settle(message, handle, self.router))
+            self.assertEqual("acked", message.settled)
+            routing_key, headers = self.published()
+            self.assertEqual(target, routing_key)
+
+        self.assertEqual(2, headers["x-retries"])
+        self.assertEqual("handler failed", headers["x-last-error"])
+        self.assertEqual({"retried": 2, "dead_lettered": 1},
+                         self.router.stats())
+
+    async def test_poison_dead_lettered(self):
+        """An event that can't be decoded is dead-lettered right away"""
+        handle = AsyncMock()
+        message = FakeMessage(b"not json")
+
+        self.assertFalse(await settle(message, handle, self.router))
+
+        handle.assert_not_awaited()
+        self.assertEqual("events.dead", self.published()[0])
+        self.assertEqual("acked", message.settled)
+
+    async def test_nacked_route_requeues(self):
+        """If the broker rejects the rerouted copy, the event is requeued"""
+        self.exchange.publish.return_value = Basic.Nack()
+        message = FakeMessage(b"{}")
+
+        with self.assertRaises(Exception):
+            await settle(message, AsyncMock(side_effect=ValueError()),
+                         self.router)
+        self.assertEqual("requeued", message.settled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -131,6 +131,41 @@ class TestInfraSQLite(unittest.TestCase):
             if os.path.isfile(f"./{db_filename}"):
                 os.remove(f"./{db_filename}")
 
+    def test_script_nok_rolls_back(self):
+        """Validates that a failing script leaves no partial changes"""
+        db_filename: str = \
+            "".join(random.choices(string.ascii_letters, k=5)) + ".db"
+
+        try:
+            manager = sq.SqliteManager(f"./{db_filename}")
+            manager.exc_query("".join([
+                f"CREATE TABLE {self.querys_db_table} ",
+                f"({self.querys_db_table_fields[0]} ",
+                f"TEXT, {self.querys_db_table_fields[1]} TEXT)"
+            ]))
+
+            with self.assertRaises(sq.InfrastructureException):
+                manager.exc_script("".join([
+                    f"INSERT INTO {self.querys_db_table} ",
+                    "VALUES ('value1', 'value2');",
+                    f"INSERT INTO {self.querys_db_table} ",
+                    "VALUES ('value1', 'value2', 'value3');"
+                ]))
+
+            result: list[tuple[str, ...]] = manager.read_query("".join([
+                f"SELECT * FROM {self.querys_db_table}"
+            ]))
+
+            self.assertListEqual(result, [])
+
+            manager.close()
+        except sq.InfrastructureException as err:
+            raise err
+
+        finally:
+            if os.path.isfile(f"./{db_filename}"):
+                os.remove(f"./{db_filename}")
+
     def test_query_nok_read_nok(self):
         """Validates that a query goes nok and read goes nok"""
         db_filename: str = \
@@ -163,3 +198,41 @@ class TestInfraSQLite(unittest.TestCase):
         finally:
             if os.path.isfile(f"./{db_filename}"):
                 os.remove(f"./{db_filename}")
+
+    def test_backup_and_restore(self):
+        """Validates that a snapshot can be taken and later restored"""
+        db_filename: str = \
+            "".join(random.choices(string.ascii_letters, k=5)) + ".db"
+        snapshot_filename: str = "snapshot_" + db_filename
+
+        try:
+            manager = sq.SqliteManager(f"./{db_filename}")
+            manager.exc_query("".join([
+                f"CREATE TABLE {self.querys_db_table} ",
+                f"({self.querys_db_table_fields[0]} ",
+                f"TEXT, {self.querys_db_table_fields[1]} TEXT)"
+            ]))
+            manager.exc_query("".join([
+                f"INSERT INTO {self.querys_db_table} ",
+                "VALUES ('value1', 'value2')"
+            ]))
+
+            manager.backup(f"./{snapshot_filename}", pages=1, sleep=0)
+
+            manager.exc_query(f"DELETE FROM {self.querys_db_table}")
+            manager.restore(f"./{snapshot_filename}")
+
+            result = manager.read_query("".join([
+                f"SELECT * FROM {self.querys_db_table}"
+            ]))
+
+            manager.close()
+
+            self.assertEqual(result, [("value1", "value2")])
+        except sq.InfrastructureException as err:
+            raise err
+
+        finally:
+            for filename in (db_filename, snapshot_filename):
+                if os.path.isfile(f"./{filename}"):
+                    os.remove(f"./{filename}")